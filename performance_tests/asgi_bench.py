@@ -0,0 +1,97 @@
+"""In-process load test of the API, with concurrent clients over ASGI against a seeded SQLite database
+
+Usage: python asgi_bench.py [CONCURRENCY] [SECONDS]
+
+Set `ASYNC_DATABASE=1` to use the async driver.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+os.environ["JWT_SECRET_KEY"] = "secret"
+
+import httpx
+
+from xasd.api import app
+from xasd.database import models
+from xasd.database.session import Session
+
+ARTISTS, ALBUMS, TRACKS = 200, 5, 10
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+
+def seed():
+    pool = Session()
+    session = pool.get_session()
+    track_id = 0
+    for a in range(ARTISTS):
+        artist = models.Artist(name=f"artist {a}")
+        session.add(artist)
+        for b in range(ALBUMS):
+            album = models.Album(name=f"album {a} {b}", artist=artist)
+            session.add(album)
+            for t in range(TRACKS):
+                track_id += 1
+                file = models.File(filepath=f"{a}/{b}/{t}.mp3")
+                session.add(
+                    models.Track(
+                        title=f"song {a} {b} {t}", artist=artist, album=album, file=file
+                    )
+                )
+    session.commit()
+    session.close()
+    return track_id
+
+
+async def main():
+    n_tracks = seed()
+    await app.router.startup()
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    stop = time.monotonic() + DURATION
+
+    def url():
+        r = random.random()
+        a = random.randrange(ARTISTS)
+        if r < 0.3:
+            return f"/track/{random.randint(1, n_tracks)}"
+        if r < 0.5:
+            return f"/track/{random.randint(1, n_tracks)}/file"
+        if r < 0.65:
+            return f"/artist/artist {a}/albums"
+        if r < 0.8:
+            return f"/artist/artist {a}/tracks"
+        if r < 0.95:
+            return f"/search/track/song {a}"
+        return "/health"
+
+    async def worker():
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                response = await client.get(url())
+                assert response.status_code == 200, response.text
+                latencies.append(time.perf_counter() - start)
+
+    begin = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.monotonic() - begin
+    await app.router.shutdown()
+    q = statistics.quantiles(latencies, n=100)
+    print(
+        f"{os.environ.get('ASYNC_DATABASE') and 'async' or 'sync'}: {len(latencies)/elapsed:.0f} req/s, "
+        f"p50 {q[49]*1000:.0f} ms, p95 {q[94]*1000:.0f} ms, p99 {q[98]*1000:.0f} ms ({len(latencies)} requests)"
+    )
+
+
+asyncio.run(main())
@@ -2,11 +2,12 @@ import asyncio
 import logging
 import os
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Union
 
 import aio_pika
 
-from xasd.utils.asyncinotifyrecurse import InotifyRecurse, Mask
+from xasd.abc.amqp import Publisher
+from xasd.utils.asyncinotifyrecurse import Debouncer, InotifyRecurse, Mask
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,7 @@ class AbstractWorker(ABC):
         producer_method: Optional[str] = "inotify",
         amqp_url: Optional[str] = None,
         amqp_consume_queue: Optional[str] = None,
+        amqp_prefetch: int = 2,
     ):
         """
         Abstract worker class.
@@ -24,10 +26,14 @@ class AbstractWorker(ABC):
         Args:
             amqp_uri (str, optional): The AMQP URI to use for connecting to the broker.
             amqp_consume_queue (str, optional): The name of the AMQP queue to consume from.
+            amqp_prefetch (int, optional): Unacknowledged messages delivered per consumer. Defaults to 2,
+                one being processed and one waiting in the asyncio queue.
 
         Attributes:
             _amqp_url (str): The AMQP connection URI.
             amqp_consume_queue (str): The name of the AMQP queue to consume from.
+            amqp_prefetch (int): Unacknowledged messages delivered per consumer.
+            publisher (Publisher): Publishes messages through one channel, with publisher confirms.
             db (XasdDB): An instance of the XasdDB class for storing and retrieving data.
             producer_method (str): tbd
             running (bool): A flag indicating whether the application is running or not.
@@ -36,12 +42,14 @@ class AbstractWorker(ABC):
         if self._amqp_url is None:
             self._amqp_url = os.environ.get("AMQP_URL")
         self.amqp_consume_queue = amqp_consume_queue
+        self.amqp_prefetch = amqp_prefetch
 
         self.producer_method = producer_method
 
         self.running = True
 
         self.__amqp = None
+        self.publisher = Publisher(lambda: self.__amqp_connection)
 
     @property
     async def __amqp_connection(self):
@@ -73,29 +81,49 @@ class AbstractWorker(ABC):
         Args:
             opts (dict): A dictionary of options specifying the number of consumers to use.
         """
-        asyncio_queue = asyncio.Queue()
+        consumer_count = int(opts["--consumers"])
+        # Bounded, so producers wait while every consumer is busy
+        asyncio_queue = asyncio.Queue(maxsize=consumer_count)
         if self.producer_method == "inotify":
             producer = asyncio.create_task(
-                self.inotify_producer(asyncio_queue, path=opts["<dir>"])
+                self.inotify_producer(
+                    asyncio_queue,
+                    path=opts["<dir>"],
+                    quiet=float(opts.get("--settle") or 10),
+                )
             )
         else:
-            producer = asyncio.create_task(self.amqp_producer(asyncio_queue))
+            producer = asyncio.create_task(
+                self.amqp_producer(
+                    asyncio_queue, prefetch_count=consumer_count * self.amqp_prefetch
+                )
+            )
 
         consumers = [
             asyncio.create_task(self.consume(n, asyncio_queue))
-            for n in range(int(opts["--consumers"]))
+            for n in range(consumer_count)
         ]
+        for item in await self.recover(opts):
+            await asyncio_queue.put(item)
         await asyncio.gather(producer)
         await asyncio_queue.join()  # Implicitly awaits consumers, too
         for c in consumers:
             c.cancel()
+        await self.publisher.close()
 
-    async def amqp_producer(self, asyncio_queue: asyncio.Queue) -> None:
+    async def amqp_producer(
+        self, asyncio_queue: asyncio.Queue, prefetch_count: int
+    ) -> None:
         """
         Asynchronously consume messages from a RabbitMQ queue and put them in an asyncio queue.
 
+        The broker delivers at most `prefetch_count` unacknowledged messages, and the
+        bounded asyncio queue holds back the rest, so a busy worker isn't flooded with
+        messages other workers could be processing.
+
         Args:
         asyncio_queue (asyncio.Queue): An asyncio queue to put the messages in.
+        prefetch_count (int): Most unacknowledged messages delivered to this worker at once.
 
         Returns:
         None
@@ -106,7 +134,9 @@ class AbstractWorker(ABC):
 
         async with connection:
             channel = await connection.channel()
-            queue = await channel.declare_queue(self.amqp_consume_queue)
+            await channel.set_qos(prefetch_count=prefetch_count)
+            # Durable, like the messages published to it, see `Publisher`
+            queue = await channel.declare_queue(self.amqp_consume_queue, durable=True)
 
             await queue.consume(asyncio_queue.put)
 
@@ -115,46 +145,82 @@ class AbstractWorker(ABC):
 
                 await asyncio.sleep(1)
 
-    async def inotify_producer(self, asyncio_queue: asyncio.Queue, path: str) -> None:
+    async def inotify_producer(
+        self, asyncio_queue: asyncio.Queue, path: str, quiet: float = 10.0
+    ) -> None:
         """
         A producer function that watches the given path.
 
-        This function monitors the given `path` for file changes, and places the changed file
-        paths in the provided `asyncio_queue`.
+        This function monitors the given `path` for file changes, and places the top level
+        file or directory they're in in the provided `asyncio_queue`, once nothing in it has
+        changed for `quiet` seconds (see `Debouncer`). A directory, e.g. an album being downloaded,
+        is queued once when it's complete, rather than once per file event while it's written.
         If a new directory is created,
         it will be added to the watch list.
 
         Args:
         - asyncio_queue (asyncio.Queue): An asyncio queue to hold the changed file paths.
         - path (str): The path to monitor for changes.
+        - quiet (float): Seconds a file or directory must go without changes before it's queued.
 
         Returns:
         None
         """
+        debouncer = Debouncer(path, quiet=quiet)
         with InotifyRecurse(
-            path, mask=Mask.MOVED_TO | Mask.CLOSE_WRITE | Mask.CREATE
+            path,
+            mask=Mask.MOVED_TO | Mask.CLOSE_WRITE | Mask.CREATE | Mask.MODIFY,
         ) as inotify:
             logger.info(f"Watching {path} for new files")
-            async for event in inotify:
-                local_filepath = str(event.path)
-
-                # Watch newly created dirs
-                if (
-                    Mask.CREATE in event.mask
-                    and event.path is not None
-                    and event.path.is_dir()
-                ):
-                    logger.info(f"Watching {event.path} for new files")
-                    inotify.load_tree(event.path)
-
-                if (
-                    (Mask.MOVED_TO | Mask.CLOSE_WRITE) & event.mask
-                    and event.path is not None
-                    and event.path.is_file()
-                ):
+            get = None
+            while self.running:
+                # Not cancelled on timeout, so no event is lost
+                if get is None:
+                    get = asyncio.ensure_future(inotify.get())
+                done, _ = await asyncio.wait({get}, timeout=debouncer.timeout())
+
+                if get in done:
+                    event = get.result()
+                    get = None
+
+                    # Watch newly created dirs
+                    if (
+                        Mask.CREATE in event.mask
+                        and event.path is not None
+                        and event.path.is_dir()
+                    ):
+                        logger.info(f"Watching {event.path} for new files")
+                        inotify.load_tree(event.path)
+
+                    if event.path is not None:
+                        debouncer.touch(str(event.path))
+
+                for local_filepath in debouncer.ready():
                     logger.info(f"New file: {local_filepath}")
                     await asyncio_queue.put(local_filepath)
 
+            if get is not None:
+                get.cancel()
+
+    async def publish_message(self, queue_name: str, message_body: Union[str, bytes]):
+        """
+        Publishes a message to a queue on a RabbitMQ server, returning once the broker has confirmed it.
+
+        Args:
+            queue_name (str): The name of the queue to publish the message to.
+            message_body (str | bytes): The body of the message to publish.
+        """
+        await self.publisher.publish(queue_name, message_body)
+
+    async def recover(self, opts: dict) -> list:
+        """
+        Items left over from before a restart, queued alongside the producer's.
+
+        Args:
+            opts (dict): The options passed to `watch`.
+        """
+        return []
+
     @abstractmethod
     async def consume(self, name: int, asyncio_queue: asyncio.Queue) -> None:
         """
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Union
+
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractConnection
+
+logger = logging.getLogger(__name__)
+
+
+class Publisher:
+    """
+    Publishes persistent messages to durable queues through one long lived channel, with publisher confirms.
+
+    A publish waits until the broker has confirmed the message, so it won't be lost if the worker exits.
+    Rather than a channel and a confirm round trip per message, messages published while a batch is
+    being confirmed are sent together as the next batch, and their confirms awaited together.
+
+    Each queue is declared durable before the first message is published to it, so messages published
+    before its consumer has started aren't dropped, and persistent messages survive a broker restart.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[AbstractConnection]],
+        batch_size: int = 256,
+    ):
+        """
+        Args:
+            connect (Callable): Returns the (robust) connection to open the channel on.
+            batch_size (int, optional): Most messages sent in one batch. Defaults to 256.
+        """
+        self._connect = connect
+        self.batch_size = batch_size
+
+        self._channel: Optional[AbstractChannel] = None
+        # Queues declared on the current channel
+        self._declared: set[str] = set()
+        self._channel_lock = asyncio.Lock()
+        self._pending: list[tuple[str, aio_pika.Message, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def channel(self) -> AbstractChannel:
+        """The publishing channel, opened again if it's been closed"""
+        async with self._channel_lock:
+            if self._channel is None or self._channel.is_closed:
+                connection = await self._connect()
+                self._channel = await connection.channel(publisher_confirms=True)
+                self._declared = set()
+            return self._channel
+
+    async def publish(self, queue_name: str, message_body: Union[str, bytes]) -> None:
+        """
+        Publish a message to a queue, returning once the broker has confirmed it.
+
+        Args:
+            queue_name (str): The name of the queue to publish the message to.
+            message_body (str | bytes): The body of the message to publish.
+
+        Raises:
+            aio_pika.exceptions.DeliveryError: The broker rejected the message.
+        """
+        if isinstance(message_body, str):
+            message_body = message_body.encode("utf-8")
+        message = aio_pika.Message(
+            message_body,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+        )
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((queue_name, message, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        await future
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch = self._pending[: self.batch_size]
+            self._pending = self._pending[self.batch_size :]
+
+            try:
+                channel = await self.channel()
+                for queue_name in {queue_name for queue_name, _, _ in batch}:
+                    if queue_name not in self._declared:
+                        await channel.declare_queue(queue_name, durable=True)
+                        self._declared.add(queue_name)
+                results = await asyncio.gather(
+                    *(
+                        channel.default_exchange.publish(
+                            message, routing_key=queue_name
+                        )
+                        for queue_name, message, _ in batch
+                    ),
+                    return_exceptions=True,
+                )
+            except Exception as e:
+                logger.exception(
+                    "Unable to open a channel, or declare a queue, to publish on"
+                )
+                results = [e] * len(batch)
+
+            logger.debug(f"Published a batch of {len(batch)} messages")
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(None)
+
+    async def close(self) -> None:
+        """Wait for unconfirmed messages, then close the channel"""
+        if self._flusher is not None:
+            await self._flusher
+        if self._channel is not None and not self._channel.is_closed:
+            await self._channel.close()
+        self._channel = None
@@ -1,8 +1,18 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from datetime import datetime
 
 from xasd.api.routers import track, artist, playlist, search, user
-from xasd.database.session import Session
+from xasd.api.services.auth import PrincipalCache
+from xasd.api.services.password import PasswordHasher, PasswordHasherBusy
+from xasd.api.services.response_cache import cache_responses
+from xasd.api.services.search_index import build_search_index, refresh_search_index
+from xasd.cache import response_cache_from_env
+from xasd.database.crud.cursor import InvalidCursor
+from xasd.database.session import AsyncSession, Session
 from xasd.database import schemas
 
 
@@ -39,25 +49,90 @@ app.include_router(search.search_router)
 app.include_router(user.user_router)
 
 
+# Registered before `add_cors_header`, so cached responses also get the CORS headers
+@app.middleware("http")
+async def response_cache(request, call_next):
+    cache = getattr(request.app.state, "response_cache", None)
+    if cache is None:
+        return await call_next(request)
+    return await cache_responses(request, call_next, cache)
+
+
 @app.middleware("http")
 async def add_cors_header(request, call_next):
     response = await call_next(request)
     response.headers["Access-Control-Allow-Origin"] = "*"
+    if "X-Next-Cursor" in response.headers:
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
     return response
 
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"}
+    )
+
+
 @app.on_event("startup")
 async def startup():
     print("Starting up...")
-    app.state.db_pool = Session()
+    if os.environ.get("ASYNC_DATABASE"):
+        app.state.db_pool = AsyncSession()
+    else:
+        app.state.db_pool = Session()
+
+    # bcrypt runs in a bounded pool, so logins don't block other requests
+    app.state.password_hasher = PasswordHasher(
+        max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", 0)) or None,
+        max_queue=int(os.environ.get("PASSWORD_HASH_QUEUE", 64)),
+    )
+
+    # Users verified from their token, so authenticated requests don't query the user table
+    app.state.principal_cache = PrincipalCache(
+        ttl=float(os.environ.get("AUTH_CACHE_TTL", 60))
+    )
+    for target in app.state.db_pool.event_targets():
+        app.state.principal_cache.watch(target)
+
+    # Optional cache of serialised track and artist responses, see `xasd.cache`
+    app.state.response_cache = response_cache_from_env()
+
+    # Optional in-memory index for search-as-you-type suggestions
+    if os.environ.get("MEMORY_SEARCH_INDEX"):
+        app.state.search_index = build_search_index(app.state.db_pool)
+        app.state.search_index_refresh = asyncio.create_task(
+            refresh_search_index(
+                app.state.search_index,
+                app.state.db_pool,
+                interval=float(os.environ.get("MEMORY_SEARCH_INDEX_REFRESH", 30)),
+            )
+        )
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    app.state.db_pool.close()
+    app.state.password_hasher.shutdown()
+    if getattr(app.state, "search_index", None):
+        app.state.search_index_refresh.cancel()
+        app.state.search_index = None
+    if isinstance(app.state.db_pool, AsyncSession):
+        await app.state.db_pool.close_async()
+    else:
+        app.state.db_pool.close()
 
 
 # Health check endpoint
 @app.get("/health", tags=["Health"], response_model=schemas.HealthCheckResponse)
 async def health_check():
-    return {"status": "OK", "time": str(datetime.utcnow())}
+    password_hasher = getattr(app.state, "password_hasher", None)
+    return {
+        "status": "OK",
+        "time": str(datetime.utcnow()),
+        "password_hashing": password_hasher.stats() if password_hasher else None,
+    }
@@ -1,25 +1,41 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import Depends, HTTPException, Request
+from fastapi import Depends, HTTPException, Query, Request
 from fastapi.security import OAuth2PasswordBearer
 
 from xasd.api.services.auth import Auth
-from xasd.database.crud import XasdDB
+from xasd.database.crud.aio import AsyncXasdDB
+from xasd.database.session import AsyncSession
+from xasd.database.search.memory import MemoryIndex
 from xasd.database import schemas, models
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def _db(request: Request):
-    db_session = request.app.state.db_pool.get_session()
-
-    db = XasdDB(session=db_session)
-    try:
-        yield db
-    finally:
-        db_session.close()
-        del db
+async def _db(request: Request):
+    """
+    With an `AsyncSession` pool (`ASYNC_DATABASE` set) queries are awaited using an async driver,
+    otherwise each query runs in a worker thread. Either way the event loop isn't blocked.
+    """
+    db_pool = request.app.state.db_pool
+
+    if isinstance(db_pool, AsyncSession):
+        db_session = db_pool.get_async_session()
+        db = AsyncXasdDB.from_async_session(db_session)
+        try:
+            yield db
+        finally:
+            await db_session.close()
+            del db
+    else:
+        db_session = db_pool.get_session()
+        db = AsyncXasdDB.from_session(db_session)
+        try:
+            yield db
+        finally:
+            db_session.close()
+            del db
 
 
 async def _pagination_parameters(page: int = 1):
@@ -29,8 +45,22 @@ async def _pagination_parameters(page: int = 1):
     return {"skip": skip, "limit": limit}
 
 
-def _auth(db: XasdDB = Depends(_db)):
-    auth = Auth(db)
+async def _cursor_parameters(
+    cursor: Optional[str] = None, limit: int = Query(default=50, ge=1, le=100)
+):
+    return {"cursor": cursor, "limit": limit}
+
+
+async def _search_index(request: Request):
+    return getattr(request.app.state, "search_index", None)
+
+
+async def _auth(request: Request, db: AsyncXasdDB = Depends(_db)):
+    auth = Auth(
+        db,
+        principal_cache=getattr(request.app.state, "principal_cache", None),
+        password_hasher=getattr(request.app.state, "password_hasher", None),
+    )
     try:
         yield auth
     finally:
@@ -40,7 +70,7 @@ def _auth(db: XasdDB = Depends(_db)):
 async def _current_user(
     auth: Auth = Depends(_auth), token: str = Depends(oauth2_scheme)
 ):
-    user = auth.user(token)
+    user = await auth.user(token)
     if user:
         return user
 
@@ -51,8 +81,10 @@ async def _current_user(
     )
 
 
-def _track(track_id: int, db: XasdDB = Depends(_db)):
-    db_track = db.track.get(filter=[models.Track.track_id == track_id])
+async def _track(track_id: int, db: AsyncXasdDB = Depends(_db)):
+    db_track = await db.track.get(
+        filter=[models.Track.track_id == track_id], schema=schemas.Track
+    )
 
     if db_track is None:
         raise HTTPException(status_code=404, detail="Track not found")
@@ -60,8 +92,8 @@ def _track(track_id: int, db: XasdDB = Depends(_db)):
     return db_track
 
 
-def _file(track: schemas.Track = Depends(_track), db: XasdDB = Depends(_db)):
-    db_file = db.file.get(track)
+async def _file(track: schemas.Track = Depends(_track), db: AsyncXasdDB = Depends(_db)):
+    db_file = await db.file.get(track)
 
     if db_file is None:
         raise HTTPException(status_code=404, detail="File not found")
@@ -69,8 +101,8 @@ def _file(track: schemas.Track = Depends(_track), db: XasdDB = Depends(_db)):
     return db_file
 
 
-def _artist(artist_name: str, db: XasdDB = Depends(_db)):
-    db_artist = db.artist.get(artist_name)
+async def _artist(artist_name: str, db: AsyncXasdDB = Depends(_db)):
+    db_artist = await db.artist.get(artist_name)
 
     if db_artist is None:
         raise HTTPException(status_code=404, detail="Artist not found")
@@ -78,12 +110,14 @@ def _artist(artist_name: str, db: XasdDB = Depends(_db)):
     return db_artist
 
 
-def _playlist(playlist_id: int, db: XasdDB = Depends(_db)):
+async def _playlist(playlist_id: int, db: AsyncXasdDB = Depends(_db)):
     """
     We could add `current_user` as a dependency to `_playlist` and check
     if the user is the owner of the playlist
     """
-    db_playlist = db.playlist.get(filter=[models.Playlist.playlist_id == playlist_id])
+    db_playlist = await db.playlist.get(
+        filter=[models.Playlist.playlist_id == playlist_id], schema=schemas.Playlist
+    )
 
     if db_playlist is None:
         raise HTTPException(status_code=404, detail="Playlist not found")
@@ -91,27 +125,30 @@ def _playlist(playlist_id: int, db: XasdDB = Depends(_db)):
     return db_playlist
 
 
-def _updated_playlist(
+async def _updated_playlist(
     updated_playlist: schemas.Playlist,
-    db: XasdDB = Depends(_db),
+    db: AsyncXasdDB = Depends(_db),
     current_user: models.User = Depends(_current_user),
 ):
-    db_playlist = db.playlist.get(
-        filter=[models.Playlist.playlist_id == updated_playlist.playlist_id]
+    db_playlist = await db.playlist.get(
+        filter=[models.Playlist.playlist_id == updated_playlist.playlist_id],
+        schema=schemas.Playlist,
     )
 
     if db_playlist is None or db_playlist.owner_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
-    return db.playlist.update(db_playlist, name=updated_playlist.name)
+    return await db.playlist.update(db_playlist, name=updated_playlist.name)
 
 
 artist = Annotated[schemas.Artist, Depends(_artist)]
 auth = Annotated[Auth, Depends(_auth)]
-current_user = Annotated[bool, Depends(_current_user)]
-database = Annotated[XasdDB, Depends(_db)]
+cursor_parameters = Annotated[dict, Depends(_cursor_parameters)]
+current_user = Annotated[schemas.User, Depends(_current_user)]
+database = Annotated[AsyncXasdDB, Depends(_db)]
 file = Annotated[schemas.File, Depends(_file)]
 pagination_parameters = Annotated[dict, Depends(_pagination_parameters)]
 playlist = Annotated[schemas.Playlist, Depends(_playlist)]
+search_index = Annotated[Optional[MemoryIndex], Depends(_search_index)]
 track = Annotated[schemas.Track, Depends(_track)]
 updated_playlist = Annotated[schemas.Playlist, Depends(_updated_playlist)]
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 
 from xasd.api import dependencies
+from xasd.api.services.response_cache import tag_response
 from xasd.database import schemas, models
 
 artist_router = APIRouter(
@@ -10,19 +11,62 @@ artist_router = APIRouter(
 )
 
 
+@artist_router.get("", response_model=list[schemas.Artist])
+async def read_artists(
+    pagination: dependencies.cursor_parameters,
+    db: dependencies.database,
+    response: Response,
+):
+    db_artists, next_cursor = await db.api_get_page(
+        models.Artist, order_by=[models.Artist.name], **pagination
+    )
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return db_artists
+
+
 @artist_router.get("/{artist_name}/albums", response_model=list[schemas.Album])
-def read_albums(artist: dependencies.artist, db: dependencies.database):
-    db_albums = db.api_get(models.Album, filter=[models.Album.artist == artist])
+async def read_albums(
+    artist: dependencies.artist,
+    pagination: dependencies.cursor_parameters,
+    db: dependencies.database,
+    request: Request,
+    response: Response,
+):
+    db_albums, next_cursor = await db.api_get_page(
+        models.Album,
+        filter=[models.Album.artist == artist],
+        schema=schemas.Album,
+        **pagination,
+    )
 
     if not db_albums:
         raise HTTPException(status_code=404, detail="Albums not found")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    tag_response(request, artist, *db_albums)
     return db_albums
 
 
 @artist_router.get("/{artist_name}/tracks", response_model=list[schemas.Track])
-def read_tracks(artist: dependencies.artist, db: dependencies.database):
-    db_tracks = db.api_get(models.Track, filter=[models.Track.artist == artist])
+async def read_tracks(
+    artist: dependencies.artist,
+    pagination: dependencies.cursor_parameters,
+    db: dependencies.database,
+    request: Request,
+    response: Response,
+):
+    db_tracks, next_cursor = await db.api_get_page(
+        models.Track,
+        filter=[models.Track.artist == artist],
+        schema=schemas.Track,
+        **pagination,
+    )
 
     if not db_tracks:
         raise HTTPException(status_code=404, detail="Tracks not found")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    tag_response(request, artist, *db_tracks)
     return db_tracks
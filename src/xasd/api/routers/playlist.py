@@ -15,8 +15,14 @@ playlist_router = APIRouter(
 
 # get users lists of playlists
 @playlist_router.get("/me", response_model=schemas.PlaylistList)
-async def read_playlists_me(current_user: dependencies.current_user):
-    return {"playlists": current_user.playlists}
+async def read_playlists_me(
+    current_user: dependencies.current_user, db: dependencies.database
+):
+    return {
+        "playlists": await db.playlist.get_user_playlists(
+            current_user, schema=schemas.Playlist
+        )
+    }
 
 
 # options req for /playlist/me
@@ -38,13 +44,14 @@ async def create_playlist(
     current_user: dependencies.current_user,
     db: dependencies.database,
 ):
-    return db.playlist.create(
+    return await db.playlist.create(
         filter=[
             models.Playlist.name == playlist.name
             and models.Playlist.user_id == current_user.id
         ],
         name=playlist.name,
         owner_id=current_user.user_id,
+        tracks=[],
     )
 
 
@@ -85,7 +92,7 @@ async def add_track_to_playlist(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Playlist not found",
         )
-    return db.playlist.add_track_to_playlist(playlist, track)
+    return await db.playlist.add_track_to_playlist(playlist, track)
 
 
 # remove a track from a playlist for the current user
@@ -106,7 +113,7 @@ async def remove_track_from_playlist(
             detail="Playlist not found",
         )
 
-    return db.playlist.remove_track_from_playlist(playlist, track)
+    return await db.playlist.remove_track_from_playlist(playlist, track)
 
 
 # delete playlist for the current user
@@ -124,7 +131,7 @@ async def delete_playlist(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Playlist not found",
         )
-    db.playlist.delete(playlist)
+    await db.playlist.delete(playlist)
     return Response(status_code=204)
 
 
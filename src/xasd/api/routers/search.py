@@ -16,14 +16,54 @@ search_router = APIRouter(
     "/any/{query}",
     response_model=schemas.SearchListResponse,
 )
-def search_any(query: str, db: dependencies.database):
-    db_results = db.search_all(query)
+async def search_any(
+    query: str,
+    pagination: dependencies.pagination_parameters,
+    db: dependencies.database,
+):
+    db_results = await db.search_all(
+        query, schema=schemas.SearchListResponse, **pagination
+    )
 
     return db_results
 
 
 @search_router.get("/track/{query}", response_model=list[schemas.Track])
-def search_track(query: str, db: dependencies.database):
-    db_results = db.track.search(query)
+async def search_track(
+    query: str,
+    pagination: dependencies.pagination_parameters,
+    db: dependencies.database,
+):
+    db_results = await db.track.search(query, schema=schemas.Track, **pagination)
 
     return db_results
+
+
+@search_router.get("/suggest/{query}", response_model=list[schemas.SearchSuggestion])
+async def search_suggest(
+    query: str,
+    search_index: dependencies.search_index,
+    db: dependencies.database,
+    limit: int = 10,
+):
+    """
+    Artist, album and track names for search-as-you-type.
+    Served from the in-memory index when `MEMORY_SEARCH_INDEX` is set, otherwise from the database.
+    """
+    if search_index is not None:
+        return [
+            suggestion._asdict() for suggestion in search_index.search(query, limit)
+        ]
+
+    db_results = await db.search_all(query, limit=limit)
+    columns = {
+        "tracks": ("track", "track_id", "title"),
+        "artists": ("artist", "artist_id", "name"),
+        "albums": ("album", "album_id", "name"),
+    }
+
+    return [
+        {"type": type, "id": getattr(entity, id), "name": getattr(entity, name)}
+        for key, (type, id, name) in columns.items()
+        for entity in db_results[key]
+    ]
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 
 from xasd.api import dependencies
+from xasd.api.services.response_cache import tag_response
 from xasd.database import schemas, models
 
 track_router = APIRouter(
@@ -11,19 +12,29 @@ track_router = APIRouter(
 
 
 @track_router.get("", response_model=list[schemas.Track])
-def read_tracks(
-    pagination: dependencies.pagination_parameters, db: dependencies.database
+async def read_tracks(
+    pagination: dependencies.cursor_parameters,
+    db: dependencies.database,
+    response: Response,
 ):
-    db_tracks = db.api_get(models.Track)
+    db_tracks, next_cursor = await db.api_get_page(
+        models.Track, schema=schemas.Track, **pagination
+    )
 
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return db_tracks
 
 
 @track_router.get("/{track_id}", response_model=schemas.Track)
-def read_track(track: dependencies.track):
+async def read_track(track: dependencies.track, request: Request):
+    tag_response(request, track)
     return track
 
 
 @track_router.get("/{track_id}/file", response_model=schemas.File)
-def read_file(file: dependencies.file):
+async def read_file(
+    track: dependencies.track, file: dependencies.file, request: Request
+):
+    tag_response(request, track, file)
     return file
@@ -37,11 +37,11 @@ async def options_user_me():
 async def login(
     auth: dependencies.auth, form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = auth.authenticate_user(form_data.username, form_data.password)
+    user = await auth.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
 
-    access_token = auth.create_access_token(data={"sub": user.name})
+    access_token = auth.create_access_token(data=auth.user_claims(user))
 
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -50,7 +50,7 @@ async def login(
 async def create_user(user: schemas.UserCreate, auth: dependencies.auth):
     # "registering" a user is more of a "crud" task. We will probably move that.
     # creating of the token still requires `auth`.
-    db_user = auth.register_user(user)
+    db_user = await auth.register_user(user)
     if db_user:
         # [TODO] also return a token
         # access_token = auth.create_access_token(data={"sub": user.name})
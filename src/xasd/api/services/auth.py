@@ -1,22 +1,114 @@
+import asyncio
+import hashlib
+import hmac
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from typing import Optional
 
+import sqlalchemy
 from jose import JWTError, jwt
+from sqlalchemy import event
 
+from xasd.api.services.password import PasswordHasher
 from xasd.database import models, schemas
-from xasd.database.crud import XasdDB
+from xasd.database.crud.aio import AsyncXasdDB
+
+
+class PrincipalCache:
+    """
+    Users verified from a token, keyed by a hash of the token, so repeat requests
+    with the same token don't decode it or query the user table.
+
+    Entries live for `ttl` seconds. Call `revoke` when a user is deleted or their
+    password changes, or `watch` a session factory to do that on commit.
+
+    Only commits made in this process are watched, a user deleted by another API replica
+    (or directly in the database) keeps working here until their entry expires,
+    so `ttl` should stay short.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, schemas.User]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[schemas.User]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, token: str, user: schemas.User) -> None:
+        with self._lock:
+            self._entries[self._key(token)] = (time.monotonic() + self.ttl, user)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, user_id: int) -> None:
+        """Forget every verified token of a user"""
+        with self._lock:
+            for key in [
+                key
+                for key, (_, user) in self._entries.items()
+                if user.user_id == user_id
+            ]:
+                del self._entries[key]
+
+    def watch(self, session_factory: sqlalchemy.orm.sessionmaker) -> None:
+        """Revoke users that are deleted or have their password changed
+        through sessions from `session_factory`, once the change is committed.
+        Async sessions run on a sync session class, see `Session.event_targets`"""
+
+        @event.listens_for(session_factory, "after_flush")
+        def collect(session, flush_context):
+            revoked = session.info.setdefault("revoked_users", set())
+            for user in session.deleted | session.dirty:
+                if isinstance(user, models.User) and (
+                    user in session.deleted
+                    or sqlalchemy.inspect(user).attrs.password_hash.history.has_changes()
+                ):
+                    revoked.add(user.user_id)
+
+        @event.listens_for(session_factory, "after_commit")
+        def apply(session):
+            for user_id in session.info.pop("revoked_users", ()):
+                self.revoke(user_id)
+
+        @event.listens_for(session_factory, "after_rollback")
+        def discard(session):
+            session.info.pop("revoked_users", None)
 
 
 class Auth:
     ALGORITHM = "HS256"
     # token expires in 1 year
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 365
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-    def __init__(self, db: XasdDB, secret_key: Optional[str] = None):
+    pwd_context = PasswordHasher.pwd_context
+
+    def __init__(
+        self,
+        db: AsyncXasdDB,
+        secret_key: Optional[str] = None,
+        principal_cache: Optional[PrincipalCache] = None,
+        password_hasher: Optional[PasswordHasher] = None,
+    ):
         self.db = db
+        self.principal_cache = principal_cache
+        self.password_hasher = password_hasher
         self._secret_key = secret_key
         if self._secret_key is None:
             self._secret_key = os.environ.get("JWT_SECRET_KEY")
@@ -32,15 +124,42 @@ class Auth:
     def password_hash(self, password):
         return self.pwd_context.hash(password)
 
-    def authenticate_user(self, username: str, password: str):
-        user = self.db.user.get(username)
+    async def _verify_password(self, plain_password, password_hash):
+        # bcrypt takes ~200ms of CPU, never run it on the event loop
+        if self.password_hasher is not None:
+            return await self.password_hasher.verify(plain_password, password_hash)
+        return await asyncio.to_thread(
+            self.verify_password, plain_password, password_hash
+        )
+
+    async def _password_hash(self, password):
+        if self.password_hasher is not None:
+            return await self.password_hasher.hash(password)
+        return await asyncio.to_thread(self.password_hash, password)
+
+    async def authenticate_user(self, username: str, password: str):
+        user = await self.db.user.get(username)
 
         if not user:
             return False
-        if not self.verify_password(password, user.password_hash):
+        if not await self._verify_password(password, user.password_hash):
             return False
         return user
 
+    def password_fingerprint(self, password_hash: str) -> str:
+        """Short keyed digest of a password hash, tokens carrying an old one are rejected"""
+        return hmac.new(
+            self._secret_key.encode(), password_hash.encode(), hashlib.sha256
+        ).hexdigest()[:16]
+
+    def user_claims(self, user: models.User) -> dict:
+        """Claims identifying `user` in an access token"""
+        return {
+            "sub": user.name,
+            "uid": user.user_id,
+            "pwd": self.password_fingerprint(user.password_hash),
+        }
+
     def create_access_token(self, data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -49,31 +168,39 @@ class Auth:
 
         return encoded_jwt
 
-    def register_user(self, user: models.User):
-        db_user = self.db.user.get(user.name)
+    async def register_user(self, user: models.User):
+        db_user = await self.db.user.get(user.name)
         if db_user:
             return None
 
-        return self.db.user.create(
+        return await self.db.user.create(
             name=user.name,
-            password_hash=self.password_hash(user.plaintext_password),
+            password_hash=await self._password_hash(user.plaintext_password),
             email_address=user.email_address,
         )
 
-    def user(self, token: str):
+    async def user(self, token: str):
         """
         Get user from token.
-        We first decode the token to get the username, then we get the user from the database.
-        This verifies that the token is valid and that the user exists. If the user does not exist,
-        we return False.
+        If the token was verified recently it is served from the principal cache without
+        decoding it or querying the database.
+        Otherwise we decode the token to get the user id (or username for tokens without
+        a `uid` claim), then we get the user from the database. This verifies that the token
+        is valid, that the user exists and, if the token has a `pwd` claim, that the password
+        hasn't changed since the token was issued. If not, we return False.
 
         Args:
             token (str): The jwt token to decode.
 
         Returns:
-            User: The user object if the token is valid and the user exists.
+            schemas.User: The user if the token is valid and the user exists.
             False: If the token is invalid or the user does not exist.
         """
+        if self.principal_cache is not None:
+            principal = self.principal_cache.get(token)
+            if principal is not None:
+                return principal
+
         try:
             payload = jwt.decode(token, self._secret_key, algorithms=[self.ALGORITHM])
             username: str = payload.get("sub")
@@ -83,8 +210,21 @@ class Auth:
         except JWTError:
             return False
 
-        user = self.db.user.get(token_data.username)
-        if user is None:
+        if isinstance(payload.get("uid"), int):
+            user = await self.db.user.get(
+                filter=[models.User.user_id == payload["uid"]]
+            )
+        else:
+            user = await self.db.user.get(token_data.username)
+        if user is None or user.name != token_data.username:
+            return False
+        if "pwd" in payload and not hmac.compare_digest(
+            str(payload["pwd"]), self.password_fingerprint(user.password_hash)
+        ):
             return False
 
-        return user
+        principal = schemas.User.from_orm(user)
+        if self.principal_cache is not None:
+            self.principal_cache.set(token, principal)
+
+        return principal
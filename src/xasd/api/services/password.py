@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords in a bounded thread pool, off the event loop.
+    bcrypt releases the GIL while hashing, so the workers run in parallel.
+
+    At most `max_workers` passwords are hashed at once, and at most `max_queue` more wait
+    for a worker. Past that `PasswordHasherBusy` is raised rather than queueing without bound.
+    """
+
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: int = 64):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="password"
+        )
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        # Metrics
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, function: Callable, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"Password hashing queue full ({self.queued} waiting)")
+            raise PasswordHasherBusy("Too many password hashing requests")
+
+        # Counters are only changed on the event loop, so they don't need a lock
+        self.queued += 1
+        waiting = True
+        try:
+            async with self._semaphore:
+                self.queued -= 1
+                waiting = False
+                self.running += 1
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(
+                        self._executor, function, *args
+                    )
+                finally:
+                    self.running -= 1
+                    self.completed += 1
+        finally:
+            if waiting:
+                self.queued -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, password_hash: str) -> bool:
+        return await self._run(self.pwd_context.verify, plain_password, password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,99 @@
+import logging
+import re
+
+from fastapi import Request, Response
+
+from xasd.cache import ResponseCache, entity_tags
+
+logger = logging.getLogger(__name__)
+
+# Response headers that are stored with the body and replayed on a hit
+CACHED_HEADERS = ["X-Next-Cursor"]
+
+# Only these read only, unauthenticated endpoints are cached
+CACHEABLE_PATHS = [
+    re.compile(r"^/track/\d+$"),
+    re.compile(r"^/track/\d+/file$"),
+    re.compile(r"^/artist/[^/]+/albums$"),
+    re.compile(r"^/artist/[^/]+/tracks$"),
+]
+
+
+def tag_response(request: Request, *entities) -> None:
+    """Mark the response to `request` as cacheable, built from `entities`
+
+    The cached response is invalidated when any of the entities, or a row they
+    reference by foreign key, is written.
+    """
+    tags = getattr(request.state, "cache_tags", set())
+    for entity in entities:
+        tags |= entity_tags(entity)
+    request.state.cache_tags = tags
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+async def cache_responses(request: Request, call_next, cache: ResponseCache):
+    """Serve cacheable GET requests from `cache`, honouring `If-None-Match`"""
+    if request.method != "GET" or not any(
+        path.match(request.url.path) for path in CACHEABLE_PATHS
+    ):
+        return await call_next(request)
+
+    # Path and query only, so replicas behind different hostnames share entries
+    key = f"{request.url.path}?{request.url.query}"
+    if_none_match = request.headers.get("If-None-Match")
+
+    try:
+        entry = await cache.get(key)
+        # Read before the response is built, so a write committed while it's built isn't missed
+        clock = await cache.clock()
+    except Exception:
+        logger.exception("Failed to read the response cache")
+        return await call_next(request)
+
+    if entry is not None:
+        if if_none_match == entry.etag:
+            return _not_modified(entry.etag)
+        return Response(
+            content=entry.body,
+            media_type=entry.media_type,
+            headers={**entry.headers, "ETag": entry.etag, "X-Cache": "HIT"},
+        )
+
+    response = await call_next(request)
+    tags = getattr(request.state, "cache_tags", None)
+    if response.status_code != 200 or not tags:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {
+        name: value
+        for name, value in response.headers.items()
+        if name.lower() != "content-length"
+    }
+
+    try:
+        entry = await cache.set(
+            key,
+            body,
+            response.headers.get("content-type"),
+            tags,
+            headers={
+                name: response.headers[name]
+                for name in CACHED_HEADERS
+                if name in response.headers
+            },
+            clock=clock,
+        )
+    except Exception:
+        logger.exception("Failed to write the response cache")
+        return Response(content=body, status_code=200, headers=headers)
+
+    if if_none_match == entry.etag:
+        return _not_modified(entry.etag)
+
+    headers.update({"ETag": entry.etag, "X-Cache": "MISS"})
+    return Response(content=body, status_code=200, headers=headers)
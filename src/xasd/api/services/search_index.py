@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+from starlette.concurrency import run_in_threadpool
+
+from xasd.database.search.memory import MemoryIndex
+from xasd.database.session import Session
+
+logger = logging.getLogger(__name__)
+
+
+def build_search_index(db_pool: Session) -> MemoryIndex:
+    """Build an in-memory search index of every artist, album and track name
+
+    Rows committed through `db_pool` are added to the index as they are committed.
+
+    Args:
+        db_pool (Session): Database connection pool
+
+    Returns:
+        MemoryIndex: The search index
+    """
+    search_index = MemoryIndex()
+    for target in db_pool.event_targets():
+        search_index.watch(target)
+
+    db_session = db_pool.get_session()
+    try:
+        search_index.refresh(db_session)
+    finally:
+        db_session.close()
+
+    logger.info(f"Search index built with {len(search_index)} names")
+    return search_index
+
+
+async def refresh_search_index(
+    search_index: MemoryIndex, db_pool: Session, interval: float
+) -> None:
+    """Periodically add rows inserted by other processes (i.e. the uploader) to the index
+
+    Args:
+        search_index (MemoryIndex): The search index
+        db_pool (Session): Database connection pool
+        interval (float): Seconds between refreshes
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        db_session = db_pool.get_session()
+        try:
+            await run_in_threadpool(search_index.refresh, db_session)
+        except Exception:
+            logger.exception("Failed to refresh the search index")
+        finally:
+            db_session.close()
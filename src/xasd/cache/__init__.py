@@ -0,0 +1,213 @@
+"""Response cache for the read only catalogue endpoints
+
+Responses are stored as pre-serialised JSON bytes with an ETag, under a key made from the request URL.
+Each entry is stored with a set of tags, e.g. `track:1`, `album:3`, and the version each tag had
+when the entry was stored. Invalidating a tag bumps its version, so every entry tagged with it
+is treated as a miss from then on.
+
+A tag's version is the backend's clock when it was last invalidated. The clock is read before
+the response is built, so a response built from rows that were written (and invalidated) while
+it was being built is never stored, even though its tags are only known once it's been built.
+
+Tags are `<table>:<primary key>`. An entity's tags are its own tag plus a tag for every row
+it references with a foreign key (see `entity_tags`), so writing a track also invalidates
+responses tagged with its album and artist, and adding cover art invalidates the album.
+
+The backend is chosen with the `RESPONSE_CACHE_URL` environment variable:
+    - `memory://?max_entries=10000&ttl=300` an in-process LRU cache
+    - `redis://host:6379/0?ttl=300` redis, shared between API replicas and the uploader
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import urllib.parse
+from typing import Iterable, NamedTuple, Optional
+
+import sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    body: bytes
+    etag: str
+    media_type: str
+    headers: dict[str, str]
+    tag_versions: dict[str, int]
+    expires: float
+
+
+class CacheBackend:
+    """Storage for cache entries and tag versions"""
+
+    # Whether calls do network IO, and should be run in a worker thread from async code
+    blocking = False
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        raise NotImplementedError
+
+    def clock(self) -> int:
+        """Number of invalidations so far, no tag's version is newer"""
+        raise NotImplementedError
+
+    def tag_versions(self, tags: Iterable[str]) -> dict[str, int]:
+        """Current version of each tag, tags that have never been invalidated are version 0"""
+        raise NotImplementedError
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """Advance the clock, and set the tags' versions to it"""
+        raise NotImplementedError
+
+
+def entity_tags(entity) -> set[str]:
+    """Cache tags for an entity, its own tag and a tag for each row it references
+
+    Args:
+        entity (Base): sqlalchemy model instance
+
+    Returns:
+        set[str]: Tags e.g. {"track:1", "album:1", "artist:1", "file:1", "genre:1"}
+    """
+    state = sqlalchemy.inspect(entity)
+    table = state.mapper.local_table
+    tags = set()
+
+    for column in table.primary_key:
+        value = state.dict.get(state.mapper.get_property_by_column(column).key)
+        if value is not None:
+            tags.add(f"{table.name}:{value}")
+
+    for foreign_key in table.foreign_keys:
+        column = foreign_key.parent
+        value = state.dict.get(state.mapper.get_property_by_column(column).key)
+        if value is not None:
+            tags.add(f"{foreign_key.column.table.name}:{value}")
+
+    return tags
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend, ttl: float = 300):
+        """
+        Args:
+            backend (CacheBackend): Where entries are stored
+            ttl (float, optional): Seconds an entry is valid for. Defaults to 300.
+        """
+        self.backend = backend
+        self.ttl = ttl
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """Get an entry, if it hasn't expired and none of its tags have been invalidated"""
+        entry = await self._call(self.backend.get, key)
+        if entry is None or entry.expires < time.time():
+            return None
+
+        current = await self._call(self.backend.tag_versions, entry.tag_versions)
+        if current != entry.tag_versions:
+            return None
+
+        return entry
+
+    async def clock(self) -> int:
+        """The backend's clock, read before building a response to pass to `set`"""
+        return await self._call(self.backend.clock)
+
+    async def set(
+        self,
+        key: str,
+        body: bytes,
+        media_type: str,
+        tags: Iterable[str],
+        headers: Optional[dict[str, str]] = None,
+        clock: Optional[int] = None,
+    ) -> CacheEntry:
+        """Store a response body, tagged with the entities it was built from
+
+        Args:
+            clock (int, optional): `clock()` from before the response was built. If any of the tags
+                has been invalidated since, the entry is returned but not stored.
+                Defaults to None, always stored.
+        """
+        entry = CacheEntry(
+            body=body,
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            media_type=media_type,
+            headers=headers or {},
+            tag_versions=await self._call(self.backend.tag_versions, set(tags)),
+            expires=time.time() + self.ttl,
+        )
+        if clock is not None and any(
+            version > clock for version in entry.tag_versions.values()
+        ):
+            logger.debug(f"Not caching {key}, it was written while being read")
+            return entry
+        await self._call(self.backend.set, key, entry)
+
+        return entry
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        if tags:
+            logger.debug(f"Invalidating cache tags {tags}")
+            self.backend.invalidate(tags)
+
+    def watch(self, session_factory: sessionmaker) -> None:
+        """Invalidate the tags of every entity written through sessions from `session_factory`,
+        as soon as the write is committed (e.g. by `XasdDB.insert_file` or `xasd_coverart`)
+
+        Args:
+            session_factory (sessionmaker): Session factory to listen to
+        """
+
+        @event.listens_for(session_factory, "after_flush")
+        def collect(session, flush_context):
+            # Primary keys of new entities are known after the flush, and are gone once committed
+            tags = session.info.setdefault("response_cache_pending", set())
+            for entity in session.new | session.dirty | session.deleted:
+                tags |= entity_tags(entity)
+
+        @event.listens_for(session_factory, "after_commit")
+        def apply(session):
+            self.invalidate(session.info.pop("response_cache_pending", ()))
+
+        @event.listens_for(session_factory, "after_rollback")
+        def discard(session):
+            session.info.pop("response_cache_pending", None)
+
+
+def response_cache_from_env() -> Optional[ResponseCache]:
+    """Create the response cache configured by `RESPONSE_CACHE_URL`, or `None` if it isn't set"""
+    url = os.environ.get("RESPONSE_CACHE_URL")
+    if not url:
+        return None
+
+    parsed = urllib.parse.urlparse(url)
+    params = dict(urllib.parse.parse_qsl(parsed.query))
+    ttl = float(params.pop("ttl", 300))
+
+    if parsed.scheme == "memory":
+        from xasd.cache.memory import MemoryBackend
+
+        backend = MemoryBackend(max_entries=int(params.get("max_entries", 10000)))
+    elif parsed.scheme in ("redis", "rediss"):
+        from xasd.cache.redis import RedisBackend
+
+        backend = RedisBackend(url)
+    else:
+        raise ValueError(f"Unsupported RESPONSE_CACHE_URL scheme {parsed.scheme}")
+
+    logger.info(f"Using {type(backend).__name__} response cache")
+    return ResponseCache(backend, ttl=ttl)
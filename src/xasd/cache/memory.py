@@ -0,0 +1,45 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from xasd.cache import CacheBackend, CacheEntry
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process LRU cache. Each API process has its own entries, so only writes made
+    through a session this process watches are invalidated, other writes expire with the TTL.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._tag_versions: dict[str, int] = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clock(self) -> int:
+        return self._clock
+
+    def tag_versions(self, tags: Iterable[str]) -> dict[str, int]:
+        return {tag: self._tag_versions.get(tag, 0) for tag in tags}
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            self._clock += 1
+            for tag in tags:
+                self._tag_versions[tag] = self._clock
@@ -0,0 +1,88 @@
+import json
+import time
+from typing import Iterable, Optional
+
+from xasd.cache import CacheBackend, CacheEntry
+
+# Advances the clock and sets every tag's version to it, atomically so versions never go backwards
+_INVALIDATE = """
+local clock = redis.call("INCR", KEYS[1])
+for i = 2, #KEYS do
+    redis.call("SET", KEYS[i], clock)
+end
+return clock
+"""
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis cache shared by every API replica. The uploader and cover art tool invalidate
+    tags in the same redis, so writes are seen by every replica straight away.
+
+    Entries expire with their TTL, eviction is left to redis (e.g. `maxmemory-policy allkeys-lru`).
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "xasd:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError(
+                "The redis response cache needs the `redis` package, install it with `pip install xasd[redis]`"
+            )
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._invalidate = self._redis.register_script(_INVALIDATE)
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self._prefix}entry:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self._prefix}tag:{tag}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        fields = self._redis.hgetall(self._entry_key(key))
+        if not fields:
+            return None
+
+        return CacheEntry(
+            body=fields[b"body"],
+            etag=fields[b"etag"].decode(),
+            media_type=fields[b"media_type"].decode(),
+            headers=json.loads(fields[b"headers"]),
+            tag_versions=json.loads(fields[b"tag_versions"]),
+            expires=float(fields[b"expires"]),
+        )
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        entry_key = self._entry_key(key)
+        with self._redis.pipeline() as pipeline:
+            pipeline.hset(
+                entry_key,
+                mapping={
+                    "body": entry.body,
+                    "etag": entry.etag,
+                    "media_type": entry.media_type,
+                    "headers": json.dumps(entry.headers),
+                    "tag_versions": json.dumps(entry.tag_versions),
+                    "expires": entry.expires,
+                },
+            )
+            pipeline.expire(entry_key, max(1, int(entry.expires - time.time())))
+            pipeline.execute()
+
+    def clock(self) -> int:
+        return int(self._redis.get(f"{self._prefix}clock") or 0)
+
+    def tag_versions(self, tags: Iterable[str]) -> dict[str, int]:
+        tags = list(tags)
+        if not tags:
+            return {}
+
+        versions = self._redis.mget([self._tag_key(tag) for tag in tags])
+        return {tag: int(version or 0) for tag, version in zip(tags, versions)}
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        self._invalidate(keys=[f"{self._prefix}clock", *map(self._tag_key, tags)])
@@ -10,17 +10,17 @@ Options:
     --log-level=LEVEL              Set logger level, one of DEBUG, INFO, WARNING, ERROR, CRITICAL [default: INFO]
 """
 
-import os
 import logging
 import requests
 from tempfile import NamedTemporaryFile
 from docopt import docopt
 
+from xasd.cache import response_cache_from_env
 from xasd.database.models import CoverArt as CoverArtModel
 from xasd.database.models import Album as AlbumModel
 from xasd.database.crud import XasdDB
 from xasd.database.session import Session
-from xasd.uploader.b2_upload import B2Bucket
+from xasd.storage import storage_from_env
 from xasd.utils import setup_logging
 
 
@@ -34,11 +34,7 @@ class CoverArt:
     musicbrainz_endpoint_url = "http://musicbrainz.org/ws/2/release"
 
     def __init__(self, artist, album):
-        self.b2 = B2Bucket(
-            os.environ.get("B2_BUCKETNAME"),
-            os.environ.get("B2_KEY"),
-            os.environ.get("B2_SECRET"),
-        )
+        self.storage = storage_from_env()
 
         self.artist = artist
         self.album = album
@@ -87,7 +83,7 @@ class CoverArt:
                 self.cloud_path = f"c/{release_id[:2]}/{release_id}.jpg"
                 with NamedTemporaryFile() as f:
                     f.write(response.content)
-                    self.b2.upload_file(f.name, self.cloud_path)
+                    self.storage.upload_file(f.name, self.cloud_path)
                 logger.info(f"Cover art for '{self.artist} {self.album}' saved to file")
 
                 return self.cloud_path
@@ -109,6 +105,9 @@ def main():
     album = opts["--album"]
 
     session = Session()
+    response_cache = response_cache_from_env()
+    if response_cache:
+        response_cache.watch(session.Session)
     db = XasdDB(session=session.get_session())
 
     album_entity = db.album.get(
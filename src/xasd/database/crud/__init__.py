@@ -1,11 +1,12 @@
 import logging
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 import sqlalchemy
 
 from xasd.database.models import (
     Album,
     Artist,
+    ContentHash,
     File,
     Genre,
     Magnet,
@@ -13,8 +14,11 @@ from xasd.database.models import (
     Hash,
 )
 
+from xasd.database.crud.cursor import after, decode_cursor, encode_cursor
+from xasd.database.crud.load_plan import load_plan, schema_type
 from xasd.database.crud.table.album import Album as AlbumCRUD
 from xasd.database.crud.table.artist import Artist as ArtistCRUD
+from xasd.database.crud.table.content_hash import ContentHash as ContentHashCRUD
 from xasd.database.crud.table.cover_art import CoverArt as CoverArtCRUD
 from xasd.database.crud.table.file import File as FileCRUD
 from xasd.database.crud.table.playlist import Playlist as PlaylistCRUD
@@ -22,9 +26,22 @@ from xasd.database.crud.table.track import Track as TrackCRUD
 from xasd.database.crud.table.user import User as UserCRUD
 from xasd.database.crud.table.genre import Genre as GenreCRUD
 from xasd.database.crud.table.hash import Hash as HashCRUD
+from xasd.database.crud.table.magnet import Magnet as MagnetCRUD
 
 logger = logging.getLogger(__name__)
 
+# Columns identifying a row when bulk inserting, see `XasdDB.insert_files`
+BULK_KEYS = {
+    Artist: ["name"],
+    Genre: ["name"],
+    Hash: ["hash"],
+    Album: ["name", "artist_id"],
+    Track: ["title", "artist_id", "album_id"],
+}
+
+# Properties of a file stored on `File` by `XasdDB.insert_files`, if they're in its info
+FILE_PROPERTIES = ["mimetype", "size", "duration", "bitrate", "sample_rate", "channels"]
+
 
 class XasdDB:
     def __init__(self, session: sqlalchemy.orm.session.Session):
@@ -32,34 +49,46 @@ class XasdDB:
 
         self.album = AlbumCRUD(self._session)
         self.artist = ArtistCRUD(self._session)
+        self.content_hash = ContentHashCRUD(self._session)
         self.cover_art = CoverArtCRUD(self._session)
         self.file = FileCRUD(self._session)
         self.genre = GenreCRUD(self._session)
         self.hash = HashCRUD(self._session)
+        self.magnet = MagnetCRUD(self._session)
         self.playlist = PlaylistCRUD(self._session)
         self.track = TrackCRUD(self._session)
         self.user = UserCRUD(self._session)
 
-    def search_all(self, query):
+    def search_all(self, query, schema=None, skip=0, limit=None):
         """Search for an entity by name
 
         Args:
             query (str): String to search for
+            schema (BaseModel, optional): pydantic schema of the response, e.g. `SearchListResponse`.
+                The schema of each field is used to eagerly load relationships. Defaults to None.
+            skip (int, optional): Number of entities of each type to skip pass. Defaults to 0.
+            limit (int, optional): Number of entities of each type to return. Defaults to None, no limit.
 
         Returns:
             dict[str, list[entity]]: List of entities
-
-        n.b.
-            This is a very simple search that just looks for the query string anywhere in the title.
-            It's not very good, but it's good enough for now.
         """
+        tables = {
+            "tracks": self.track,
+            "artists": self.artist,
+            "albums": self.album,
+        }
+
         return {
-            "tracks": self.track.search(query),
-            "artists": self.artist.search(query),
-            "albums": self.album.search(query),
+            key: table.search(
+                query,
+                schema=schema_type(schema.__fields__[key].type_) if schema else None,
+                skip=skip,
+                limit=limit,
+            )
+            for key, table in tables.items()
         }
 
-    def api_get(self, table, filter=[], skip=0, limit=100):
+    def api_get(self, table, filter=[], skip=0, limit=100, schema=None):
         """Used within the API to get pagination list of entities
 
         Args:
@@ -67,13 +96,63 @@ class XasdDB:
             filter (list): List of filters to apply
             skip (int, optional): Number of entities to skip pass. Defaults to 0.
             limit (int, optional): Number of entities to return. Defaults to 100.
+            schema (BaseModel, optional): pydantic schema the entities will be returned as,
+                their relationships are eagerly loaded. Defaults to None.
 
         Returns:
             list[entity]: List of entities
         """
         return (
-            self._session.query(table).filter(*filter).offset(skip).limit(limit).all()
+            self._session.query(table)
+            .options(*load_plan(table, schema))
+            .filter(*filter)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+
+    def api_get_page(
+        self, table, filter=[], cursor=None, limit=50, order_by=[], schema=None
+    ):
+        """Used within the API to get a page of entities using keyset pagination
+
+        Args:
+            table (Table): Table object you want to query
+            filter (list): List of filters to apply
+            cursor (str, optional): `next` cursor from the previous page. Defaults to None, the first page.
+            limit (int, optional): Number of entities to return. Defaults to 50.
+            order_by (list, optional): Non-null columns to sort by, the primary key is always
+                appended as a tie breaker. Defaults to [], sort by primary key.
+            schema (BaseModel, optional): pydantic schema the entities will be returned as,
+                their relationships are eagerly loaded. Defaults to None.
+
+        Raises:
+            InvalidCursor: If `cursor` wasn't returned for this listing
+
+        Returns:
+            tuple[list[entity], Optional[str]]: List of entities, and the cursor of the next page
+                or `None` if this is the last page
+        """
+        columns = [*order_by, *sqlalchemy.inspect(table).primary_key]
+
+        query = (
+            self._session.query(table)
+            .options(*load_plan(table, schema))
+            .filter(*filter)
+        )
+        if cursor:
+            query = query.filter(after(columns, decode_cursor(cursor, len(columns))))
+
+        # Fetch one extra entity to find out if there's another page
+        entities = query.order_by(*columns).limit(limit + 1).all()
+        if len(entities) <= limit:
+            return entities, None
+
+        entities = entities[:limit]
+        next_cursor = encode_cursor(
+            [getattr(entities[-1], column.key) for column in columns]
         )
+        return entities, next_cursor
 
     def insert_file(self, filepath, info) -> Tuple[File, Track]:
         """Insert a file into the database,
@@ -94,45 +173,194 @@ class XasdDB:
         Returns:
             tuple: file and track object
         """
-        artist = self.create(Artist, name=info.get("artist"))
-        genre = self.create(Genre, name=info.get("genre"))
-        album = self.create(
-            Album,
-            filter=[
-                Album.name == info.get("album"),
-                Album.artist == artist,
-            ],
-            name=info.get("album"),
-            artist=artist,
-        )
-        track = self.create(
-            Track,
-            filter=[
-                Track.title == info.get("title"),
-                Track.artist == artist,
-                Track.album == album,
-            ],
-            title=info.get("title"),
-            tracknumber=info.get("tracknumber"),
-            date=info.get("date"),
-            album=album,
-            artist=artist,
-            genre=genre,
-        )
+        return self.insert_files([(filepath, info)])[0]
+
+    def insert_files(self, files: list[Tuple[str, dict]]) -> list[Tuple[File, Track]]:
+        """Insert many files into the database in one transaction,
+            creating relevant artist, genre, album, track, hash and file rows where necessary
+
+        Rows are looked up a table at a time with `IN` queries, and missing rows are inserted
+        together, so a batch (e.g. an album) costs a handful of statements however many
+        files it has, rather than a select and commit per row.
+
+        Args:
+            files (list[tuple[str, dict]]): (filepath, info) pairs, as for `insert_file`.
+                `info["hash"]` may be a `Hash` entity, or a hash string to insert.
+                `FILE_PROPERTIES` in `info`, e.g. from `xasd.uploader.probe`, are stored on the file.
+
+        Returns:
+            list[tuple]: file and track object of each of `files`, in order
+        """
+        infos = [info for _, info in files]
+
+        try:
+            artists = self._resolve(Artist, [(info.get("artist"),) for info in infos])
+            genres = self._resolve(Genre, [(info.get("genre"),) for info in infos])
+            hashes = self._resolve(
+                Hash,
+                [
+                    (info["hash"],)
+                    for info in infos
+                    if isinstance(info.get("hash"), str)
+                ],
+            )
+
+            def artist_id(info):
+                artist = artists.get((info.get("artist"),))
+                return artist.artist_id if artist else None
+
+            albums = self._resolve(
+                Album, [(info.get("album"), artist_id(info)) for info in infos]
+            )
+
+            def track_key(info):
+                album = albums.get((info.get("album"), artist_id(info)))
+                return (
+                    info.get("title"),
+                    artist_id(info),
+                    album.album_id if album else None,
+                )
+
+            files_by_path = {
+                file.filepath: file
+                for file in self._session.query(File).filter(
+                    File.filepath.in_({filepath for filepath, _ in files})
+                )
+            }
+            # Existing files are left alone. Foreign keys are set, rather than relationships,
+            # so the other side of each one-to-one relationship isn't loaded per row
+            new_files = {}
+            for filepath, info in files:
+                if filepath not in files_by_path:
+                    hash = info.get("hash")
+                    if isinstance(hash, str):
+                        hash = hashes[(hash,)]
+                    new_files[filepath] = files_by_path[filepath] = File(
+                        filepath=filepath,
+                        hash_id=hash.hash_id if hash else None,
+                        **{key: info.get(key) for key in FILE_PROPERTIES},
+                    )
+            if new_files:
+                self._session.add_all(new_files.values())
+                self._session.flush()
+
+            def track_defaults(filepath, info):
+                genre = genres.get((info.get("genre"),))
+                file = new_files.get(filepath)
+                return {
+                    "tracknumber": info.get("tracknumber"),
+                    "date": info.get("date"),
+                    "genre_id": genre.genre_id if genre else None,
+                    "file_id": file.file_id if file else None,
+                }
 
-        file = self.create(
-            File,
-            filter=[File.filepath == filepath],
-            filepath=filepath,
-            track=track,
-            hash=info.get("hash"),
+            # The first file of each track, for tracks that need creating
+            track_files = {}
+            for filepath, info in files:
+                track_files.setdefault(track_key(info), (filepath, info))
+
+            tracks = self._resolve(
+                Track,
+                list(track_files),
+                defaults=lambda key: track_defaults(*track_files[key]),
+            )
+
+            inserted = []
+            for filepath, info in files:
+                file = files_by_path[filepath]
+                track = tracks.get(track_key(info))
+                if track is None and filepath not in new_files:
+                    # Untagged, and inserted before (e.g. retried after a crash), its file has the track
+                    track = (
+                        self._session.query(Track)
+                        .filter(Track.file_id == file.file_id)
+                        .first()
+                    )
+                if track is None:
+                    # Untagged, nothing to identify an existing track by
+                    track = Track(**track_defaults(filepath, info))
+                    self._session.add(track)
+                elif filepath in new_files:
+                    track.file_id = file.file_id
+                inserted.append((file, track))
+
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+
+        return inserted
+
+    def _resolve(self, table, keys: list[tuple], defaults=None) -> dict:
+        """Get or create the rows of `table` identified by `keys`, without committing
+
+        Args:
+            table (Base): sqlalchemy model, `BULK_KEYS[table]` are the key columns
+            keys (list[tuple]): Key column values of each row, duplicates are only created once.
+                Keys that are all `None`, or `None` for a non-nullable column, are skipped.
+            defaults (Callable, optional): Returns extra attributes for a new row, given its key
+
+        Returns:
+            dict[tuple, entity]: Entity of each key
+        """
+        columns = [getattr(table, name) for name in BULK_KEYS[table]]
+        keys = {
+            key
+            for key in keys
+            if any(value is not None for value in key)
+            and all(
+                value is not None or column.nullable
+                for value, column in zip(key, columns)
+            )
+        }
+        if not keys:
+            return {}
+
+        def matches(column, values):
+            condition = column.in_(values - {None})
+            if None in values:
+                condition = sqlalchemy.or_(condition, column.is_(None))
+            return condition
+
+        # Fetch every row matching any value of each column, then pick out exact keys
+        primary_key = sqlalchemy.inspect(table).primary_key
+        candidates = (
+            self._session.query(table)
+            .filter(
+                *(
+                    matches(column, {key[i] for key in keys})
+                    for i, column in enumerate(columns)
+                )
+            )
+            .order_by(*primary_key)
         )
 
-        return (file, track)
+        entities = {}
+        for entity in candidates:
+            key = tuple(getattr(entity, column.key) for column in columns)
+            if key in keys:
+                entities.setdefault(key, entity)
+
+        new = []
+        for key in keys - entities.keys():
+            entity = table(
+                **dict(zip((column.key for column in columns), key)),
+                **(defaults(key) if defaults else {}),
+            )
+            entities[key] = entity
+            new.append(entity)
+
+        if new:
+            self._session.add_all(new)
+            # Assign primary keys, later tables reference them
+            self._session.flush()
+
+        return entities
 
     def add_unique_hash(self, hash: str) -> Union[bool, Hash]:
         """
         Adds the given hash to the database if it doesn't already exist.
+        It's inserted with `insert_or_ignore`, so a `HammingIndex` watching the session doesn't see it.
 
         Parameters:
             hash (str): The hash to add to the database.
@@ -141,9 +369,41 @@ class XasdDB:
             Union[bool, Hash]: False if the hash already exists in the database,
             otherwise returns the entity representing the added hash.
         """
-        if self.hash.get(hash):
-            return False
-        return self.hash.create(hash=hash)
+        return self.hash.insert_or_ignore(hash=hash)
+
+    def find_content_hash(self, size: int, digest: str) -> Optional[ContentHash]:
+        """
+        Finds a file the uploader has already seen, by the size and digest of its bytes.
+
+        Parameters:
+            size (int): Size of the file in bytes.
+            digest (str): Hex digest of the file's bytes, see `xasd.uploader.fileinfo.content_digest`.
+
+        Returns:
+            Optional[ContentHash]: The entity, or None if no file with this content has been seen.
+        """
+        return self.content_hash.get(
+            filter=[ContentHash.size == size, ContentHash.digest == digest]
+        )
+
+    def add_content_hash(
+        self, size: int, digest: str, hash_id: Optional[int]
+    ) -> Union[bool, ContentHash]:
+        """
+        Records the content of a file the uploader has seen, unless it's already recorded.
+
+        Parameters:
+            size (int): Size of the file in bytes.
+            digest (str): Hex digest of the file's bytes.
+            hash_id (Optional[int]): The perceptual hash of the file, or of the file it duplicates.
+
+        Returns:
+            Union[bool, ContentHash]: False if the content was already recorded,
+            otherwise the entity representing the added content.
+        """
+        return self.content_hash.insert_or_ignore(
+            size=size, digest=digest, hash_id=hash_id
+        )
 
     def add_magnet(self, infohash: str) -> Union[bool, Magnet]:
         """
@@ -156,17 +416,4 @@ class XasdDB:
             Union[bool, Magnet]: False if the infohash already exists in the database,
             otherwise returns the entity representing the added magnet.
         """
-        if self.get(
-            Magnet,
-            filter=[
-                Magnet.infohash == infohash,
-            ],
-        ):
-            return False
-        return self.create(
-            Magnet,
-            filter=[
-                Magnet.infohash == infohash,
-            ],
-            infohash=infohash,
-        )
+        return self.magnet.insert_or_ignore(infohash=infohash)
@@ -0,0 +1,92 @@
+"""Awaitable `XasdDB` for asyncio applications (i.e. the API)
+
+`AsyncXasdDB` has the same tables and methods as `XasdDB`, but every call is a coroutine.
+It can be backed by either:
+    - an `sqlalchemy.ext.asyncio.AsyncSession` (see `xasd.database.session.AsyncSession`),
+      the sync `XasdDB` code runs with `AsyncSession.run_sync` so database IO is awaited
+      on the event loop with an async driver
+    - a regular sync session, each call runs in a worker thread
+
+n.b.
+    Entities are returned outside of the session, relationships that will be accessed
+    must be eagerly loaded by passing a `schema` (see `xasd.database.crud.load_plan`).
+"""
+import asyncio
+from typing import Any, Callable
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from xasd.database.crud import XasdDB
+
+# Attributes of `XasdDB` that are `Table`s, rather than methods
+TABLES = [
+    "album",
+    "artist",
+    "cover_art",
+    "file",
+    "genre",
+    "hash",
+    "magnet",
+    "playlist",
+    "track",
+    "user",
+]
+
+
+class AsyncTable:
+    """Awaitable proxy of a `Table`, e.g. `await db.track.get(...)`"""
+
+    def __init__(self, run: Callable, name: str):
+        self._run = run
+        self._name = name
+
+    def __getattr__(self, method: str) -> Callable:
+        async def call(*args, **kwargs) -> Any:
+            return await self._run(
+                lambda db: getattr(getattr(db, self._name), method)(*args, **kwargs)
+            )
+
+        call.__name__ = method
+        return call
+
+
+class AsyncXasdDB:
+    def __init__(self, run: Callable):
+        """
+        Use `from_async_session` or `from_session` rather than creating this directly.
+
+        Args:
+            run (Callable): Coroutine function that calls a function with a `XasdDB` and returns the result
+        """
+        self._run = run
+
+        for name in TABLES:
+            setattr(self, name, AsyncTable(run, name))
+
+    @classmethod
+    def from_async_session(cls, session: AsyncSession) -> "AsyncXasdDB":
+        db = XasdDB(session=session.sync_session)
+
+        async def run(function: Callable) -> Any:
+            return await session.run_sync(lambda _: function(db))
+
+        return cls(run)
+
+    @classmethod
+    def from_session(cls, session: sqlalchemy.orm.session.Session) -> "AsyncXasdDB":
+        db = XasdDB(session=session)
+
+        async def run(function: Callable) -> Any:
+            return await asyncio.to_thread(function, db)
+
+        return cls(run)
+
+    def __getattr__(self, method: str) -> Callable:
+        """`XasdDB` methods, e.g. `await db.search_all(...)`"""
+
+        async def call(*args, **kwargs) -> Any:
+            return await self._run(lambda db: getattr(db, method)(*args, **kwargs))
+
+        call.__name__ = method
+        return call
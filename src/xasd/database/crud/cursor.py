@@ -0,0 +1,62 @@
+"""Opaque cursors for keyset pagination
+
+A cursor holds the sort key of the last entity on a page, the next page starts after it.
+Unlike OFFSET, the database seeks straight to the key using an index, so every page costs the same.
+"""
+import base64
+import binascii
+import json
+
+import sqlalchemy
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last entity on a page as an opaque cursor"""
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    """Decode a cursor created by `encode_cursor`
+
+    Args:
+        cursor (str): The cursor
+        length (int): Number of values the sort key should have
+
+    Raises:
+        InvalidCursor: If the cursor wasn't created by `encode_cursor` for this sort key
+
+    Returns:
+        list: The sort key values
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("Invalid cursor")
+
+    return values
+
+
+def after(columns: list[sqlalchemy.Column], values: list):
+    """Filter for rows that sort after `values` when ordered by `columns`
+
+    Expanded from `(a, b) > (x, y)` to `a > x OR (a = x AND b > y)`,
+    which every database can turn into an index range scan.
+    """
+    return sqlalchemy.or_(
+        *(
+            sqlalchemy.and_(
+                *(column == value for column, value in zip(columns[:i], values[:i])),
+                columns[i] > values[i],
+            )
+            for i in range(len(columns))
+        )
+    )
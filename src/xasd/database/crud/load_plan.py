@@ -0,0 +1,78 @@
+"""Relationship load plans derived from pydantic response schemas.
+
+The API returns nested pydantic models (e.g. `schemas.Track` contains `file`, `artist`,
+`album.cover_art` and `genre`). With the default lazy relationships every nested attribute
+is a separate SELECT per row. A load plan walks the schema and eagerly loads exactly the
+relationships it will touch, so a response costs a bounded number of queries.
+"""
+import functools
+import typing
+from typing import Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+
+def schema_type(field_type) -> Optional[Type[BaseModel]]:
+    """Unwrap `Optional[...]` and return the pydantic model, if the field is one"""
+    if typing.get_origin(field_type) is typing.Union:
+        args = [arg for arg in typing.get_args(field_type) if arg is not type(None)]
+        if len(args) != 1:
+            return None
+        field_type = args[0]
+
+    if isinstance(field_type, type) and issubclass(field_type, BaseModel):
+        return field_type
+
+    return None
+
+
+def _relationship_options(model, schema: Type[BaseModel], seen: frozenset) -> list:
+    relationships = inspect(model).relationships
+    options = []
+
+    for name, field in schema.__fields__.items():
+        if name not in relationships:
+            continue
+
+        nested_schema = schema_type(field.type_)
+        if nested_schema is None:
+            continue
+
+        relationship = relationships[name]
+        target = relationship.mapper.class_
+
+        # Collections are fetched with one extra `IN` query, scalar relations are joined
+        # onto the parent query so LIMIT/OFFSET still apply to the parent rows.
+        loader = selectinload if relationship.uselist else joinedload
+        option = loader(getattr(model, name))
+
+        if (target, nested_schema) not in seen:
+            nested = _relationship_options(
+                target, nested_schema, seen | {(target, nested_schema)}
+            )
+            if nested:
+                option = option.options(*nested)
+
+        options.append(option)
+
+    return options
+
+
+@functools.lru_cache(maxsize=None)
+def load_plan(model, schema: Optional[Type[BaseModel]] = None) -> Tuple:
+    """Build the loader options needed to serialise `model` rows as `schema`
+
+    Args:
+        model (Base): sqlalchemy model being queried
+        schema (BaseModel, optional): pydantic model the rows will be returned as.
+            Defaults to None which eagerly loads nothing.
+
+    Returns:
+        tuple: loader options to pass to `Query.options`
+    """
+    if schema is None:
+        return ()
+
+    return tuple(_relationship_options(model, schema, frozenset({(model, schema)})))
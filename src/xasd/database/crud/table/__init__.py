@@ -1,7 +1,12 @@
 import logging
 import sqlalchemy
+from sqlalchemy.orm import make_transient_to_detached
 from typing import Optional
 
+from xasd.database.crud.load_plan import load_plan
+from xasd.database.search import SEARCHABLE_COLUMNS
+from xasd.database.search.like import LikeSearch
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,10 +22,13 @@ class Table:
         name: Optional[str] = None,
         table: Optional[sqlalchemy.Table] = None,
         filter: Optional[list] = False,
+        schema=None,
     ):
         """Get an entity if one doesn't exist with the given name (or by given filter)
         Args:
             filter (bool, optional): Optional `where` list . Defaults to False which is filter by `this.main_column`.
+            schema (BaseModel, optional): pydantic schema the entity will be returned as,
+                its relationships are eagerly loaded. Defaults to None.
 
         Returns:
             (object, None): pre-existing entity object, or `None` if no entity is found
@@ -31,7 +39,12 @@ class Table:
         if not filter:
             filter = [self.main_column == name]
 
-        entity = self._session.query(table).filter(*filter).first()
+        entity = (
+            self._session.query(table)
+            .options(*load_plan(table, schema))
+            .filter(*filter)
+            .first()
+        )
 
         if entity:
             return entity
@@ -56,6 +69,51 @@ class Table:
 
         return entity
 
+    def insert_or_ignore(self, **kwargs: dict):
+        """Atomically create an entity, unless it would violate a unique constraint
+
+        Unlike `create` this doesn't look for an existing entity first, it relies on the
+        database's unique indexes, so concurrent inserts of the same entity can't both succeed.
+
+        n.b. The row is inserted with a Core `INSERT`, and the entity attached afterwards,
+        so it's never in `session.new`: session event listeners (`HammingIndex.watch`,
+        `MemoryIndex.watch`, `ResponseCache.watch`) don't see it. A caller keeping one of those
+        up to date must add the entity itself, e.g. the uploader with `HammingIndex.add`.
+
+        Args:
+            **kwargs: Entity column values
+
+        Returns:
+            (object, bool): newly created entity object, or `False` if it already exists.
+        """
+        dialect = self._session.get_bind().dialect.name
+        statement = sqlalchemy.insert(self.table).values(**kwargs)
+
+        if dialect in ("mysql", "mariadb"):
+            statement = statement.prefix_with("IGNORE")
+        elif dialect == "sqlite":
+            statement = statement.prefix_with("OR IGNORE")
+        else:
+            # No portable insert-or-ignore, fall back to select-then-insert
+            return self.create(**kwargs)
+
+        result = self._session.execute(statement)
+        self._session.commit()
+
+        if result.rowcount == 0:
+            return False
+
+        # Attach the new row to the session without selecting it back
+        entity = self.table(**kwargs)
+        for column, value in zip(
+            sqlalchemy.inspect(self.table).primary_key, result.inserted_primary_key
+        ):
+            setattr(entity, column.key, value)
+        make_transient_to_detached(entity)
+        self._session.add(entity)
+
+        return entity
+
     def update(self, entity, **kwargs: dict) -> object:
         """Update an entity
 
@@ -79,25 +137,43 @@ class Table:
         self._session.delete(entity)
         self._session.commit()
 
-    def search(self, query, query_column: Optional[sqlalchemy.Column] = None):
+    def search(
+        self,
+        query,
+        query_column: Optional[sqlalchemy.Column] = None,
+        schema=None,
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ):
         """Search for an entity by name
 
         Args:
             query (str): String to search for
             query_column (sqlalchemy.Column, optional): Column to search in. Defaults to None which is `this.main_column`.
+            schema (BaseModel, optional): pydantic schema the entities will be returned as,
+                their relationships are eagerly loaded. Defaults to None.
+            skip (int, optional): Number of entities to skip pass. Defaults to 0.
+            limit (int, optional): Number of entities to return. Defaults to None, no limit.
 
         Returns:
-            list[entity]: List of entities
+            list[entity]: List of entities, best matches first
 
         n.b.
-            This is a very simple search that just looks for the query string anywhere in the title.
-            It's not very good, but it's good enough for now.
+            The search engine (FULLTEXT, FTS5 or ILIKE) is chosen by `Session` from the database dialect.
+            Columns without a full text index (not in `SEARCHABLE_COLUMNS`) are always searched with ILIKE.
         """
         if not query_column:
             query_column = self.main_column
 
-        return (
-            self._session.query(self.table)
-            .filter(query_column.ilike(f"%{query}%"))
-            .all()
+        search_engine = LikeSearch
+        if any(query_column is column for column in SEARCHABLE_COLUMNS):
+            search_engine = self._session.info.get("search_engine", LikeSearch)
+
+        return search_engine(self._session).search(
+            self.table,
+            query_column,
+            query,
+            options=load_plan(self.table, schema),
+            skip=skip,
+            limit=limit,
         )
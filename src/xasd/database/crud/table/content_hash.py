@@ -0,0 +1,13 @@
+import sqlalchemy
+
+from xasd.database.crud.table import Table
+from xasd.database.models import ContentHash as ContentHashModel
+
+
+class ContentHash(Table):
+    table = ContentHashModel
+
+    def __init__(self, session: sqlalchemy.orm.session.Session):
+        super().__init__(session)
+
+        self.main_column = ContentHashModel.digest
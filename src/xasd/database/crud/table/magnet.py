@@ -0,0 +1,13 @@
+import sqlalchemy
+
+from xasd.database.crud.table import Table
+from xasd.database.models import Magnet as MagnetModel
+
+
+class Magnet(Table):
+    table = MagnetModel
+
+    def __init__(self, session: sqlalchemy.orm.session.Session):
+        super().__init__(session)
+
+        self.main_column = MagnetModel.infohash
@@ -1,5 +1,6 @@
 import sqlalchemy
 
+from xasd.database.crud.load_plan import load_plan
 from xasd.database.crud.table import Table
 from xasd.database.models import Playlist as PlaylistModel
 from xasd.database.models import Track as TrackModel
@@ -13,8 +14,26 @@ class Playlist(Table):
 
         self.main_column = PlaylistModel.name
 
+    def get_user_playlists(self, user, schema=None):
+        """Get all playlists owned by a user
+
+        Args:
+            user (UserModel): Playlist owner
+            schema (BaseModel, optional): pydantic schema the playlists will be returned as,
+                their relationships are eagerly loaded. Defaults to None.
+
+        Returns:
+            list[PlaylistModel]: Playlists
+        """
+        return (
+            self._session.query(PlaylistModel)
+            .options(*load_plan(PlaylistModel, schema))
+            .filter(PlaylistModel.owner_id == user.user_id)
+            .all()
+        )
+
     def add_track_to_playlist(self, playlist, track):
-        """Add a track to a playlist
+        """Add a track to a playlist, if it isn't already in it
 
         Args:
             playlist (PlaylistModel): Playlist
@@ -22,9 +41,14 @@ class Playlist(Table):
 
         Returns:
             PlaylistModel: Playlist
+
+        n.b.
+            The association table has one row per playlist and track either way, but an async
+            session doesn't expire the playlist on commit, so the track would be listed twice.
         """
-        playlist.tracks.append(track)
-        self._session.commit()
+        if track not in playlist.tracks:
+            playlist.tracks.append(track)
+            self._session.commit()
 
         return playlist
 
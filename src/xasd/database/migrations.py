@@ -0,0 +1,300 @@
+"""Schema migrations
+
+`Base.metadata.create_all` only creates tables that don't exist yet, so changes to existing
+tables (e.g. new indexes) are applied here. Each migration runs once, in order, and the
+applied version is stored in the `schema_version` table.
+
+A brand new database is created with the full schema by `create_all`,
+so every migration must be idempotent.
+
+Every process connecting to the database migrates it, so migrations are applied holding
+a database wide lock, and one process applies them while the others wait.
+"""
+
+import contextlib
+import logging
+from typing import Callable, Iterator
+
+import sqlalchemy
+
+from xasd.database import Base
+
+logger = logging.getLogger(__name__)
+
+schema_version_table = sqlalchemy.Table(
+    "schema_version",
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column("version", sqlalchemy.Integer, primary_key=True),
+)
+
+
+def _index(name: str) -> sqlalchemy.Index:
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"No index named {name}")
+
+
+def _create_indexes(connection: sqlalchemy.Connection, *names: str) -> None:
+    """Create the named indexes, as declared on the models, if they don't already exist"""
+    inspector = sqlalchemy.inspect(connection)
+    for name in names:
+        index = _index(name)
+        existing = {ix["name"] for ix in inspector.get_indexes(index.table.name)}
+        if name in existing:
+            continue
+
+        logger.info(f"Creating index {name}")
+        index.create(connection)
+
+
+def _duplicates(
+    connection: sqlalchemy.Connection, column: sqlalchemy.Column
+) -> list[tuple]:
+    """(value, lowest primary key, other primary keys) of each duplicate `column` value"""
+    primary_key = column.table.primary_key.columns.values()[0]
+    duplicates = connection.execute(
+        sqlalchemy.select(column, sqlalchemy.func.min(primary_key))
+        .where(column.isnot(None))
+        .group_by(column)
+        .having(sqlalchemy.func.count() > 1)
+    ).all()
+
+    return [
+        (
+            value,
+            keep,
+            connection.execute(
+                sqlalchemy.select(primary_key).where(
+                    column == value, primary_key != keep
+                )
+            )
+            .scalars()
+            .all(),
+        )
+        for value, keep in duplicates
+    ]
+
+
+def _deduplicate(
+    connection: sqlalchemy.Connection,
+    column: sqlalchemy.Column,
+    references: list[sqlalchemy.Column] = [],
+) -> None:
+    """Remove rows with a duplicate `column` value, keeping the row with the lowest primary key.
+    Foreign keys in `references` that point at a removed row are pointed at the kept row.
+    A reference that's part of an association table's primary key is merged,
+    so e.g. a playlist with both the kept and a removed track has the kept track once.
+    """
+    table = column.table
+    primary_key = table.primary_key.columns.values()[0]
+
+    for value, keep, removed_ids in _duplicates(connection, column):
+        logger.warning(f"Removing duplicate {column} rows with value {value}")
+
+        for reference in references:
+            if reference.primary_key:
+                _merge_association(connection, reference, removed_ids, keep)
+                continue
+            connection.execute(
+                sqlalchemy.update(reference.table)
+                .where(reference.in_(removed_ids))
+                .values({reference.name: keep})
+            )
+        connection.execute(sqlalchemy.delete(table).where(primary_key.in_(removed_ids)))
+
+
+def _rename_duplicates(
+    connection: sqlalchemy.Connection, column: sqlalchemy.Column
+) -> None:
+    """Rename rows with a duplicate `column` value to `<value>#<primary key>`, but for the row with the
+    lowest primary key. For rows which aren't interchangeable, e.g. user accounts, unlike `_deduplicate`.
+    """
+    table = column.table
+    primary_key = table.primary_key.columns.values()[0]
+
+    for value, keep, renamed in _duplicates(connection, column):
+        logger.warning(
+            f"Renaming duplicate {column} {value!r} of {primary_key} {renamed}, "
+            f"keeping {keep}"
+        )
+        for id in renamed:
+            suffix = f"#{id}"
+            # Shortened to fit, if the column has a length
+            length = getattr(column.type, "length", None)
+            name = value[: length - len(suffix)] if length else value
+            connection.execute(
+                sqlalchemy.update(table)
+                .where(primary_key == id)
+                .values({column.name: f"{name}{suffix}"})
+            )
+
+
+def _merge_association(
+    connection: sqlalchemy.Connection,
+    reference: sqlalchemy.Column,
+    removed_ids: list,
+    keep,
+) -> None:
+    """Point the association rows of `removed_ids` at `keep`, without duplicating a primary key"""
+    association = reference.table
+    others = [c for c in association.primary_key.columns if c is not reference]
+    merged = reference.in_([*removed_ids, keep])
+
+    rows = connection.execute(sqlalchemy.select(*others).where(merged).distinct()).all()
+    connection.execute(sqlalchemy.delete(association).where(merged))
+    if rows:
+        connection.execute(
+            sqlalchemy.insert(association),
+            [{**row._mapping, reference.name: keep} for row in rows],
+        )
+
+
+def _add_lookup_indexes(connection: sqlalchemy.Connection) -> None:
+    """Index the columns used by `Table.get`/`Table.create`, and make them unique where they should be"""
+    tables = Base.metadata.tables
+
+    _deduplicate(connection, tables["hash"].c.hash, [tables["file"].c.hash_id])
+    _deduplicate(connection, tables["magnet"].c.infohash)
+    # Accounts aren't interchangeable, so they're renamed rather than merged
+    _rename_duplicates(connection, tables["user"].c.name)
+    _deduplicate(connection, tables["file"].c.filepath, [tables["track"].c.file_id])
+    # A file has one track, merging files with the same path can leave it with several
+    _deduplicate(
+        connection,
+        tables["track"].c.file_id,
+        [tables["playlist_association_table"].c.right_id],
+    )
+
+    _create_indexes(
+        connection,
+        "ix_artist_name",
+        "ix_genre_name",
+        "ix_hash_hash",
+        "ix_magnet_infohash",
+        "ix_user_name",
+        "ix_album_name",
+        "ix_album_artist_id",
+        "ix_file_filepath",
+        "ix_playlist_owner_id",
+        "ix_cover_art_album_id",
+        "ix_track_artist_id",
+        "ix_track_album_id",
+        "ix_track_title",
+    )
+
+
+def _add_columns(connection: sqlalchemy.Connection, table: str, *names: str) -> None:
+    """Add the named columns, as declared on the models, if they don't already exist"""
+    existing = {
+        column["name"] for column in sqlalchemy.inspect(connection).get_columns(table)
+    }
+    preparer = connection.dialect.identifier_preparer
+    for name in names:
+        if name in existing:
+            continue
+
+        column = Base.metadata.tables[table].c[name]
+        logger.info(f"Adding column {table}.{name}")
+        connection.execute(
+            sqlalchemy.text(
+                f"ALTER TABLE {preparer.quote(table)} ADD COLUMN "
+                f"{preparer.quote(name)} {column.type.compile(dialect=connection.dialect)}"
+            )
+        )
+
+
+def _add_file_properties(connection: sqlalchemy.Connection) -> None:
+    """Store the audio properties read by `xasd.uploader.probe` on each file"""
+    _add_columns(
+        connection,
+        "file",
+        "mimetype",
+        "size",
+        "duration",
+        "bitrate",
+        "sample_rate",
+        "channels",
+    )
+
+
+# (version, description, migration), in the order they are applied
+MIGRATIONS: list[tuple[int, str, Callable[[sqlalchemy.Connection], None]]] = [
+    (1, "add lookup indexes and unique constraints", _add_lookup_indexes),
+    (2, "add audio properties to file", _add_file_properties),
+]
+
+
+# Seconds a process waits for another to finish migrating
+LOCK_TIMEOUT = 600
+
+
+@contextlib.contextmanager
+def _migration_lock(
+    engine: sqlalchemy.engine.Engine,
+) -> Iterator[sqlalchemy.Connection]:
+    """A connection holding a database wide lock, so processes migrate one at a time
+
+    On SQLite the lock is the database's write lock, taken with `BEGIN IMMEDIATE`,
+    so the migrations are applied in that transaction and committed together.
+    On MySQL it's a named lock, held by the connection across transactions.
+    """
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            yield connection
+            connection.commit()
+        elif dialect in ("mysql", "mariadb"):
+            acquired = connection.execute(
+                sqlalchemy.text("SELECT GET_LOCK('xasd_migrate', :timeout)"),
+                {"timeout": LOCK_TIMEOUT},
+            ).scalar()
+            connection.commit()
+            if acquired != 1:
+                raise TimeoutError("Timed out waiting for another process to migrate")
+            try:
+                yield connection
+            finally:
+                connection.execute(
+                    sqlalchemy.text("SELECT RELEASE_LOCK('xasd_migrate')")
+                )
+                connection.commit()
+        else:
+            yield connection
+            connection.commit()
+
+
+def migrate(engine: sqlalchemy.engine.Engine) -> int:
+    """Apply any migrations that haven't been applied to the database yet
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database engine
+
+    Returns:
+        int: The schema version of the database
+    """
+    with _migration_lock(engine) as connection:
+        # Read holding the lock, so migrations applied by another process meanwhile are skipped
+        schema_version_table.create(connection, checkfirst=True)
+        current = connection.execute(
+            sqlalchemy.select(sqlalchemy.func.max(schema_version_table.c.version))
+        ).scalar()
+        current = current or 0
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+
+            logger.info(f"Applying migration {version}: {description}")
+            migration(connection)
+            connection.execute(
+                sqlalchemy.insert(schema_version_table).values(version=version)
+            )
+            if connection.dialect.name != "sqlite":
+                # Committed one by one, as MySQL commits their DDL anyway
+                connection.commit()
+            current = version
+
+    return current
@@ -2,7 +2,10 @@
 """
 from sqlalchemy.orm import relationship
 from sqlalchemy import (
+    BigInteger,
+    Float,
     ForeignKey,
+    Index,
     Table,
     Column,
     Integer,
@@ -23,7 +26,7 @@ class User(Base):
     __tablename__ = "user"
 
     user_id = Column(Integer, primary_key=True)
-    name = Column(String(32))
+    name = Column(String(32), index=True, unique=True)
     email_address = Column(String(128))
     password_hash = Column(String(128))
     playlists = relationship("Playlist", back_populates="owner")
@@ -33,9 +36,17 @@ class File(Base):
     __tablename__ = "file"
 
     file_id = Column(Integer, primary_key=True)
-    filepath = Column(String(64), nullable=False)
+    filepath = Column(String(64), nullable=False, index=True, unique=True)
     track = relationship("Track", uselist=False, back_populates="file")
 
+    # Read from the file by `xasd.uploader.probe` when it was uploaded
+    mimetype = Column(String(32), nullable=True)
+    size = Column(BigInteger, nullable=True)
+    duration = Column(Float, nullable=True)
+    bitrate = Column(Integer, nullable=True)
+    sample_rate = Column(Integer, nullable=True)
+    channels = Column(Integer, nullable=True)
+
     hash_id = Column(ForeignKey("hash.hash_id"))
     hash = relationship("Hash", back_populates="file")
 
@@ -45,7 +56,7 @@ class CoverArt(Base):
 
     cover_art_id = Column(Integer, primary_key=True)
     filepath = Column(String(64), nullable=False)
-    album_id = Column(ForeignKey("album.album_id"))
+    album_id = Column(ForeignKey("album.album_id"), index=True)
     album = relationship("Album", back_populates="cover_art")
 
 
@@ -53,17 +64,17 @@ class Track(Base):
     __tablename__ = "track"
 
     track_id = Column(Integer, primary_key=True)
-    title = Column(String(128), nullable=True)
+    title = Column(String(128), nullable=True, index=True)
     tracknumber = Column(String(32), nullable=True)
     date = Column(String(32), nullable=True)
 
     file_id = Column(ForeignKey("file.file_id"))
     file = relationship("File", back_populates="track")
 
-    album_id = Column(ForeignKey("album.album_id"))
+    album_id = Column(ForeignKey("album.album_id"), index=True)
     album = relationship("Album", back_populates="tracks")
 
-    artist_id = Column(ForeignKey("artist.artist_id"))
+    artist_id = Column(ForeignKey("artist.artist_id"), index=True)
     artist = relationship("Artist", back_populates="tracks")
 
     genre_id = Column(ForeignKey("genre.genre_id"))
@@ -78,7 +89,7 @@ class Artist(Base):
     __tablename__ = "artist"
 
     artist_id = Column(Integer, primary_key=True)
-    name = Column(String(128), nullable=False)
+    name = Column(String(128), nullable=False, index=True)
     albums = relationship("Album", back_populates="artist")
     tracks = relationship("Track", back_populates="artist")
 
@@ -87,8 +98,8 @@ class Album(Base):
     __tablename__ = "album"
 
     album_id = Column(Integer, primary_key=True)
-    name = Column(String(128), nullable=False)
-    artist_id = Column(Integer, ForeignKey("artist.artist_id"))
+    name = Column(String(128), nullable=False, index=True)
+    artist_id = Column(Integer, ForeignKey("artist.artist_id"), index=True)
     artist = relationship("Artist", back_populates="albums")
     tracks = relationship("Track", back_populates="album")
     cover_art = relationship("CoverArt", uselist=False, back_populates="album")
@@ -98,7 +109,7 @@ class Genre(Base):
     __tablename__ = "genre"
 
     genre_id = Column(Integer, primary_key=True)
-    name = Column(String(64), nullable=True)
+    name = Column(String(64), nullable=True, index=True)
     tracks = relationship("Track", back_populates="genre")
 
 
@@ -106,7 +117,7 @@ class Playlist(Base):
     __tablename__ = "playlist"
 
     playlist_id = Column(Integer, primary_key=True)
-    owner_id = Column(Integer, ForeignKey("user.user_id"))
+    owner_id = Column(Integer, ForeignKey("user.user_id"), index=True)
     owner = relationship("User", back_populates="playlists")
     name = Column(String(64), nullable=False)
     tracks = relationship(
@@ -118,12 +129,27 @@ class Hash(Base):
     __tablename__ = "hash"
 
     hash_id = Column(Integer, primary_key=True)
-    hash = Column(String(32), nullable=False)
+    hash = Column(String(32), nullable=False, index=True, unique=True)
     file = relationship("File", uselist=False, back_populates="hash")
 
 
+class ContentHash(Base):
+    """Size and BLAKE2b digest of the bytes of a file the uploader has seen,
+    and the perceptual hash it had, so an identical file is skipped without decoding it"""
+
+    __tablename__ = "content_hash"
+    __table_args__ = (
+        Index("ix_content_hash_size_digest", "size", "digest", unique=True),
+    )
+
+    content_hash_id = Column(Integer, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    digest = Column(String(64), nullable=False)
+    hash_id = Column(ForeignKey("hash.hash_id"))
+
+
 class Magnet(Base):
     __tablename__ = "magnet"
 
     magnet_id = Column(Integer, primary_key=True)
-    infohash = Column(String(64))
+    infohash = Column(String(64), index=True, unique=True)
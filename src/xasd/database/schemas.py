@@ -35,6 +35,12 @@ class TokenData(BaseModel):
 
 class FileBase(BaseModel):
     filepath: str
+    mimetype: Optional[str] = None
+    size: Optional[int] = None
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
 
 
 class FileCreate(FileBase):
@@ -166,9 +172,24 @@ class SearchListResponse(BaseModel):
     artists: list[Optional[Artist]]
 
 
+class SearchSuggestion(BaseModel):
+    type: str
+    id: int
+    name: str
+
+
+class PasswordHashingStats(BaseModel):
+    workers: int
+    queued: int
+    running: int
+    completed: int
+    rejected: int
+
+
 class HealthCheckResponse(BaseModel):
     status: str
     time: datetime
+    password_hashing: Optional[PasswordHashingStats] = None
 
 
 Track.update_forward_refs()
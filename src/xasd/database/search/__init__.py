@@ -0,0 +1,102 @@
+"""Search backends used by `Table.search` and `XasdDB.search_all`
+
+The backend is chosen from the database dialect when the `Session` connects:
+    - mysql/mariadb: FULLTEXT indexes queried with `MATCH ... AGAINST`
+    - sqlite: FTS5 virtual tables kept in sync with triggers
+    - anything else (or if the above can't be set up): `ILIKE '%q%'` scans
+"""
+import logging
+import re
+from typing import Optional
+
+import sqlalchemy
+
+from xasd.database import models
+
+logger = logging.getLogger(__name__)
+
+# Columns that get a full text index, and can be searched with something other than `LikeSearch`
+SEARCHABLE_COLUMNS = [
+    models.Track.title,
+    models.Artist.name,
+    models.Album.name,
+]
+
+
+class SearchEngine:
+    name: str
+
+    def __init__(self, session: sqlalchemy.orm.session.Session):
+        self._session = session
+
+    @classmethod
+    def setup(cls, engine: sqlalchemy.engine.Engine) -> None:
+        """Create any index structures the search engine needs. Must be idempotent.
+
+        Args:
+            engine (sqlalchemy.engine.Engine): Engine to create the indexes with
+
+        Raises:
+            sqlalchemy.exc.OperationalError: If the indexes can't be created
+        """
+
+    def search(
+        self,
+        table,
+        column: sqlalchemy.Column,
+        query: str,
+        options: tuple = (),
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> list:
+        """Search `column` of `table` for `query`, best matches first
+
+        Args:
+            table (Base): sqlalchemy model to query
+            column (sqlalchemy.Column): Column to search in
+            query (str): String to search for
+            options (tuple, optional): Loader options to apply to the query. Defaults to ().
+            skip (int, optional): Number of entities to skip pass. Defaults to 0.
+            limit (int, optional): Number of entities to return. Defaults to None, no limit.
+
+        Returns:
+            list[entity]: List of entities
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not implement search")
+
+    @staticmethod
+    def terms(query: str) -> list[str]:
+        """Split a search query into the words that are matched on"""
+        return re.findall(r"\w+", query)
+
+
+def select_search_engine(engine: sqlalchemy.engine.Engine) -> type[SearchEngine]:
+    """Pick the best search engine for the database dialect and set up its indexes
+
+    Args:
+        engine (sqlalchemy.engine.Engine): Database engine
+
+    Returns:
+        type[SearchEngine]: Search engine class, falls back to `LikeSearch`
+    """
+    from xasd.database.search.like import LikeSearch
+    from xasd.database.search.mysql import MySQLSearch
+    from xasd.database.search.sqlite import SQLiteSearch
+
+    engines = {
+        "mysql": MySQLSearch,
+        "mariadb": MySQLSearch,
+        "sqlite": SQLiteSearch,
+    }
+
+    search_engine = engines.get(engine.dialect.name, LikeSearch)
+    try:
+        search_engine.setup(engine)
+    except sqlalchemy.exc.DBAPIError as e:
+        logger.warning(
+            f"Unable to set up {search_engine.name} search, falling back to {LikeSearch.name}: {e}"
+        )
+        return LikeSearch
+
+    logger.info(f"Using {search_engine.name} search")
+    return search_engine
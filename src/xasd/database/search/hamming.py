@@ -0,0 +1,269 @@
+"""In-process index of perceptual hashes, for finding near-duplicate audio
+
+A file re-encoded at another bitrate gets a hash a few bits away from the original,
+so uniqueness of the `hash` column alone doesn't catch it.
+
+The index uses multi-index hashing: each hash is split into `threshold + 1` (or more) parts,
+and two hashes within `threshold` bits of each other must have at least one part in common.
+Each part is kept as a sorted array, binary searched for the parts of a query hash,
+and only those candidates have their Hamming distance calculated.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy import event
+
+from xasd.database import models
+
+logger = logging.getLogger(__name__)
+
+# Bits in a hash from `xasd.uploader.dejavu.fingerprint`, a 9x9 phash
+HASH_BITS = 81
+
+_U64 = (1 << 64) - 1
+
+
+def _part(hi: np.ndarray, lo: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Bits [start, end) of 128 bit values stored as high and low 64 bit halves"""
+    if end <= 64:
+        value = lo >> np.uint64(start)
+    elif start >= 64:
+        value = hi >> np.uint64(start - 64)
+    else:
+        value = (lo >> np.uint64(start)) | (hi << np.uint64(64 - start))
+    return (value & np.uint64((1 << (end - start)) - 1)).astype(np.uint32)
+
+
+class HammingIndex:
+    """
+    Index of `Hash` rows, answering "which hashes are within `threshold` bits of this one?"
+
+    Like `MemoryIndex` it's built with `refresh`, which only reads rows newer than the last refresh,
+    and rows committed through a session from a sessionmaker passed to `watch` are added immediately.
+    `save` and `load` keep the index between runs, so only new rows are read from the database at startup.
+
+    Added hashes are kept in a short list which is searched linearly,
+    and merged into the sorted arrays every `MERGE_SIZE` hashes.
+    """
+
+    MERGE_SIZE = 4096
+
+    def __init__(self, threshold: int = 4, bits: int = HASH_BITS):
+        """
+        Args:
+            threshold (int, optional): Largest distance `find` can search for. Defaults to 4.
+            bits (int, optional): Bits in a hash. Defaults to `HASH_BITS`.
+        """
+        if not 0 <= threshold < bits:
+            raise ValueError(f"threshold must be between 0 and {bits - 1}")
+
+        self.threshold = threshold
+        self.bits = bits
+
+        # Parts are at most 32 bits, so they can be stored as uint32
+        parts = max(threshold + 1, -(-bits // 32))
+        self._ranges = [
+            (i * bits // parts, (i + 1) * bits // parts) for i in range(parts)
+        ]
+
+        self._ids = np.empty(0, dtype=np.uint64)
+        self._hi = np.empty(0, dtype=np.uint64)
+        self._lo = np.empty(0, dtype=np.uint64)
+        # Per part: part values sorted, and the entry number of each
+        self._keys = [np.empty(0, dtype=np.uint32) for _ in self._ranges]
+        self._order = [np.empty(0, dtype=np.int64) for _ in self._ranges]
+        self._pending: list[tuple[int, int]] = []
+
+        self._last_id = 0
+        self._watched: set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._pending)
+
+    def add(self, hash_id: int, hash: str, watched: bool = False) -> None:
+        with self._lock:
+            self._pending.append((hash_id, int(hash, 16)))
+            if watched:
+                # Rows committed in this process can overtake rows from other processes,
+                # remember them so `refresh` neither skips nor duplicates anything
+                self._watched.add(hash_id)
+            if len(self._pending) >= self.MERGE_SIZE:
+                self._merge()
+
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+
+        ids, values = zip(*self._pending)
+        self._pending = []
+        hi = np.array([value >> 64 for value in values], dtype=np.uint64)
+        lo = np.array([value & _U64 for value in values], dtype=np.uint64)
+
+        first = len(self._ids)
+        self._ids = np.concatenate((self._ids, np.array(ids, dtype=np.uint64)))
+        self._hi = np.concatenate((self._hi, hi))
+        self._lo = np.concatenate((self._lo, lo))
+
+        entries = np.arange(first, first + len(ids))
+        for i, (start, end) in enumerate(self._ranges):
+            keys = _part(hi, lo, start, end)
+            order = np.argsort(keys, kind="stable")
+            positions = np.searchsorted(self._keys[i], keys[order], side="right")
+            self._keys[i] = np.insert(self._keys[i], positions, keys[order])
+            self._order[i] = np.insert(self._order[i], positions, entries[order])
+
+    def _build(self) -> None:
+        """Sort the parts of every hash, after the arrays are replaced by `load`"""
+        for i, (start, end) in enumerate(self._ranges):
+            keys = _part(self._hi, self._lo, start, end)
+            order = np.argsort(keys, kind="stable")
+            self._keys[i] = keys[order]
+            self._order[i] = order
+
+    def find(self, hash: str, threshold: Optional[int] = None) -> list[tuple[int, int]]:
+        """Find stored hashes within `threshold` bits of `hash`
+
+        Args:
+            hash (str): Hex hash to search for
+            threshold (int, optional): Largest distance to match, at most the index's threshold.
+                Defaults to the index's threshold.
+
+        Returns:
+            list[tuple[int, int]]: `(hash_id, distance)` of each match, closest first
+        """
+        if threshold is None:
+            threshold = self.threshold
+        elif threshold > self.threshold:
+            raise ValueError(f"threshold is at most {self.threshold} for this index")
+
+        value = int(hash, 16)
+        matches = []
+        with self._lock:
+            candidates = set()
+            for (start, end), keys, order in zip(self._ranges, self._keys, self._order):
+                key = (value >> start) & ((1 << (end - start)) - 1)
+                left = np.searchsorted(keys, key, side="left")
+                right = np.searchsorted(keys, key, side="right")
+                candidates.update(order[left:right].tolist())
+
+            for entry in candidates:
+                stored = (int(self._hi[entry]) << 64) | int(self._lo[entry])
+                distance = bin(value ^ stored).count("1")
+                if distance <= threshold:
+                    matches.append((int(self._ids[entry]), distance))
+
+            for hash_id, stored in self._pending:
+                distance = bin(value ^ stored).count("1")
+                if distance <= threshold:
+                    matches.append((hash_id, distance))
+
+        return sorted(matches, key=lambda match: (match[1], match[0]))
+
+    def refresh(self, session: sqlalchemy.orm.session.Session) -> int:
+        """Add rows inserted since the last refresh
+
+        Args:
+            session (sqlalchemy.orm.session.Session): Database session
+
+        Returns:
+            int: Number of rows added
+        """
+        rows = session.execute(
+            sqlalchemy.select(models.Hash.hash_id, models.Hash.hash)
+            .where(models.Hash.hash_id > self._last_id)
+            .order_by(models.Hash.hash_id)
+        )
+
+        added = 0
+        with self._lock:
+            for hash_id, hash in rows:
+                if hash_id in self._watched:
+                    self._watched.discard(hash_id)
+                else:
+                    self._pending.append((hash_id, int(hash, 16)))
+                    added += 1
+                self._last_id = hash_id
+            # One merge, rather than one per `MERGE_SIZE` rows
+            self._merge()
+
+        if added:
+            logger.info(f"Added {added} hashes to the near-duplicate index")
+        return added
+
+    def save(self, path: str) -> None:
+        """Write the index to `path`, replacing it atomically"""
+        with self._lock:
+            self._merge()
+            with open(f"{path}.tmp", "wb") as file:
+                np.savez(
+                    file,
+                    bits=self.bits,
+                    last_id=self._last_id,
+                    watched=np.array(sorted(self._watched), dtype=np.uint64),
+                    ids=self._ids,
+                    hi=self._hi,
+                    lo=self._lo,
+                )
+            os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(
+        cls, path: str, threshold: int = 4, bits: int = HASH_BITS
+    ) -> "HammingIndex":
+        """Read an index written by `save`
+
+        The threshold can differ from the saved index's, the parts are rebuilt for it.
+        An empty index is returned if `path` doesn't exist, or was saved with a different number of bits.
+
+        Args:
+            path (str): Path the index was saved to
+            threshold (int, optional): Largest distance `find` can search for. Defaults to 4.
+            bits (int, optional): Bits in a hash. Defaults to `HASH_BITS`.
+        """
+        index = cls(threshold=threshold, bits=bits)
+        if not os.path.exists(path):
+            return index
+
+        with np.load(path) as saved:
+            if int(saved["bits"]) != bits:
+                logger.warning(
+                    f"{path} has {int(saved['bits'])} bit hashes, not {bits}"
+                )
+                return index
+            index._last_id = int(saved["last_id"])
+            index._watched = set(saved["watched"].tolist())
+            index._ids = saved["ids"]
+            index._hi = saved["hi"]
+            index._lo = saved["lo"]
+
+        index._build()
+        return index
+
+    def watch(self, session_factory: sqlalchemy.orm.sessionmaker) -> None:
+        """Keep the index up to date with hashes committed through sessions from `session_factory`.
+        Hashes inserted with `Table.insert_or_ignore` (`XasdDB.add_unique_hash`) aren't seen, add them with `add`.
+
+        Args:
+            session_factory (sqlalchemy.orm.sessionmaker): Session factory to listen to
+        """
+
+        @event.listens_for(session_factory, "after_flush")
+        def collect(session, flush_context):
+            pending = session.info.setdefault("hash_index_pending", [])
+            for entity in session.new:
+                if isinstance(entity, models.Hash):
+                    pending.append((entity.hash_id, entity.hash))
+
+        @event.listens_for(session_factory, "after_commit")
+        def apply(session):
+            for hash_id, hash in session.info.pop("hash_index_pending", []):
+                self.add(hash_id, hash, watched=True)
+
+        @event.listens_for(session_factory, "after_rollback")
+        def discard(session):
+            session.info.pop("hash_index_pending", None)
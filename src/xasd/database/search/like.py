@@ -0,0 +1,33 @@
+from typing import Optional
+
+import sqlalchemy
+
+from xasd.database.search import SearchEngine
+
+
+class LikeSearch(SearchEngine):
+    """
+    A very simple search that just looks for the query string anywhere in the column.
+    Every search is a full table scan, it's only used when no full text index is available.
+    """
+
+    name = "ILIKE"
+
+    def search(
+        self,
+        table,
+        column: sqlalchemy.Column,
+        query: str,
+        options: tuple = (),
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> list:
+        return (
+            self._session.query(table)
+            .options(*options)
+            .filter(column.ilike(f"%{query}%"))
+            .order_by(column)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
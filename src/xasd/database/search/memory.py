@@ -0,0 +1,315 @@
+"""In-process prefix and trigram index over artist, album and track names
+
+Used to serve search-as-you-type suggestions without a database round trip.
+Everything is stored in flat `array`s and `bytearray`s rather than one Python object per row:
+    - names are utf-8 encoded into a single blob, with an offsets array per entry
+    - a casefolded copy of each name is stored the same way, and an array of entry numbers
+      sorted by it is binary searched for prefix matches
+    - each trigram maps to an array of the entries containing it, used for fuzzy matching
+"""
+import logging
+import math
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable, NamedTuple, Optional
+
+import sqlalchemy
+from sqlalchemy import event
+
+from xasd.database import models
+
+logger = logging.getLogger(__name__)
+
+
+class Suggestion(NamedTuple):
+    type: str
+    id: int
+    name: str
+    score: float
+
+
+def _normalise(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+def _trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class _Entries:
+    """Names of a single entity type, stored as flat arrays"""
+
+    def __init__(self):
+        self.ids = array("Q")
+        self.name_offsets = array("Q", [0])
+        self.names = bytearray()
+        self.key_offsets = array("Q", [0])
+        self.keys = bytearray()
+        self.removed = bytearray()
+        # entry numbers, sorted by key
+        self.sorted = array("Q")
+        self.postings: dict[str, array] = {}
+        # the entry of each id which hasn't been removed
+        self.live: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def name(self, entry: int) -> str:
+        return self.names[
+            self.name_offsets[entry] : self.name_offsets[entry + 1]
+        ].decode()
+
+    def key(self, entry: int) -> bytes:
+        return bytes(self.keys[self.key_offsets[entry] : self.key_offsets[entry + 1]])
+
+    def add(self, entity_id: int, name: str, keep_sorted: bool = True) -> None:
+        entry = len(self.ids)
+        key = _normalise(name)
+        trigrams = _trigrams(key)
+
+        self.ids.append(entity_id)
+        self.names += name.encode()
+        self.name_offsets.append(len(self.names))
+        self.keys += key.encode()
+        self.key_offsets.append(len(self.keys))
+        self.removed.append(0)
+        # An id has one name, adding it again replaces the previous one
+        self.remove(entity_id)
+        self.live[entity_id] = entry
+
+        if keep_sorted:
+            insort(self.sorted, entry, key=self.key)
+        for trigram in trigrams:
+            self.postings.setdefault(trigram, array("Q")).append(entry)
+
+    def sort(self) -> None:
+        """Rebuild the sorted entries, used after adding many entries with `keep_sorted=False`"""
+        self.sorted = array("Q", sorted(range(len(self.ids)), key=self.key))
+
+    def remove(self, entity_id: int) -> None:
+        # Entries are only tombstoned, the space is reclaimed when the index is rebuilt
+        entry = self.live.pop(entity_id, None)
+        if entry is not None:
+            self.removed[entry] = 1
+
+    def prefix(self, key: str, limit: int) -> Iterable[int]:
+        prefix = key.encode()
+        position = bisect_left(self.sorted, prefix, key=self.key)
+        found = 0
+        while position < len(self.sorted) and found < limit:
+            entry = self.sorted[position]
+            if not self.key(entry).startswith(prefix):
+                break
+            if not self.removed[entry]:
+                found += 1
+                yield entry
+            position += 1
+
+    def fuzzy(
+        self, key: str, threshold: float, max_postings: int
+    ) -> list[tuple[float, int]]:
+        trigrams = _trigrams(key)
+        # A name at least `threshold` similar shares at least `needed` of the query's trigrams,
+        # so it has one of any `len(trigrams) - needed + 1` of them: only the rarest are scanned
+        # (less a little, so 0.3 * 10 isn't rounded up to 4)
+        needed = max(1, math.ceil(threshold * len(trigrams) - 1e-9))
+        rarest = sorted(
+            trigrams, key=lambda trigram: len(self.postings.get(trigram, ()))
+        )
+        candidates = set()
+        for trigram in rarest[: len(trigrams) - needed + 1]:
+            postings = self.postings.get(trigram, ())
+            # Too common to narrow anything down, e.g. " th"
+            if len(postings) <= max_postings:
+                candidates.update(postings)
+
+        matches = []
+        for entry in candidates:
+            if self.removed[entry]:
+                continue
+            entry_trigrams = _trigrams(self.key(entry).decode())
+            shared = len(trigrams & entry_trigrams)
+            # jaccard similarity of the two trigram sets
+            score = shared / (len(trigrams) + len(entry_trigrams) - shared)
+            if score >= threshold:
+                matches.append((score, entry))
+
+        return matches
+
+
+class MemoryIndex:
+    """
+    Prefix and trigram index of artist, album and track names
+
+    The index is built with `refresh`, which only reads rows newer than the last refresh,
+    so it can be called periodically to pick up rows inserted by other processes (e.g. the uploader).
+    Rows created through a session from a sessionmaker passed to `watch`
+    (e.g. by `XasdDB.insert_file`) are added as soon as they are committed.
+    """
+
+    COLUMNS = {
+        "track": models.Track.title,
+        "artist": models.Artist.name,
+        "album": models.Album.name,
+    }
+
+    def __init__(self, fuzzy_threshold: float = 0.3, max_postings: int = 10000):
+        """
+        Args:
+            fuzzy_threshold (float, optional): Minimum trigram similarity (0-1) for a fuzzy match.
+                Defaults to 0.3.
+            max_postings (int, optional): Trigrams in more names than this aren't used to find
+                fuzzy matches, names are only found through their rarer trigrams. Defaults to 10000.
+        """
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_postings = max_postings
+        self._entries = {entity_type: _Entries() for entity_type in self.COLUMNS}
+        self._last_id = {entity_type: 0 for entity_type in self.COLUMNS}
+        self._watched = {entity_type: set() for entity_type in self.COLUMNS}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def add(
+        self,
+        entity_type: str,
+        entity_id: int,
+        name: Optional[str],
+        watched: bool = False,
+        keep_sorted: bool = True,
+    ) -> None:
+        if not name:
+            return
+        with self._lock:
+            self._entries[entity_type].add(entity_id, name, keep_sorted=keep_sorted)
+            if watched:
+                # Rows committed in this process can overtake rows from other processes,
+                # remember them so `refresh` neither skips nor duplicates anything
+                self._watched[entity_type].add(entity_id)
+
+    def remove(self, entity_type: str, entity_id: int) -> None:
+        with self._lock:
+            self._entries[entity_type].remove(entity_id)
+
+    def refresh(self, session: sqlalchemy.orm.session.Session) -> int:
+        """Add rows inserted since the last refresh
+
+        Args:
+            session (sqlalchemy.orm.session.Session): Database session
+
+        Returns:
+            int: Number of rows added
+        """
+        added = 0
+        for entity_type, column in self.COLUMNS.items():
+            primary_key = sqlalchemy.inspect(column.class_).primary_key[0]
+            rows = session.execute(
+                sqlalchemy.select(primary_key, column)
+                .where(primary_key > self._last_id[entity_type])
+                .order_by(primary_key)
+            )
+            # A single sort after a large refresh is much cheaper than an insort per row
+            bulk = len(rows := rows.all()) > 1000
+            for entity_id, name in rows:
+                if entity_id in self._watched[entity_type]:
+                    self._watched[entity_type].discard(entity_id)
+                else:
+                    self.add(entity_type, entity_id, name, keep_sorted=not bulk)
+                    added += 1
+                self._last_id[entity_type] = entity_id
+            if bulk:
+                with self._lock:
+                    self._entries[entity_type].sort()
+
+        if added:
+            logger.info(f"Added {added} names to the search index")
+        return added
+
+    def search(self, query: str, limit: int = 10) -> list[Suggestion]:
+        """Find names starting with, or similar to, `query`
+
+        Prefix matches are returned first, followed by fuzzy trigram matches, best first.
+
+        Args:
+            query (str): String to search for
+            limit (int, optional): Number of suggestions to return. Defaults to 10.
+
+        Returns:
+            list[Suggestion]: Suggestions
+        """
+        key = _normalise(query)
+        if not key:
+            return []
+
+        matches = {}
+        with self._lock:
+            for entity_type, entries in self._entries.items():
+                for entry in entries.prefix(key, limit):
+                    matches[(entity_type, entry)] = 1.0
+
+            # Prefix matches always rank first, only look for fuzzy matches if there's room
+            if len(matches) < limit:
+                for entity_type, entries in self._entries.items():
+                    for score, entry in entries.fuzzy(
+                        key, self.fuzzy_threshold, self.max_postings
+                    ):
+                        matches.setdefault((entity_type, entry), score)
+
+            best = sorted(matches.items(), key=lambda match: -match[1])[:limit]
+
+            return [
+                Suggestion(
+                    type=entity_type,
+                    id=self._entries[entity_type].ids[entry],
+                    name=self._entries[entity_type].name(entry),
+                    score=score,
+                )
+                for (entity_type, entry), score in best
+            ]
+
+    def watch(self, session_factory: sqlalchemy.orm.sessionmaker) -> None:
+        """Keep the index up to date with rows committed through sessions from `session_factory`
+
+        Args:
+            session_factory (sqlalchemy.orm.sessionmaker): Session factory to listen to
+        """
+        types = {
+            column.class_: entity_type for entity_type, column in self.COLUMNS.items()
+        }
+
+        @event.listens_for(session_factory, "after_flush")
+        def collect(session, flush_context):
+            # Values are read now, entities are expired by the time the commit happens
+            pending = session.info.setdefault("search_index_pending", [])
+            for entity in session.new | session.dirty | session.deleted:
+                entity_type = types.get(type(entity))
+                if entity_type is None:
+                    continue
+
+                state = sqlalchemy.inspect(entity)
+                key = self.COLUMNS[entity_type].key
+                entity_id = state.mapper.primary_key_from_instance(entity)[0]
+
+                if entity in session.deleted:
+                    pending.append((entity_type, entity_id, None, True))
+                elif entity in session.new:
+                    pending.append((entity_type, entity_id, state.dict.get(key), False))
+                elif state.attrs[key].history.has_changes():
+                    pending.append((entity_type, entity_id, state.dict.get(key), True))
+
+        @event.listens_for(session_factory, "after_commit")
+        def apply(session):
+            for entity_type, entity_id, name, replace in session.info.pop(
+                "search_index_pending", []
+            ):
+                if replace:
+                    self.remove(entity_type, entity_id)
+                self.add(entity_type, entity_id, name, watched=True)
+
+        @event.listens_for(session_factory, "after_rollback")
+        def discard(session):
+            session.info.pop("search_index_pending", None)
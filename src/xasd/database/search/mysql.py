@@ -0,0 +1,130 @@
+import logging
+from typing import Optional
+
+import sqlalchemy
+from sqlalchemy.dialects.mysql import match
+
+from xasd.database.search import SEARCHABLE_COLUMNS, SearchEngine
+from xasd.database.search.like import LikeSearch
+
+logger = logging.getLogger(__name__)
+
+# `innodb_ft_min_token_size`, shorter words aren't indexed
+MIN_TOKEN_SIZE = 3
+# InnoDB's default `INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD`, which aren't indexed either
+STOPWORDS = {
+    "a",
+    "about",
+    "an",
+    "are",
+    "as",
+    "at",
+    "be",
+    "by",
+    "com",
+    "de",
+    "en",
+    "for",
+    "from",
+    "how",
+    "i",
+    "in",
+    "is",
+    "it",
+    "la",
+    "of",
+    "on",
+    "or",
+    "that",
+    "the",
+    "this",
+    "to",
+    "und",
+    "was",
+    "what",
+    "when",
+    "where",
+    "who",
+    "will",
+    "with",
+    "www",
+}
+
+
+class MySQLSearch(SearchEngine):
+    """
+    MariaDB/MySQL FULLTEXT search. Each word in the query must prefix a word in the column,
+    results are ordered by relevance.
+
+    Short words and stopwords aren't in the index, so requiring them would match nothing,
+    they're matched with `ILIKE` instead. A query of only those falls back to `LikeSearch`.
+    """
+
+    name = "FULLTEXT"
+
+    @staticmethod
+    def index_name(column: sqlalchemy.Column) -> str:
+        return f"ix_{column.table.name}_{column.name}_fulltext"
+
+    @classmethod
+    def split_terms(cls, query: str) -> tuple[list[str], list[str]]:
+        """Split a query's terms into those in the FULLTEXT index, and those which aren't"""
+        indexed, unindexed = [], []
+        for term in cls.terms(query):
+            if len(term) < MIN_TOKEN_SIZE or term.lower() in STOPWORDS:
+                unindexed.append(term)
+            else:
+                indexed.append(term)
+        return indexed, unindexed
+
+    @classmethod
+    def setup(cls, engine: sqlalchemy.engine.Engine) -> None:
+        with engine.begin() as connection:
+            inspector = sqlalchemy.inspect(connection)
+
+            for column in SEARCHABLE_COLUMNS:
+                index_name = cls.index_name(column)
+                existing = {
+                    index["name"] for index in inspector.get_indexes(column.table.name)
+                }
+                if index_name in existing:
+                    continue
+
+                logger.info(f"Creating FULLTEXT index {index_name}")
+                connection.execute(
+                    sqlalchemy.text(
+                        f"CREATE FULLTEXT INDEX {index_name} "
+                        f"ON {column.table.name} ({column.name})"
+                    )
+                )
+
+    def search(
+        self,
+        table,
+        column: sqlalchemy.Column,
+        query: str,
+        options: tuple = (),
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> list:
+        indexed, unindexed = self.split_terms(query)
+        if not indexed:
+            if not unindexed:
+                return []
+            return LikeSearch(self._session).search(
+                table, column, query, options=options, skip=skip, limit=limit
+            )
+
+        relevance = match(
+            column, against=" ".join(f"+{term}*" for term in indexed)
+        ).in_boolean_mode()
+
+        return (
+            self._session.query(table)
+            .options(*options)
+            .filter(relevance, *(column.ilike(f"%{term}%") for term in unindexed))
+            .order_by(relevance.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
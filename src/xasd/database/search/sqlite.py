@@ -0,0 +1,99 @@
+import logging
+from typing import Optional
+
+import sqlalchemy
+
+from xasd.database.search import SEARCHABLE_COLUMNS, SearchEngine
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSearch(SearchEngine):
+    """
+    SQLite FTS5 search. Each searchable column gets an external content FTS5 table,
+    `<table>_fts`, that is kept in sync with triggers. Each word in the query must prefix
+    a word in the column, results are ordered by bm25 rank.
+    """
+
+    name = "FTS5"
+
+    @staticmethod
+    def fts_table_name(column: sqlalchemy.Column) -> str:
+        return f"{column.table.name}_fts"
+
+    @classmethod
+    def setup(cls, engine: sqlalchemy.engine.Engine) -> None:
+        with engine.begin() as connection:
+            for column in SEARCHABLE_COLUMNS:
+                table = column.table.name
+                primary_key = column.table.primary_key.columns.values()[0].name
+                fts = cls.fts_table_name(column)
+
+                exists = connection.execute(
+                    sqlalchemy.text(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                    ),
+                    {"name": fts},
+                ).first()
+
+                connection.execute(
+                    sqlalchemy.text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                        f"{column.name}, content='{table}', content_rowid='{primary_key}')"
+                    )
+                )
+
+                insert = f"INSERT INTO {fts}(rowid, {column.name}) VALUES (new.{primary_key}, new.{column.name});"
+                delete = (
+                    f"INSERT INTO {fts}({fts}, rowid, {column.name}) "
+                    f"VALUES ('delete', old.{primary_key}, old.{column.name});"
+                )
+                triggers = {
+                    f"{fts}_ai": f"AFTER INSERT ON {table} BEGIN {insert} END",
+                    f"{fts}_ad": f"AFTER DELETE ON {table} BEGIN {delete} END",
+                    f"{fts}_au": f"AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+                }
+                for name, body in triggers.items():
+                    connection.execute(
+                        sqlalchemy.text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+                    )
+
+                if not exists:
+                    logger.info(f"Building FTS5 index {fts}")
+                    connection.execute(
+                        sqlalchemy.text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+                    )
+
+    def search(
+        self,
+        table,
+        column: sqlalchemy.Column,
+        query: str,
+        options: tuple = (),
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> list:
+        terms = self.terms(query)
+        if not terms:
+            return []
+
+        fts_name = self.fts_table_name(column)
+        fts = sqlalchemy.table(
+            fts_name, sqlalchemy.column("rowid"), sqlalchemy.column("rank")
+        )
+        primary_key = sqlalchemy.inspect(table).primary_key[0]
+
+        return (
+            self._session.query(table)
+            .options(*options)
+            .join(fts, fts.c.rowid == primary_key)
+            .filter(
+                sqlalchemy.literal_column(fts_name).op("MATCH")(
+                    " ".join(f'"{term}"*' for term in terms)
+                )
+            )
+            .order_by(fts.c.rank)
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
@@ -4,9 +4,13 @@ import logging
 from typing import Optional
 
 from sqlalchemy import create_engine, exc as sqlalchemy_exc
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session as OrmSession, sessionmaker
 
 from xasd.database import Base
+from xasd.database.migrations import migrate
+from xasd.database.search import select_search_engine
 
 logger = logging.getLogger(__name__)
 
@@ -62,10 +66,74 @@ class Session:
                     raise e
                 logger.warning("Failed to connect to base. Retrying in 5 seconds.")
                 time.sleep(5)
-        self.Session = sessionmaker(bind=self.__engine)
+        migrate(self.__engine)
+
+        # The search engine is picked once per database, sessions find it in `Session.info`
+        self.search_engine = select_search_engine(self.__engine)
+        self.Session = sessionmaker(
+            bind=self.__engine, info={"search_engine": self.search_engine}
+        )
 
     def get_session(self):
         return self.Session()
 
+    def event_targets(self) -> list:
+        """Where to attach session event listeners (e.g. `PrincipalCache.watch`),
+        so they see every commit made through this pool"""
+        return [self.Session]
+
     def close(self):
         self.__engine.dispose()
+
+
+class AsyncSession(Session):
+    """
+    `Session` for asyncio applications, sessions are `sqlalchemy.ext.asyncio.AsyncSession`s
+    using an async driver (aiomysql or aiosqlite) so waiting on the database doesn't block a thread.
+
+    Tables are created and migrated with the sync driver when connecting, the sync engine
+    is then only kept for `XasdDB` code that isn't async.
+    """
+
+    ASYNC_DRIVERS = {
+        "mysql": "mysql+aiomysql",
+        "mariadb": "mariadb+aiomysql",
+        "sqlite": "sqlite+aiosqlite",
+    }
+
+    def _db_connect(self):
+        super()._db_connect()
+
+        url = make_url(self._db_url)
+        if url.get_backend_name() not in self.ASYNC_DRIVERS:
+            raise ValueError(f"No async driver for {url.get_backend_name()} databases")
+        url = url.set(drivername=self.ASYNC_DRIVERS[url.get_backend_name()])
+
+        if url.get_backend_name() == "sqlite":
+            # aiosqlite doesn't pool connections
+            pool_args = {}
+        else:
+            pool_args = {"pool_size": 100, "max_overflow": 200}
+
+        self.__async_engine = create_async_engine(url, echo=False, **pool_args)
+        # The sync session each async session runs on, session events are dispatched on it.
+        # A subclass, so listeners only see this pool's async sessions
+        self.AsyncSyncSession = type("AsyncSyncSession", (OrmSession,), {})
+        # Entities are used after the session commits, outside of the session's greenlet,
+        # where they can't lazy load expired attributes
+        self.AsyncSession = async_sessionmaker(
+            bind=self.__async_engine,
+            expire_on_commit=False,
+            info={"search_engine": self.search_engine},
+            sync_session_class=self.AsyncSyncSession,
+        )
+
+    def get_async_session(self):
+        return self.AsyncSession()
+
+    def event_targets(self) -> list:
+        return [*super().event_targets(), self.AsyncSyncSession]
+
+    async def close_async(self):
+        await self.__async_engine.dispose()
+        self.close()
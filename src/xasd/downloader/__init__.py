@@ -5,24 +5,37 @@ Usage:
     xasd_downloader [--consumers=CONSUMERS] [options]
 
 Options:
-    --consumers=CONSUMERS           Number of consumers that will download torrents asynchronously [default: 2]
+    --connections=CONNECTIONS       Most peer connections across every torrent [default: 200]
+    --consumers=CONSUMERS           Number of consumers that will download torrents asynchronously [default: 32]
+    --cover                         Also download one cover image per torrent, rather than only audio
+    --download-rate=KBPS            Most kB/s downloaded across every torrent, 0 for unlimited [default: 0]
+    --download-slots=SLOTS          Number of torrents downloading at once, the rest are queued [default: 8]
+    --metadata-slots=SLOTS          Number of torrents fetching metadata at once [default: 16]
+    --prefetch=MESSAGES             Unacknowledged messages delivered per consumer [default: 2]
+    --stall-timeout=SECONDS         Seconds a torrent can download without progress before it's removed [default: 900]
+    --state-dir=PATH                Directory the session state and resume data are kept in between runs [default: xasd_downloader.state]
+    --upload-rate=KBPS              Most kB/s uploaded across every torrent, 0 for unlimited [default: 0]
     --log-level=LEVEL               Set logger level, one of DEBUG, INFO, WARNING, ERROR, CRITICAL [default: INFO]
 """
 
 import asyncio
+import contextlib
 import logging
 import json
-from docopt import docopt
-from typing import Optional
+import signal
 
 import aio_pika
+from docopt import docopt
+from typing import Optional
 
 from xasd.abc import AbstractWorker
 from xasd.database.crud import XasdDB
 from xasd.database.session import Session
+from xasd.downloader.alerts import AlertDispatcher
+from xasd.downloader.scheduler import DownloadScheduler
+from xasd.downloader.state import SessionState
 from xasd.downloader.torrent import (
     create_lt_session,
-    download,
     get_displayname,
     get_infohash,
 )
@@ -36,6 +49,13 @@ class Downloader(AbstractWorker):
         self,
         download_path: Optional[str] = "./downloads",
         amqp_url: Optional[str] = None,
+        amqp_prefetch: int = 2,
+        lt_settings: Optional[dict] = None,
+        metadata_slots: int = 16,
+        download_slots: int = 8,
+        stall_timeout: float = 900,
+        cover: bool = False,
+        state_path: Optional[str] = None,
     ):
         """
         Initialize a new instance of the class.
@@ -43,11 +63,24 @@ class Downloader(AbstractWorker):
         Args:
             download_path (str, optional): Where to download files. Defaults to ./downloads
             amqp_uri (str, optional): The AMQP URI to use for connecting to the broker.
+            amqp_prefetch (int, optional): Unacknowledged messages delivered per consumer. Defaults to 2.
+            lt_settings (dict, optional): libtorrent session settings, e.g. global rate and connection limits.
+            metadata_slots (int, optional): Number of torrents fetching metadata at once. Defaults to 16.
+            download_slots (int, optional): Number of torrents downloading at once. Defaults to 8.
+            stall_timeout (float, optional): Seconds a torrent can download without progress before it's removed.
+                Defaults to 15 minutes.
+            cover (bool, optional): Also download one cover image per torrent, rather than only audio.
+                Defaults to False.
+            state_path (str, optional): Directory the session state and resume data are kept in between runs.
+                Defaults to None, a restart starts afresh.
 
         Attributes:
             download_path (str): Path to save downloads
             _amqp_url (str): The AMQP URI to use for connecting to the broker.
+            state (SessionState): The session state and resume data kept between runs, if `state_path` is given.
             lt_session (lt.session): The libtorrent session.
+            alerts (AlertDispatcher): Reads the session's alerts, waking each download when its torrent changes.
+            scheduler (DownloadScheduler): Decides which of the session's torrents are downloading.
             lt_queue (list): The download queue for libtorrent.
             running (bool): A flag indicating whether the application is running or not.
         """
@@ -56,16 +89,33 @@ class Downloader(AbstractWorker):
         self.amqp_retry_queue = "download_retry"
 
         # create a session
-        self.lt_session = create_lt_session()
+        self.state = SessionState(state_path) if state_path else None
+        self.lt_session = create_lt_session(lt_settings, state=self.state)
         # set session settings
         self.lt_session.listen_on(6881, 6891)
+        self.alerts = AlertDispatcher(
+            self.lt_session,
+            on_resume_data=self.state.save_resume_data if self.state else None,
+        )
+        self.alerts.start()
+        self.scheduler = DownloadScheduler(
+            self.alerts,
+            metadata_slots=metadata_slots,
+            download_slots=download_slots,
+            stall_timeout=stall_timeout,
+            cover=cover,
+            state=self.state,
+        )
         self.lt_queue = []
 
         session = Session()
         self.db = XasdDB(session=session.get_session())
 
         super().__init__(
-            producer_method="amqp", amqp_url=amqp_url, amqp_consume_queue="download"
+            producer_method="amqp",
+            amqp_url=amqp_url,
+            amqp_consume_queue="download",
+            amqp_prefetch=amqp_prefetch,
         )
 
     async def consume(self, name: int, asyncio_queue: asyncio.Queue) -> None:
@@ -81,63 +131,78 @@ class Downloader(AbstractWorker):
             message = await asyncio_queue.get()
             logger.info(f"Consumer {name} got message <{message.delivery_tag}>")
 
-            async with message.process():
-                logger.info(f"Processing message <{message.delivery_tag}>")
-                message_dict = json.loads(message.body)
-
-                # check if the infohash is in the database already
-                infohash = get_infohash(message_dict["magnet_uri"])
-                if not self.db.add_magnet(infohash):
-                    logger.info(f"Info hash {infohash} already in database, skipping")
-                    asyncio_queue.task_done()
-                    continue
-
-                download_success = await download(
-                    self.lt_session,
-                    message_dict["magnet_uri"],
-                    download_path=self.download_path,
-                )
-                dn = get_displayname(message_dict["magnet_uri"])
-                logger.info(f"Downloading {dn}")
-
-                if download_success:
-                    logger.info(f"Successfully downloaded {dn}")
-                    message_dict["download_path"] = self.download_path
-                    await self.publish_message(
-                        self.amqp_complete_queue, json.dumps(message_dict)
-                    )
-                else:
-                    logger.info(f"Failed to download {dn}")
-                    await self.publish_message(self.amqp_retry_queue, message.body)
-
-                logger.info(f"Finished processing message for {dn}")
-                asyncio_queue.task_done()
-
-    async def publish_message(self, queue_name: str, message_body: str):
-        """
-        Publishes a message to a queue on a RabbitMQ server.
-
-        Args:
-            queue_name (str): The name of the queue to publish the message to.
-            message_body (str): The body of the message to publish.
-        """
-        # connection = await aio_pika.connect_robust(self._amqp_url)
-
-        # async with connection:
-        connection = await self._AbstractWorker__amqp_connection
-
-        channel = await connection.channel()
-
-        message = aio_pika.Message(
-            message_body.encode("utf-8"),
-            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
-        )
-
-        # Sending the message
-        await channel.default_exchange.publish(
-            message,
-            routing_key=queue_name,
+            # Ignoring processed messages, so one nacked when cancelled isn't rejected too
+            async with message.process(ignore_processed=True):
+                try:
+                    await self._process(message, asyncio_queue)
+                except asyncio.CancelledError:
+                    # Stopping: requeued, so it's redelivered after a restart and carries on from its resume data.
+                    # If the channel has closed already, the broker requeues its unacknowledged messages anyway
+                    logger.info(f"Requeueing message <{message.delivery_tag}>")
+                    with contextlib.suppress(
+                        aio_pika.exceptions.AMQPError,
+                        aio_pika.exceptions.ChannelInvalidStateError,
+                    ):
+                        await message.nack(requeue=True)
+                    raise
+
+    async def _process(
+        self,
+        message: aio_pika.abc.AbstractIncomingMessage,
+        asyncio_queue: asyncio.Queue,
+    ) -> None:
+        """Download a message's torrent, and publish it to the complete or retry queue"""
+        logger.info(f"Processing message <{message.delivery_tag}>")
+        message_dict = json.loads(message.body)
+
+        # check if the infohash is in the database already,
+        # unless it was being downloaded before a restart, and its message redelivered
+        infohash = get_infohash(message_dict["magnet_uri"])
+        resumable = self.scheduler.resumable(message_dict["magnet_uri"])
+        if not self.db.add_magnet(infohash) and not resumable:
+            logger.info(f"Info hash {infohash} already in database, skipping")
+            asyncio_queue.task_done()
+            return
+
+        path = await self.scheduler.download(
+            message_dict["magnet_uri"],
+            download_path=self.download_path,
         )
+        dn = get_displayname(message_dict["magnet_uri"])
+        logger.info(f"Downloading {dn}")
+
+        if path is not None:
+            logger.info(f"Successfully downloaded {dn}")
+            # The torrent's own files, not the whole download directory,
+            # where other torrents are still being written
+            message_dict["download_path"] = path
+            await self.publish_message(
+                self.amqp_complete_queue, json.dumps(message_dict)
+            )
+        else:
+            logger.info(f"Failed to download {dn}")
+            await self.publish_message(self.amqp_retry_queue, message.body)
+
+        logger.info(f"Finished processing message for {dn}")
+        asyncio_queue.task_done()
+
+    def close(self) -> None:
+        """Save the session state and every torrent's resume data, then stop reading alerts"""
+        self.scheduler.save_state(timeout=30)
+        self.alerts.stop()
+
+
+async def _watch(downloader: Downloader, opts: dict) -> None:
+    """
+    `Downloader.watch` until SIGTERM, e.g. from `docker stop`, which would otherwise exit without `close`.
+    Cancelling it requeues the messages being processed, see `Downloader.consume`.
+    """
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await downloader.watch(opts)
+    except asyncio.CancelledError:
+        logger.info("Stopping")
 
 
 def main():
@@ -145,8 +210,23 @@ def main():
 
     setup_logging(opts)
 
-    downloader = Downloader()
-    asyncio.run(downloader.watch(opts))
+    downloader = Downloader(
+        amqp_prefetch=int(opts["--prefetch"]),
+        lt_settings={
+            "download_rate_limit": int(opts["--download-rate"]) * 1000,
+            "upload_rate_limit": int(opts["--upload-rate"]) * 1000,
+            "connections_limit": int(opts["--connections"]),
+        },
+        metadata_slots=int(opts["--metadata-slots"]),
+        download_slots=int(opts["--download-slots"]),
+        stall_timeout=float(opts["--stall-timeout"]),
+        cover=opts["--cover"],
+        state_path=opts["--state-dir"],
+    )
+    try:
+        asyncio.run(_watch(downloader, opts))
+    finally:
+        downloader.close()
 
 
 if __name__ == "__main__":
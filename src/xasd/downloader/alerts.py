@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import libtorrent as lt
+
+logger = logging.getLogger(__name__)
+
+# Alerts the dispatcher handles, state updates are posted whatever the mask
+ALERT_MASK = (
+    lt.alert_category.status | lt.alert_category.error | lt.alert_category.storage
+)
+
+
+class TorrentError(Exception):
+    """A torrent failed, e.g. its metadata couldn't be read or its files couldn't be written"""
+
+
+def infohash(handle: lt.torrent_handle) -> str:
+    """Hex v1 infohash of a torrent, as in its magnet link, which its alerts are routed by"""
+    return str(handle.info_hashes().v1)
+
+
+class TorrentEvents:
+    """
+    What's happened to one torrent, set from alerts by an `AlertDispatcher`.
+
+    Attributes:
+        handle (lt.torrent_handle): The torrent.
+        metadata (asyncio.Future): Resolves once the torrent's metadata has been received.
+        finished (asyncio.Future): Resolves once every wanted file has been downloaded.
+            Both raise `TorrentError` if the torrent fails.
+        status (lt.torrent_status): The latest status, updated every `AlertDispatcher.update_interval` seconds.
+        last_progress (float): `time.monotonic()` when more of the torrent was last downloaded.
+    """
+
+    def __init__(self, handle: lt.torrent_handle, loop: asyncio.AbstractEventLoop):
+        self.handle = handle
+        self.loop = loop
+        self.metadata = loop.create_future()
+        self.finished = loop.create_future()
+        self.status: Optional[lt.torrent_status] = None
+        self.last_progress = time.monotonic()
+        self._done = -1
+
+    def _resolve(self, future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def _fail(self, error: TorrentError) -> None:
+        for future in (self.metadata, self.finished):
+            if not future.done():
+                future.set_exception(error)
+                # Retrieved, so an unawaited future doesn't log "exception was never retrieved"
+                future.exception()
+
+    def _update(self, status: lt.torrent_status) -> None:
+        self.status = status
+        logger.debug(
+            "%s %.2f%% complete (down: %.1f kb/s up: %.1f kB/s peers: %d) %s"
+            % (
+                status.name,
+                status.progress * 100,
+                status.download_rate / 1000,
+                status.upload_rate / 1000,
+                status.num_peers,
+                status.state,
+            )
+        )
+        if status.total_wanted_done > self._done:
+            self._done = status.total_wanted_done
+            self.last_progress = time.monotonic()
+        if status.has_metadata:
+            self._resolve(self.metadata)
+        if status.is_finished:
+            self._resolve(self.finished)
+
+
+class AlertDispatcher:
+    """
+    Reads a libtorrent session's alerts in one thread, and routes them to a `TorrentEvents` per torrent.
+
+    Rather than polling `handle.status()` for every torrent, the thread asks for every torrent's status
+    with `post_torrent_updates` every `update_interval` seconds, which libtorrent answers with one
+    `state_update_alert` listing the torrents that have changed.
+    """
+
+    def __init__(
+        self,
+        session: lt.session,
+        update_interval: float = 1.0,
+        on_resume_data: Optional[Callable[[lt.add_torrent_params], None]] = None,
+    ):
+        """
+        Args:
+            session (lt.session): The session to read alerts from, its alert mask is set to include `ALERT_MASK`.
+            update_interval (float, optional): Seconds between status updates. Defaults to 1.
+            on_resume_data (Callable, optional): Called in the dispatcher's thread with the resume data
+                of each torrent, requested by `save_resume_data`.
+        """
+        self.session = session
+        self.update_interval = update_interval
+        self.on_resume_data = on_resume_data
+        mask = session.get_settings()["alert_mask"] | ALERT_MASK
+        session.apply_settings({"alert_mask": mask})
+
+        self._torrents: dict[str, TorrentEvents] = {}
+        self._lock = threading.Lock()
+        # Resume data requested, but not yet received
+        self._resume_pending = 0
+        self._resume_received = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="libtorrent-alerts", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add_torrent(self, params: lt.add_torrent_params) -> TorrentEvents:
+        """
+        Add a torrent to the session, returning the events its alerts will set.
+        Must be called in the event loop the events are awaited in.
+        """
+        loop = asyncio.get_running_loop()
+        # Held while adding, so none of the torrent's alerts are dispatched before it's registered
+        with self._lock:
+            handle = self.session.add_torrent(params)
+            events = TorrentEvents(handle, loop)
+            self._torrents[infohash(handle)] = events
+        return events
+
+    def remove_torrent(self, events: TorrentEvents, delete_files: bool = False) -> None:
+        with self._lock:
+            self._torrents.pop(infohash(events.handle), None)
+        self.session.remove_torrent(
+            events.handle, lt.options_t.delete_files if delete_files else 0
+        )
+
+    def torrents(self) -> list[TorrentEvents]:
+        with self._lock:
+            return list(self._torrents.values())
+
+    def save_resume_data(
+        self, modified_only: bool = True, timeout: Optional[float] = None
+    ) -> int:
+        """
+        Request the resume data of every torrent, which is passed to `on_resume_data` as it arrives.
+
+        Args:
+            modified_only (bool, optional): Only torrents which have changed since they were last saved.
+                Defaults to True.
+            timeout (float, optional): Seconds to wait for the resume data, e.g. at shutdown.
+                Defaults to None, not waiting.
+
+        Returns:
+            int: Number of torrents whose resume data was requested
+        """
+        requested = 0
+        for events in self.torrents():
+            handle = events.handle
+            if not handle.is_valid() or not handle.status().has_metadata:
+                continue
+            if modified_only and not handle.need_save_resume_data():
+                continue
+            self._request_resume_data(handle)
+            requested += 1
+
+        if timeout is not None:
+            with self._resume_received:
+                if not self._resume_received.wait_for(
+                    lambda: self._resume_pending == 0, timeout
+                ):
+                    logger.warning(
+                        f"Timed out waiting for the resume data of {self._resume_pending} torrents"
+                    )
+        return requested
+
+    def save_torrent_resume_data(self, events: TorrentEvents) -> None:
+        """Request one torrent's resume data, e.g. once its metadata has been received"""
+        if events.handle.is_valid():
+            self._request_resume_data(events.handle)
+
+    def _request_resume_data(self, handle: lt.torrent_handle) -> None:
+        with self._resume_received:
+            self._resume_pending += 1
+        handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+
+    def _resume_data_received(self) -> None:
+        with self._resume_received:
+            self._resume_pending = max(0, self._resume_pending - 1)
+            self._resume_received.notify_all()
+
+    def _run(self) -> None:
+        next_update = 0.0
+        while self._running:
+            now = time.monotonic()
+            if now >= next_update:
+                self.session.post_torrent_updates()
+                next_update = now + self.update_interval
+
+            timeout = max(0.0, min(next_update - now, 0.5))
+            if self.session.wait_for_alert(int(timeout * 1000)) is None:
+                continue
+            for alert in self.session.pop_alerts():
+                try:
+                    self._dispatch(alert)
+                except Exception:
+                    logger.exception(f"Unable to handle alert {alert.message()}")
+
+    def _events(self, handle: lt.torrent_handle) -> Optional[TorrentEvents]:
+        if not handle.is_valid():
+            return None
+        with self._lock:
+            return self._torrents.get(infohash(handle))
+
+    def _dispatch(self, alert: lt.alert) -> None:
+        if isinstance(alert, lt.state_update_alert):
+            with self._lock:
+                updates = [
+                    (self._torrents.get(str(status.info_hashes.v1)), status)
+                    for status in alert.status
+                ]
+            for events, status in updates:
+                if events is not None:
+                    events.loop.call_soon_threadsafe(events._update, status)
+            return
+
+        if isinstance(alert, lt.save_resume_data_alert):
+            try:
+                # Not for torrents removed since, their resume data has been deleted.
+                # Saved holding the lock, so one removed meanwhile has its resume data deleted after it's saved
+                with self._lock:
+                    if self.on_resume_data and self._torrents.get(
+                        str(alert.params.info_hashes.v1)
+                    ):
+                        self.on_resume_data(alert.params)
+            finally:
+                self._resume_data_received()
+        elif isinstance(alert, lt.save_resume_data_failed_alert):
+            logger.debug(alert.message())
+            self._resume_data_received()
+        elif isinstance(alert, lt.metadata_received_alert):
+            events = self._events(alert.handle)
+            if events is not None:
+                events.loop.call_soon_threadsafe(events._resolve, events.metadata)
+        elif isinstance(alert, lt.torrent_finished_alert):
+            events = self._events(alert.handle)
+            if events is not None:
+                events.loop.call_soon_threadsafe(events._resolve, events.finished)
+        elif isinstance(alert, (lt.torrent_error_alert, lt.file_error_alert)):
+            logger.warning(alert.message())
+            events = self._events(alert.handle)
+            if events is not None:
+                error = TorrentError(alert.message())
+                events.loop.call_soon_threadsafe(events._fail, error)
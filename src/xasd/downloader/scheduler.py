@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import libtorrent as lt
+
+from xasd.downloader.alerts import (
+    AlertDispatcher,
+    TorrentError,
+    TorrentEvents,
+    infohash,
+)
+from xasd.downloader.state import SessionState
+from xasd.downloader.torrent import select_files
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    def __init__(self, torrent: TorrentEvents, name: str):
+        self.torrent = torrent
+        self.name = name
+        # Where its files are downloaded to, once it has metadata
+        self.path: Optional[str] = None
+        self.result: asyncio.Future = torrent.loop.create_future()
+        # When the job was last promoted, and seconds it's been active without progress before that
+        self.promoted = 0.0
+        self.stalled = 0.0
+
+    def idle(self, now: float) -> float:
+        """Seconds without progress since the job was last promoted"""
+        return now - max(self.torrent.last_progress, self.promoted)
+
+    def health(self) -> int:
+        """How many peers have the whole torrent, from the swarm or the tracker's scrape"""
+        status = self.torrent.status
+        if status is None:
+            return 0
+        return max(status.num_seeds, status.list_seeds, status.num_complete)
+
+
+class DownloadScheduler:
+    """
+    Runs many torrents on one session, with a limited number downloading at once.
+
+    Fetching metadata is cheap, so each torrent gets a metadata slot first, of which there are many.
+    Once it has metadata only its audio files are selected (see `select_files`),
+    and it's paused and queued for one of the download slots.
+    Every `interval` seconds:
+
+    - An active torrent which has made no progress for `demote_after` seconds, while others are queued,
+      is paused and queued again.
+    - A torrent which has been active for `stall_timeout` seconds in total without progress is removed,
+      with its files.
+    - Free download slots go to the queued torrents with the most seeds.
+
+    With a `SessionState`, the resume data of every torrent which has made progress since it was last saved,
+    and the session state, are saved every `save_interval` seconds. A torrent's resume data is also saved
+    as soon as it has metadata, and whenever it's demoted, so a restart doesn't fetch the metadata again
+    or lose a torrent's pieces while it waits. A torrent with saved resume data carries on from it.
+    """
+
+    def __init__(
+        self,
+        alerts: AlertDispatcher,
+        metadata_slots: int = 16,
+        download_slots: int = 8,
+        metadata_timeout: float = 600,
+        demote_after: float = 120,
+        stall_timeout: float = 900,
+        interval: float = 5,
+        cover: bool = False,
+        state: Optional[SessionState] = None,
+        save_interval: float = 60,
+    ):
+        """
+        Args:
+            alerts (AlertDispatcher): Dispatcher of the session to download in.
+            metadata_slots (int, optional): Torrents fetching metadata at once. Defaults to 16.
+            download_slots (int, optional): Torrents downloading at once. Defaults to 8.
+            metadata_timeout (float, optional): Seconds to wait for a torrent's metadata. Defaults to 10 minutes.
+            demote_after (float, optional): Seconds without progress before a torrent gives up its slot. Defaults to 2 minutes.
+            stall_timeout (float, optional): Seconds active without progress before a torrent is removed.
+                Defaults to 15 minutes.
+            interval (float, optional): Seconds between scheduling. Defaults to 5.
+            cover (bool, optional): Also download one cover image per torrent, rather than only audio.
+                Defaults to False.
+            state (SessionState, optional): Where the session state and resume data are saved,
+                and torrents are resumed from. Defaults to None, nothing is saved.
+            save_interval (float, optional): Seconds between saving the state. Defaults to 1 minute.
+        """
+        self.alerts = alerts
+        self.download_slots = download_slots
+        self.metadata_timeout = metadata_timeout
+        self.demote_after = demote_after
+        self.stall_timeout = stall_timeout
+        self.interval = interval
+        self.cover = cover
+        self.state = state
+        self.save_interval = save_interval
+
+        self._metadata_slots = asyncio.Semaphore(metadata_slots)
+        self._active: list[_Job] = []
+        self._queued: list[_Job] = []
+        self._ticker: Optional[asyncio.Task] = None
+
+    def resumable(self, magnet_link: str) -> bool:
+        """Whether the torrent has resume data, from a download interrupted by a restart"""
+        if self.state is None:
+            return False
+        key = str(lt.parse_magnet_uri(magnet_link).info_hashes.v1)
+        return key in self.state.infohashes()
+
+    def save_state(self, timeout: Optional[float] = None) -> None:
+        """
+        Save the session state, and the resume data of torrents which have changed.
+
+        Args:
+            timeout (float, optional): Wait up to this many seconds for every torrent's resume data,
+                e.g. at shutdown. Defaults to None, saving it as it arrives.
+        """
+        if self.state is None:
+            return
+        self.alerts.save_resume_data(modified_only=timeout is None, timeout=timeout)
+        self.state.save_session(self.alerts.session)
+
+    def _save_resume_data(self, torrent: TorrentEvents) -> None:
+        if self.state is not None:
+            self.alerts.save_torrent_resume_data(torrent)
+
+    def _remove(self, torrent: TorrentEvents, delete_files: bool) -> None:
+        # Read first, the handle is invalid once the torrent has been removed
+        key = infohash(torrent.handle) if self.state is not None else None
+        # Then removed, so the resume data isn't saved again
+        self.alerts.remove_torrent(torrent, delete_files=delete_files)
+        if key is not None:
+            self.state.remove_resume_data(key)
+
+    def stats(self) -> dict:
+        return {"active": len(self._active), "queued": len(self._queued)}
+
+    async def download(self, magnet_link: str, download_path: str) -> Optional[str]:
+        """
+        Download the torrent associated with the specified magnet link, when the scheduler gives it a slot.
+
+        Args:
+            magnet_link (str): The magnet link of the torrent to download.
+            download_path (str): Path to save the torrent
+
+        Returns:
+            str: Path of the downloaded torrent, its directory (or its file, if it has one)
+                in `download_path`, or None if it failed.
+        """
+        if self._ticker is None or self._ticker.done():
+            self._ticker = asyncio.create_task(self._run())
+
+        params = lt.parse_magnet_uri(magnet_link)
+        resumed = self.state and self.state.resume_data(str(params.info_hashes.v1))
+        if resumed:
+            logger.info(f"Resuming {resumed.name} from its resume data")
+            params = resumed
+        params.save_path = download_path
+        # Paused and resumed by the scheduler, rather than libtorrent's queue
+        params.flags &= ~lt.torrent_flags.auto_managed & ~lt.torrent_flags.paused
+
+        async with self._metadata_slots:
+            torrent = self.alerts.add_torrent(params)
+            job = _Job(torrent, magnet_link)
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(torrent.metadata), self.metadata_timeout
+                )
+            except (asyncio.TimeoutError, TorrentError) as e:
+                logger.info(f"Metadata download failed: {str(e) or 'timed out'}")
+                self._remove(torrent, delete_files=True)
+                return None
+
+        job.name = torrent.handle.status().name
+        job.path = os.path.join(download_path, job.name)
+        if not select_files(torrent.handle, cover=self.cover):
+            logger.info(f"{job.name} has no supported audio files")
+            self._remove(torrent, delete_files=True)
+            return None
+
+        torrent.handle.pause()
+        self._save_resume_data(torrent)
+        self._queued.append(job)
+        torrent.finished.add_done_callback(lambda _: self._finish(job))
+        self._schedule()
+        return await job.result
+
+    def _finish(self, job: _Job) -> None:
+        """Called when a torrent finishes or fails"""
+        if job.result.done():
+            return
+        for jobs in (self._active, self._queued):
+            if job in jobs:
+                jobs.remove(job)
+
+        if job.torrent.finished.exception() is None:
+            # The files are left for the uploader, which deletes them once they're uploaded
+            self._remove(job.torrent, delete_files=False)
+            job.result.set_result(job.path)
+        else:
+            logger.info(f"{job.name} failed: {job.torrent.finished.exception()}")
+            self._remove(job.torrent, delete_files=True)
+            job.result.set_result(None)
+        self._schedule()
+
+    def _evict(self, job: _Job) -> None:
+        self._active.remove(job)
+        logger.info(f"{job.name} has stalled, removing it")
+        self._remove(job.torrent, delete_files=True)
+        job.result.set_result(None)
+
+    def _schedule(self) -> None:
+        now = time.monotonic()
+
+        demoted = []
+        for job in list(self._active):
+            idle = job.idle(now)
+            if job.stalled + idle >= self.stall_timeout:
+                self._evict(job)
+            elif self._queued and idle >= self.demote_after:
+                logger.info(f"{job.name} isn't progressing, giving up its slot")
+                job.stalled += idle
+                job.torrent.handle.pause()
+                self._save_resume_data(job.torrent)
+                self._active.remove(job)
+                demoted.append(job)
+
+        # Stable, so equally healthy torrents are promoted in the order they were queued
+        self._queued.sort(key=lambda job: job.health(), reverse=True)
+        while self._queued and len(self._active) < self.download_slots:
+            job = self._queued.pop(0)
+            logger.info(f"Downloading {job.name}, with {job.health()} seeds")
+            job.promoted = now
+            job.torrent.handle.resume()
+            self._active.append(job)
+        # Queued after promoting, so the torrents waiting get their slots
+        self._queued += demoted
+
+    async def _run(self) -> None:
+        saved = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self._schedule()
+            except Exception:
+                logger.exception("Unable to schedule downloads")
+            logger.debug(f"Downloads: {self.stats()}")
+
+            if time.monotonic() - saved >= self.save_interval:
+                saved = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.save_state)
+                except Exception:
+                    logger.exception("Unable to save the session state")
@@ -0,0 +1,104 @@
+import logging
+import os
+from typing import Optional
+
+import libtorrent as lt
+
+logger = logging.getLogger(__name__)
+
+
+def _write(path: str, data: bytes) -> None:
+    """Write a file atomically, so a crash while saving leaves the previous state"""
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(data)
+    os.replace(f"{path}.tmp", path)
+
+
+class SessionState:
+    """
+    Keeps a libtorrent session's state, and each of its torrent's resume data, in a directory between runs.
+
+    The session state has the DHT routing table and settings, so a restarted session finds peers
+    without bootstrapping the DHT again. Resume data has a torrent's metadata and the pieces
+    it's downloaded, so a restarted download carries on rather than starting over.
+
+    Layout:
+        `<path>/session`: the session state, from `lt.write_session_params_buf`
+        `<path>/resume/<infohash>.resume`: a torrent's resume data, from `lt.write_resume_data_buf`
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Directory the state is kept in, created if it doesn't exist.
+        """
+        self.path = path
+        os.makedirs(self._resume_path(), exist_ok=True)
+
+    def _resume_path(self, infohash: Optional[str] = None) -> str:
+        if infohash is None:
+            return os.path.join(self.path, "resume")
+        return os.path.join(self.path, "resume", f"{infohash}.resume")
+
+    def create_session(self, settings: Optional[dict] = None) -> lt.session:
+        """
+        A session with the saved state, or a new session if there's none.
+
+        Args:
+            settings (dict, optional): Settings which take precedence over the saved ones.
+        """
+        params = lt.session_params()
+        try:
+            with open(os.path.join(self.path, "session"), "rb") as file:
+                params = lt.read_session_params(file.read())
+            logger.info("Restored the libtorrent session state")
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception(
+                "Unable to read the libtorrent session state, starting afresh"
+            )
+
+        merged = params.settings
+        merged.update(settings or {})
+        params.settings = merged
+        return lt.session(params)
+
+    def save_session(self, session: lt.session) -> None:
+        _write(
+            os.path.join(self.path, "session"),
+            lt.write_session_params_buf(session.session_state()),
+        )
+
+    def resume_data(self, infohash: str) -> Optional[lt.add_torrent_params]:
+        """The saved resume data of a torrent, or None if there's none"""
+        try:
+            with open(self._resume_path(infohash), "rb") as file:
+                return lt.read_resume_data(file.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception(f"Unable to read the resume data of {infohash}")
+            return None
+
+    def save_resume_data(self, params: lt.add_torrent_params) -> None:
+        """Save a torrent's resume data, from a `save_resume_data_alert`"""
+        _write(
+            self._resume_path(str(params.info_hashes.v1)),
+            lt.write_resume_data_buf(params),
+        )
+
+    def remove_resume_data(self, infohash: str) -> None:
+        """Forget a torrent's resume data, once it's finished or removed"""
+        try:
+            os.remove(self._resume_path(infohash))
+        except FileNotFoundError:
+            pass
+
+    def infohashes(self) -> list[str]:
+        """Infohashes of the torrents with saved resume data"""
+        return sorted(
+            name[: -len(".resume")]
+            for name in os.listdir(self._resume_path())
+            if name.endswith(".resume")
+        )
@@ -1,95 +1,88 @@
-import asyncio
 import logging
-import time
+import mimetypes
+import os
 import urllib.parse
 from typing import Optional
 
 import libtorrent as lt
 
+from xasd.downloader.state import SessionState
+from xasd.utils.constants import SUPPORTED_MIMETYPES
+
 logger = logging.getLogger(__name__)
 
+# Guessed from the extension, where it differs from the mimetype the uploader reads from the file
+MIMETYPE_ALIASES = {"audio/x-wav": "audio/wav"}
+COVER_MIMETYPES = ["image/jpeg", "image/png"]
+# Preferred names for a cover image, without the extension
+COVER_NAMES = ["cover", "folder", "front"]
+
+
+def create_lt_session(
+    settings: Optional[dict] = None, state: Optional[SessionState] = None
+):
+    """
+    Args:
+    settings (dict, optional): Session settings, e.g. global rate and connection limits
+    state (SessionState, optional): Saved state to restore the session from, e.g. its DHT routing table
+    """
+    # DHT is started once for the session, rather than again for every download
+    settings = {"enable_dht": True, **(settings or {})}
+    if state is not None:
+        return state.create_session(settings)
+    return lt.session(settings)
+
+
+def file_priorities(files: lt.file_storage, cover: bool = False) -> list[int]:
+    """
+    Priorities which only download a torrent's audio, files with a mimetype in `SUPPORTED_MIMETYPES`,
+    so scans, videos, logs and archives aren't fetched only for the uploader to delete them.
+
+    Args:
+    files (lt.file_storage): The torrent's files
+    cover (bool): Also download one cover image, preferring e.g. cover.jpg, then the largest image
+
+    Returns:
+    list[int]: Priority of each file, 4 (the default) to download it, 0 to skip it
+    """
+    priorities = []
+    images = []
+    for index in range(files.num_files()):
+        path = files.file_path(index)
+        mimetype, _ = mimetypes.guess_type(path)
+        mimetype = MIMETYPE_ALIASES.get(mimetype, mimetype)
+
+        priorities.append(4 if mimetype in SUPPORTED_MIMETYPES else 0)
+        if mimetype in COVER_MIMETYPES:
+            name = os.path.splitext(os.path.basename(path))[0].lower()
+            images.append((name in COVER_NAMES, files.file_size(index), -index))
 
-def create_lt_session():
-    return lt.session()
+    if cover and images:
+        _, _, index = max(images)
+        priorities[-index] = 4
+    return priorities
 
 
-async def download(session, magnet_link: str, download_path: str) -> bool:
+def select_files(handle: lt.torrent_handle, cover: bool = False) -> int:
     """
-    Download the torrent associated with the specified magnet link.
-    This method waits for the torrent download to complete.
+    Only download a torrent's audio, and optionally a cover image, once it has metadata.
 
     Args:
-    session (lt.session)
-    magnet_link (str): The magnet link of the torrent to download.
-    download_path (str): Path to save the torrent
+    handle (lt.torrent_handle): The torrent
+    cover (bool): Also download one cover image
 
     Returns:
-    bool: True if the torrent was downloaded successfully, False otherwise.
+    int: Number of files which will be downloaded
     """
-    # logger.info(f"downloading <{magnet_link}>")
-
-    handle = session.add_torrent({"url": magnet_link, "save_path": download_path})
-
-    # Download the metadata
-    # If there's no progress after 10 minutes, return
-    session.start_dht()
-    start_dht_time = time.time()
-    while not handle.has_metadata():
-        if time.time() - start_dht_time > 600:  # 10 minutes
-            logger.info("Metadata download timed out")
-            return False
-
-        await asyncio.sleep(1)
-        s = handle.status()
-        logger.info("DHT: %.1f%%" % (s.download_rate / 10**6))
-
-    # print information about the download
-    # breakpoint()
-    # print(
-    #     f"Downloading {handle.name()} from {handle.num_seeds()} seeds with {handle.num_peers()} peers."
-    # )
-
-    # wait for the download to complete
-    # while handle.status().state != lt.torrent_status.seeding:
-    while not s.is_seeding:
-        s = handle.status()
-        if s.num_peers == 0 or s.download_rate == 0:
-            no_progress_start_time = time.time()
-            while s.num_peers == 0 or s.download_rate == 0:
-                if time.time() - no_progress_start_time > 3600:  # 1 hour
-                    logger.info("Torrent download progress timed out")
-                    return False
-                s = handle.status()
-                logger.info(
-                    f"Attempting to find peers for {s.name}",
-                )
-                await asyncio.sleep(1)
-        # logger.info(
-        #     f"Downloading {s.name} {s.download_rate}, from seeds {s.num_seeds}, peers {s.num_peers}",
-        # )
-
-        state_str = [
-            "queued",
-            "checking",
-            "downloading metadata",
-            "downloading",
-            "finished",
-            "seeding",
-            "allocating",
-        ]
-        logger.info(
-            "%.2f%% complete (down: %.1f kb/s up: %.1f kB/s peers: %d) %s"
-            % (
-                s.progress * 100,
-                s.download_rate / 1000,
-                s.upload_rate / 1000,
-                s.num_peers,
-                state_str[s.state],
-            )
-        )
-        await asyncio.sleep(1)
-
-    return True
+    files = handle.torrent_file().layout()
+    priorities = file_priorities(files, cover=cover)
+    handle.prioritize_files(priorities)
+
+    wanted = sum(1 for priority in priorities if priority)
+    logger.info(
+        f"Downloading {wanted} of {len(priorities)} files of {handle.status().name}"
+    )
+    return wanted
 
 
 def get_infohash(magnet_link: str) -> Optional[str]:
@@ -0,0 +1,71 @@
+"""Object storage the uploader and cover art tool put files in
+
+The backend is chosen with the `STORAGE_URL` environment variable:
+    - `b2://bucket-name` a Backblaze B2 bucket, authorized with `B2_KEY` and `B2_SECRET`
+    - `file:///srv/xasd` a local directory, files are hard linked in when possible, otherwise copied.
+      For running without cloud storage, e.g. on-prem or benchmarking the ingest pipeline on one box
+If it isn't set the B2 bucket `B2_BUCKETNAME` is used.
+"""
+
+import logging
+import os
+import urllib.parse
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    def upload_file(
+        self,
+        local_file: str,
+        remote_file: str,
+        progress_listener: Optional[Any] = None,
+        **file_info: dict,
+    ) -> None:
+        """Store `local_file` as `remote_file`
+
+        Args:
+            local_file (str): The path to the local file to upload.
+            remote_file (str): The name to store the file as, e.g. `c/ab/abcd.jpg`.
+            progress_listener (b2sdk.v2.AbstractProgressListener, optional): Told the progress of the upload.
+                Defaults to None, progress isn't reported.
+            **file_info (dict): Additional information to associate with the file.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not implement upload_file"
+        )
+
+    def list_files(self) -> None:
+        """Print the stored files"""
+        raise NotImplementedError(
+            f"{type(self).__name__} does not implement list_files"
+        )
+
+
+def storage_from_env() -> StorageBackend:
+    """Create the storage backend configured by `STORAGE_URL`, B2 if it isn't set"""
+    url = os.environ.get("STORAGE_URL")
+    parsed = urllib.parse.urlparse(url or "")
+    params = dict(urllib.parse.parse_qsl(parsed.query))
+
+    if not url or parsed.scheme == "b2":
+        from xasd.uploader.b2_upload import B2Bucket
+
+        storage = B2Bucket(
+            parsed.netloc if url else os.environ.get("B2_BUCKETNAME"),
+            os.environ.get("B2_KEY"),
+            os.environ.get("B2_SECRET"),
+        )
+    elif parsed.scheme == "file":
+        from xasd.storage.local import LocalStorage
+
+        storage = LocalStorage(
+            urllib.parse.unquote(parsed.path),
+            link=params.get("link", "1") not in ("0", "false"),
+        )
+    else:
+        raise ValueError(f"Unsupported STORAGE_URL scheme {parsed.scheme}")
+
+    logger.info(f"Using {type(storage).__name__} storage")
+    return storage
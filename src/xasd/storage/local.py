@@ -0,0 +1,101 @@
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from xasd.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per `os.sendfile` call, progress is reported after each
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores files in a local directory, under the same names they'd have in the B2 bucket.
+
+    Files are hard linked into the directory when it's on the same filesystem, which needs no copying,
+    and copied in the kernel with `os.sendfile` otherwise. A file is written under a temporary name
+    and renamed into place, so readers never see a partial file.
+    `file_info` isn't stored.
+    """
+
+    def __init__(self, root: str, link: bool = True):
+        """
+        Args:
+            root (str): Directory files are stored in, created if it doesn't exist.
+            link (bool, optional): Hard link files rather than copying them where possible. Defaults to True.
+        """
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.link = link
+
+    def path(self, remote_file: str) -> Path:
+        """Local path of a stored file"""
+        path = (self.root / remote_file).resolve()
+        if not path.is_relative_to(self.root) or path == self.root:
+            raise ValueError(f"{remote_file} is outside of {self.root}")
+        return path
+
+    def upload_file(
+        self,
+        local_file: str,
+        remote_file: str,
+        progress_listener: Optional[Any] = None,
+        **file_info: dict,
+    ) -> None:
+        path = self.path(remote_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+
+        size = os.stat(local_file).st_size
+        if progress_listener:
+            progress_listener.set_total_bytes(size)
+
+        try:
+            if not (self.link and self._link(local_file, temporary)):
+                self._copy(local_file, temporary, size, progress_listener)
+            os.replace(temporary, path)
+        except BaseException:
+            temporary.unlink(missing_ok=True)
+            raise
+
+        if progress_listener:
+            progress_listener.bytes_completed(size)
+
+    @staticmethod
+    def _link(local_file: str, temporary: Path) -> bool:
+        try:
+            os.link(local_file, temporary)
+        except OSError as e:
+            # e.g. EXDEV across filesystems, or EPERM on filesystems without hard links
+            logger.debug(f"Unable to link {local_file}, copying it: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _copy(
+        local_file: str, temporary: Path, size: int, progress_listener: Optional[Any]
+    ) -> None:
+        with open(local_file, "rb") as source, open(temporary, "wb") as destination:
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(
+                    destination.fileno(),
+                    source.fileno(),
+                    offset,
+                    min(COPY_CHUNK_SIZE, size - offset),
+                )
+                if sent == 0:
+                    break
+                offset += sent
+                if progress_listener:
+                    progress_listener.bytes_completed(offset)
+            os.fsync(destination.fileno())
+
+    def list_files(self) -> None:
+        for path in sorted(self.root.rglob("*")):
+            if path.is_file() and not path.name.startswith("."):
+                print(path.relative_to(self.root), int(path.stat().st_mtime * 1000))
@@ -7,26 +7,37 @@ Usage:
 
 Options:
     --consumers=CONSUMERS           Number of consumers that will upload files asynchronously [default: 2]
+    --duplicate-distance=BITS       Files with a hash this many bits or fewer from a stored hash are duplicates [default: 4]
+    --fingerprint-workers=WORKERS   Number of processes fingerprinting audio, 0 for one per CPU [default: 0]
+    --hash-index=PATH               File the near-duplicate hash index is kept in between runs
+    --journal=PATH                  SQLite file recording each file's progress, to resume after a restart [default: xasd_uploader.journal]
     --log-level=LEVEL               Set logger level, one of DEBUG, INFO, WARNING, ERROR, CRITICAL [default: INFO]
+    --prefetch=MESSAGES             Unacknowledged messages delivered per consumer, with amqp [default: 2]
     --producer=[inotify|amqp]       Which producer to use to monitor files to upload [default: inotify]
+    --settle=SECONDS                Seconds a new file or directory must go unmodified before it's uploaded, with inotify [default: 10]
+    --upload-workers=WORKERS        Number of files uploaded at once [default: 4]
 """
 
 import asyncio
 import json
 import logging
-import os
 from docopt import docopt
 from pathlib import Path
 from typing import Any, Optional
 
 from xasd.abc import AbstractWorker
-from xasd.uploader.b2_upload import B2Bucket
+from xasd.cache import response_cache_from_env
 from xasd.database.crud import XasdDB
+from xasd.database.search.hamming import HammingIndex
 from xasd.database.session import Session
-from xasd.uploader.dejavu import file_hash
-from xasd.uploader.track_info import track_info
+from xasd.storage import storage_from_env
+from xasd.uploader.pipeline import Fingerprinter, StageTimings, UploadService
+from xasd.uploader.journal import UploadJournal, pending_paths
+from xasd.uploader import journal as stages
+from xasd.uploader.probe import probe
 from xasd.uploader import fileinfo
 from xasd.utils import setup_logging
+from xasd.utils.asyncinotifyrecurse import is_temporary
 from xasd.utils.constants import SUPPORTED_MIMETYPES
 
 logger = logging.getLogger(__name__)
@@ -34,59 +45,244 @@ logger = logging.getLogger(__name__)
 
 class Uploader(AbstractWorker):
     def __init__(
-        self, amqp_url: Optional[str] = None, producer_method: Optional[str] = "inotify"
+        self,
+        amqp_url: Optional[str] = None,
+        producer_method: Optional[str] = "inotify",
+        fingerprint_workers: Optional[int] = None,
+        duplicate_distance: int = 4,
+        hash_index_path: Optional[str] = None,
+        upload_workers: int = 4,
+        journal_path: str = ":memory:",
+        amqp_prefetch: int = 2,
     ):
         """
         A class for uploading songs and storing the information in the database.
 
         Args:
             amqp_uri (str, optional): The AMQP URI to use for connecting to the broker.
+            fingerprint_workers (int, optional): Number of processes fingerprinting audio. Defaults to one per CPU.
+            duplicate_distance (int, optional): Files with a hash within this many bits of a stored hash
+                are not uploaded. Defaults to 4.
+            hash_index_path (str, optional): File the hash index is loaded from and saved to. Defaults to None,
+                the index is built from the database.
+            upload_workers (int, optional): Number of files uploaded at once. Defaults to 4.
+            journal_path (str, optional): SQLite file recording each file's progress.
+                Defaults to ":memory:", files start again after a restart.
+            amqp_prefetch (int, optional): Unacknowledged messages delivered per consumer, with amqp. Defaults to 2.
 
         Attributes:
             _amqp_url (str): The AMQP connection URI.
             amqp_consume_queue (str): The name of the AMQP queue to consume from.
-            b2 (B2Bucket): An instance of the B2Bucket class for interacting with Backblaze B2 storage.
             db (XasdDB): An instance of the XasdDB class for storing and retrieving data.
+            fingerprinter (Fingerprinter): Process pool fingerprinting audio files.
+            hash_index (HammingIndex): Index of stored hashes, to find near-duplicates.
+            journal (UploadJournal): How far each file has got, so a restart resumes rather than starts again.
             producer_method (str): tbd
             running (bool): A flag indicating whether the application is running or not.
+            storage (StorageBackend): Where files are uploaded to, B2 or a local directory, see `xasd.storage`.
+            timings (StageTimings): Time spent in each stage of the upload pipeline.
+            uploads (UploadService): Thread pool uploading files to `storage`.
         """
 
-        self.b2 = B2Bucket(
-            os.environ.get("B2_BUCKETNAME"),
-            os.environ.get("B2_KEY"),
-            os.environ.get("B2_SECRET"),
+        self.timings = StageTimings()
+        self.fingerprinter = Fingerprinter(
+            max_workers=fingerprint_workers, timings=self.timings
+        )
+
+        self.storage = storage_from_env()
+        self.uploads = UploadService(
+            self.storage, max_workers=upload_workers, timings=self.timings
         )
 
         session = Session()
+        # Invalidate cached API responses for tracks as they are inserted
+        response_cache = response_cache_from_env()
+        if response_cache:
+            response_cache.watch(session.Session)
         self.db = XasdDB(session=session.get_session())
 
+        self.hash_index_path = hash_index_path
+        if hash_index_path:
+            self.hash_index = HammingIndex.load(
+                hash_index_path, threshold=duplicate_distance
+            )
+        else:
+            self.hash_index = HammingIndex(threshold=duplicate_distance)
+        self.hash_index.watch(session.Session)
+        self.hash_index.refresh(self.db._session)
+
+        self.journal = UploadJournal(journal_path)
+
         super().__init__(
             producer_method=producer_method,
             amqp_url=amqp_url,
             amqp_consume_queue="download_complete",
+            amqp_prefetch=amqp_prefetch,
         )
 
-    def _pre_upload_tasks(
-        self, local_filepath: str, cloud_filepath: str, mimetype: str
-    ) -> bool:
+    async def _probe(self, local_filepath: str) -> Optional[dict]:
+        """Tags and audio properties of a file, see `xasd.uploader.probe`"""
+        with self.timings.time("probe"):
+            try:
+                return await asyncio.to_thread(probe, local_filepath)
+            except OSError:
+                logger.exception(f"Unable to read {local_filepath}")
+                return None
+
+    async def _pre_upload_tasks(
+        self, local_filepath: str, probed: Optional[dict]
+    ) -> Optional[dict]:
+        mimetype = probed["mimetype"] if probed else None
         if mimetype not in SUPPORTED_MIMETYPES:
             logger.warning(f"{local_filepath} does not have a valid mimetype")
-            return False
-
-        hash = file_hash(self.db, local_filepath, mimetype)
-        if hash is False:
+            return None
+
+        # Identical bytes to a file seen before, e.g. a re-delivered torrent, skip decoding it
+        with self.timings.time("digest"):
+            size, digest = await asyncio.to_thread(
+                fileinfo.content_digest, local_filepath
+            )
+        with self.timings.time("database"):
+            seen = self.db.find_content_hash(size, digest)
+        if seen:
+            logger.warning(f"{local_filepath} is identical to a file already uploaded")
+            return None
+
+        hash = await self.fingerprinter.fingerprint(local_filepath, mimetype)
+
+        # e.g. the same track at another bitrate
+        matches = self.hash_index.find(hash)
+        if matches:
+            hash_id, distance = matches[0]
+            logger.warning(
+                f"{local_filepath} already exists in database, "
+                f"{distance} bits from hash <{hash_id}>"
+            )
+            self._add_content_hash(size, digest, hash_id)
+            return None
+
+        # Will return false if the hash already exists
+        with self.timings.time("database"):
+            added = self.db.add_unique_hash(hash)
+        if added is False:
             logger.warning(f"{local_filepath} already exists in database")
-            return False
+            existing = self.db.hash.get(hash)
+            self._add_content_hash(size, digest, existing.hash_id if existing else None)
+            return None
+        self.hash_index.add(added.hash_id, added.hash, watched=True)
+        self._add_content_hash(size, digest, added.hash_id)
 
-        info = track_info(local_filepath)
-        info["hash"] = hash
-        self.db.insert_file(cloud_filepath, info)
+        info = {**probed, "hash": added}
+        # Recorded straight after the hash is committed, with no await in between, so a restart
+        # doesn't find the hash in the database and reject the file as a duplicate of itself
+        self.journal.hashed(local_filepath, {**info, "hash": added.hash})
 
-        return True
+        return info
+
+    def _add_content_hash(self, size: int, digest: str, hash_id: Optional[int]) -> None:
+        """Remember a file's content, so the same bytes are skipped next time"""
+        with self.timings.time("database"):
+            self.db.add_content_hash(size, digest, hash_id)
+
+    async def _upload_files(self, paths: list[str]) -> None:
+        """
+        Upload files to storage, inserting them all into the database in one batch.
+        The files are fingerprinted, and then uploaded, concurrently.
+
+        Args:
+            paths (list[str]): The paths of the files to upload.
+        """
+        # Hashes stored by other uploaders since the last batch (only newer rows are read)
+        with self.timings.time("database"):
+            self.hash_index.refresh(self.db._session)
+
+        jobs = {path: self.journal.get(path) for path in paths}
+        for path, job in jobs.items():
+            if job:
+                logger.info(f"Resuming <{path}>, already {job.stage}")
+
+        new = [path for path, job in jobs.items() if job is None]
+        probes = await asyncio.gather(*(self._probe(path) for path in new))
+        infos = await asyncio.gather(
+            *(self._pre_upload_tasks(path, probed) for path, probed in zip(new, probes))
+        )
+
+        pending = []
+        for path, info in zip(new, infos):
+            if info:
+                pending.append((path, fileinfo.generate_uuid_filename(), info))
+            else:
+                logger.info(f"Pre upload tasks failed for <{path}>, not uploading")
+                self._remove(path)
+        # Hashed before a restart, their hash is a string which `insert_files` looks up.
+        # A file may have been inserted before the journal recorded it, under its recorded filepath
+        pending += [
+            (path, job.cloud_filepath or fileinfo.generate_uuid_filename(), job.info)
+            for path, job in jobs.items()
+            if job and job.stage == stages.HASHED
+        ]
+
+        if pending:
+            self.journal.inserting(
+                {path: cloud_filepath for path, cloud_filepath, _ in pending}
+            )
+            with self.timings.time("database"):
+                self.db.insert_files(
+                    [(cloud_filepath, info) for _, cloud_filepath, info in pending]
+                )
+            self.journal.inserted(
+                {path: cloud_filepath for path, cloud_filepath, _ in pending}
+            )
+
+        uploads = [
+            (path, cloud_filepath, info["mimetype"])
+            for path, cloud_filepath, info in pending
+        ] + [
+            (path, job.cloud_filepath, job.info["mimetype"])
+            for path, job in jobs.items()
+            if job and job.stage == stages.INSERTED
+        ]
+        await asyncio.gather(
+            *(
+                self._upload_file(path, cloud_filepath, mimetype)
+                for path, cloud_filepath, mimetype in uploads
+            )
+        )
+
+        for path, job in jobs.items():
+            if job and job.stage == stages.UPLOADED:
+                self._remove(path)
+
+        logger.debug(f"Stage timings: {self.timings.summary()}")
+        logger.debug(f"Uploads: {self.uploads.stats()}")
+
+    async def _upload_file(self, path: str, cloud_filepath: str, mimetype: str) -> None:
+        logger.info(f"[{mimetype}]<{path}> uploading...")
+        await self.uploads.upload(path, cloud_filepath)
+        self.journal.uploaded(path)
+        logger.info(f"[{mimetype}]<{path}> upload complete.")
+        self._remove(path)
+
+    def _remove(self, path: str) -> None:
+        logger.info(f"removing file {path}")
+        Path(path).unlink()
+        self.journal.remove(path)
+
+    async def recover(self, opts: dict) -> list[str]:
+        """
+        Unfinished files from before a restart, and anything already in the watched directory,
+        which inotify won't report
+        """
+        directories = [opts["<dir>"]] if opts.get("<dir>") else []
+        paths = await asyncio.to_thread(pending_paths, self.journal, directories)
+        if paths:
+            logger.info(f"Recovered {len(paths)} paths to upload")
+        return paths
 
     async def upload(self, path: str) -> None:
         """
-        Upload a file to B2 and store the information in the database.
+        Upload a file, or the files in a directory, to storage and store the information in the database.
+        The files directly inside a directory (e.g. an album) are inserted in one batch.
 
         Args:
             path (str): The path to the file to upload.
@@ -95,37 +291,35 @@ class Uploader(AbstractWorker):
         p = Path(path)
 
         if p.is_dir():
+            files = []
             for x in p.iterdir():
-                await self.upload(str(x))
+                # e.g. a track still being written, its final name is uploaded once it's renamed
+                if is_temporary(x.name):
+                    logger.info(f"Skipping temporary file <{x}>")
+                elif x.is_dir():
+                    await self.upload(str(x))
+                else:
+                    files.append(str(x))
+            await self._upload_files(files)
         elif p.is_file():
-            mimetype = fileinfo.mimetype(path)
-
-            cloud_filepath = fileinfo.generate_uuid_filename()
-            if self._pre_upload_tasks(path, cloud_filepath, mimetype):
-                logger.info(f"[{mimetype}]<{path}> uploading...")
-                self.b2.upload_file(path, cloud_filepath)
-                logger.info(f"[{mimetype}]<{path}> upload complete.")
-            else:
-                logger.info(f"Pre upload tasks failed for <{path}>, not uploading")
-            logger.info(f"removing file {path}")
-            p.unlink()
+            await self._upload_files([path])
         else:
             logger.info(f"<{path}> Not found")
 
     async def upload_task(self, item: Any) -> None:
         """
         Make sense of the asynco queue item, if it's from amqp, loop over the dir to upload each relevant file
-        else, assume it's a file we've been given from inotify and upload the individual file
+        else, assume it's a settled file or directory we've been given from inotify and upload it
 
         Args:
             item (Any): The item representing a file to be uploaded.
                 If `self.producer_method` is equal to "amqp", `item` should be an instance of `aiormq.Message`
                 and contains a JSON-encoded string with the key "download_path" representing the file path.
-                If `self.producer_method` is not equal to "amqp", `item` should be the file path string.
+                Otherwise, or when recovered after a restart (see `recover`), `item` should be the file or directory path string.
 
         Returns: None
         """
-        if self.producer_method == "amqp":
+        if self.producer_method == "amqp" and not isinstance(item, str):
             message_dict = json.loads(item.body)
             local_filepath = message_dict["download_path"]
             async with item.process():
@@ -169,13 +363,29 @@ def main() -> None:
 
     setup_logging(opts)
 
-    uploader = Uploader(producer_method=opts["--producer"])
-
-    if opts["watch"]:
-        asyncio.run(uploader.watch(opts))
-    else:
-        # Will only upload synchronously
-        asyncio.run(uploader.upload(opts["<path>"]))
+    uploader = Uploader(
+        producer_method=opts["--producer"],
+        fingerprint_workers=int(opts["--fingerprint-workers"]) or None,
+        duplicate_distance=int(opts["--duplicate-distance"]),
+        hash_index_path=opts["--hash-index"],
+        upload_workers=int(opts["--upload-workers"]),
+        journal_path=opts["--journal"],
+        amqp_prefetch=int(opts["--prefetch"]),
+    )
+
+    try:
+        if opts["watch"]:
+            asyncio.run(uploader.watch(opts))
+        else:
+            asyncio.run(uploader.upload(opts["<path>"]))
+    finally:
+        logger.info(f"Stage timings: {uploader.timings.summary()}")
+        logger.info(f"Uploads: {uploader.uploads.stats()}")
+        uploader.fingerprinter.shutdown()
+        uploader.uploads.shutdown()
+        uploader.journal.close()
+        if uploader.hash_index_path:
+            uploader.hash_index.save(uploader.hash_index_path)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,79 @@
 import logging
+import threading
+from typing import Optional
 
-from b2sdk.v2 import B2Api, InMemoryAccountInfo, TqdmProgressListener
+from b2sdk.v2 import AbstractProgressListener, B2Api, InMemoryAccountInfo
+
+from xasd.storage import StorageBackend
 
 
 logger = logging.getLogger(__name__)
 
 
-class B2Bucket:
+class UploadMetrics:
+    """
+    Progress of uploads in bytes and files, for logging and health checks.
+    Updated from b2sdk's upload threads through `MetricsProgressListener`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress: dict[int, tuple[int, int]] = {}
+        self.completed = 0
+        self.failed = 0
+        self.bytes_uploaded = 0
+
+    def update(self, upload: int, total_bytes: int, bytes_completed: int) -> None:
+        with self._lock:
+            self._progress[upload] = (total_bytes, bytes_completed)
+
+    def start(self, upload: int) -> None:
+        self.update(upload, 0, 0)
+
+    def finish(self, upload: int, success: bool) -> None:
+        with self._lock:
+            total_bytes, _ = self._progress.pop(upload, (0, 0))
+            if success:
+                self.completed += 1
+                self.bytes_uploaded += total_bytes
+            else:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "uploading": len(self._progress),
+                "completed": self.completed,
+                "failed": self.failed,
+                "bytes_uploaded": self.bytes_uploaded,
+                "bytes_pending": sum(
+                    total - done for total, done in self._progress.values()
+                ),
+            }
+
+
+class MetricsProgressListener(AbstractProgressListener):
+    """
+    Reports the progress of an upload to `UploadMetrics`, rather than drawing a progress bar.
+    `UploadMetrics.finish` is called by whoever started the upload,
+    as b2sdk doesn't close the listener if an upload fails before it starts.
+    """
+
+    def __init__(self, metrics: UploadMetrics, description: str = ""):
+        super().__init__(description)
+        self.metrics = metrics
+        self.total_bytes = 0
+
+    def set_total_bytes(self, total_byte_count: int) -> None:
+        self.total_bytes = total_byte_count
+        self.metrics.update(id(self), self.total_bytes, 0)
+
+    def bytes_completed(self, byte_count: int) -> None:
+        # A total, not a delta, it goes down if a part is retried
+        self.metrics.update(id(self), self.total_bytes, byte_count)
+
+
+class B2Bucket(StorageBackend):
     """
     A class representing a B2 bucket, providing methods for interacting with the bucket.
 
@@ -24,7 +91,9 @@ class B2Bucket:
             Lists the files in the B2 bucket associated with this B2Bucket object.
     """
 
-    def __init__(self, bucket_name: str, key: str, secret: str) -> None:
+    def __init__(
+        self, bucket_name: str, key: str, secret: str, max_upload_workers: int = 10
+    ) -> None:
         """
         Initializes a new B2Bucket object.
 
@@ -32,22 +101,31 @@ class B2Bucket:
             bucket_name (str): The name of the B2 bucket to interact with.
             key (str): The B2 application key to use for authentication.
             secret (str): The B2 application secret to use for authentication.
+            max_upload_workers (int, optional): Threads b2sdk uploads files and the parts of
+                large files with, shared by every upload. Defaults to 10.
         """
         info = InMemoryAccountInfo()
-        b2_api = B2Api(info)
+        b2_api = B2Api(info, max_upload_workers=max_upload_workers)
         b2_api.authorize_account("production", key, secret)
 
         self.bucket = b2_api.get_bucket_by_name(bucket_name)
 
     def upload_file(
-        self, local_file: str, b2_file_name: str, **file_info: dict
+        self,
+        local_file: str,
+        b2_file_name: str,
+        progress_listener: Optional[AbstractProgressListener] = None,
+        **file_info: dict,
     ) -> None:
         """
         Uploads a file to the B2 bucket associated with this B2Bucket object.
+        Large files are uploaded as parts, in parallel on b2sdk's upload threads.
 
         Args:
             local_file (str): The path to the local file to upload.
             b2_file_name (str): The desired name for the file in the B2 bucket.
+            progress_listener (AbstractProgressListener, optional): Told the progress of the upload.
+                Defaults to None, progress isn't reported.
             **file_info (dict): Additional information to associate with the file.
 
         Returns:
@@ -57,7 +135,7 @@ class B2Bucket:
             local_file=local_file,
             file_name=b2_file_name,
             file_infos=file_info,
-            progress_listener=TqdmProgressListener(b2_file_name),
+            progress_listener=progress_listener,
         )
 
     def list_files(self) -> None:
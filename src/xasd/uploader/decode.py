@@ -0,0 +1,237 @@
+"""Streaming PCM decoding for fingerprinting long WAV and FLAC files
+
+`AudioSegment.from_file` holds a whole file's PCM in memory, gigabytes for a long mix.
+These readers yield the same samples pydub would decode, a block at a time, so the
+waveform can be calculated in bounded memory with hashes identical to a full decode.
+
+The total number of frames has to be known up front, as the waveform's chunk boundaries
+depend on it. It's read from the WAV data chunk, or the FLAC STREAMINFO block.
+Other formats aren't streamed.
+"""
+import logging
+import struct
+import subprocess
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import mediainfo_json
+
+logger = logging.getLogger(__name__)
+
+# Frames read per block
+BLOCK_FRAMES = 1 << 16
+
+FLAC_MIMETYPES = ["audio/flac", "audio/x-flac"]
+
+
+class PCMStream(NamedTuple):
+    channels: int
+    frame_rate: int
+    # Bytes per sample before pydub's 24 to 32 bit conversion
+    sample_width: int
+    frame_count: float
+    # Interleaved samples, with the same values as `AudioSegment.raw_data`
+    blocks: Iterator[np.ndarray]
+
+
+def pcm_samples(data: bytes, sample_width: int) -> np.ndarray:
+    """Samples of little endian WAV PCM, converted as `AudioSegment` converts them
+
+    8 bit samples are unsigned, and are biased to signed. 24 bit samples are
+    widened to 32 bit with the sign in the low byte, as pydub does.
+    """
+    data = data[: len(data) - len(data) % sample_width]
+
+    if sample_width == 1:
+        samples = np.frombuffer(data, dtype=np.uint8)
+        return (samples.astype(np.int16) - 128).astype(np.int8)
+
+    if sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        padded = np.empty((len(raw), 4), dtype=np.uint8)
+        padded[:, 0] = np.where(raw[:, 2] > 0x7F, 0xFF, 0x00)
+        padded[:, 1:] = raw
+        return padded.view("<i4").ravel()
+
+    return np.frombuffer(data, dtype={2: "<i2", 4: "<i4"}[sample_width])
+
+
+def _wav_chunks(file: BinaryIO) -> Optional[tuple[bytes, int, int]]:
+    """Find the fmt chunk, and the position and size of the data chunk,
+    walking the chunks as `pydub.audio_segment.extract_wav_headers` does"""
+    if file.read(4) != b"RIFF":
+        return None
+    file.seek(12)
+
+    fmt = None
+    for _ in range(10):
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"data":
+            return (fmt, file.tell(), size) if fmt is not None else None
+        if chunk_id == b"fmt ":
+            fmt = file.read(size)
+            file.seek(file.tell() - len(fmt) + size)
+        else:
+            file.seek(file.tell() + size)
+
+    return None
+
+
+def _read_blocks(
+    file: BinaryIO, size: Optional[int], frame_width: int, sample_width: int
+) -> Iterator[np.ndarray]:
+    """Read `size` bytes of samples, or to the end of the file if `None`"""
+    remaining = size
+    while remaining is None or remaining > 0:
+        length = BLOCK_FRAMES * frame_width
+        if remaining is not None:
+            length = min(length, remaining)
+        data = file.read(length)
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        yield pcm_samples(data, sample_width)
+
+
+def wav_stream(filepath: str) -> Optional[PCMStream]:
+    """Stream a PCM WAV file, or `None` if pydub wouldn't read it natively"""
+    file = open(filepath, "rb")
+    try:
+        chunks = _wav_chunks(file)
+        if chunks is None:
+            file.close()
+            return None
+        fmt, position, size = chunks
+        if len(fmt) < 16:
+            file.close()
+            return None
+        audio_format, channels, frame_rate = struct.unpack("<HHI", fmt[:8])
+        sample_width = struct.unpack("<H", fmt[14:16])[0] // 8
+        if audio_format not in (1, 0xFFFE) or not channels or not sample_width:
+            file.close()
+            return None
+
+        # pydub slices the data chunk, so a truncated file has fewer samples than its header says
+        file.seek(0, 2)
+        size = min(size, file.tell() - position)
+        file.seek(position)
+    except Exception:
+        file.close()
+        raise
+
+    def blocks():
+        with file:
+            yield from _read_blocks(file, size, channels * sample_width, sample_width)
+
+    # Partial frames aren't counted, as `AudioSegment.frame_count()` doesn't
+    frame_count = float(size // (channels * sample_width))
+    return PCMStream(channels, frame_rate, sample_width, frame_count, blocks())
+
+
+def flac_frame_count(filepath: str) -> Optional[int]:
+    """Total samples per channel from a FLAC STREAMINFO block, `None` if unknown"""
+    with open(filepath, "rb") as file:
+        header = file.read(8 + 34)
+
+    if len(header) < 42 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return None
+
+    # 20 bits sample rate, 3 bits channels, 5 bits bits per sample, 36 bits total samples
+    total = int.from_bytes(header[8 + 13 : 8 + 18], "big") & ((1 << 36) - 1)
+    return total or None
+
+
+def ffmpeg_stream(filepath: str, frame_count: int) -> Optional[PCMStream]:
+    """Stream the WAV ffmpeg outputs for `AudioSegment.from_file`, run with the same arguments"""
+    info = mediainfo_json(filepath)
+    streams = [stream for stream in info["streams"] if stream["codec_type"] == "audio"]
+    if not streams:
+        return None
+
+    # Same codec selection as `AudioSegment.from_file`
+    stream = streams[0]
+    if stream.get("sample_fmt") == "fltp" and stream.get("codec_name") in [
+        "mp3",
+        "mp4",
+        "aac",
+        "webm",
+        "ogg",
+    ]:
+        bits_per_sample = 16
+    else:
+        bits_per_sample = stream["bits_per_sample"]
+    acodec = "pcm_u8" if bits_per_sample == 8 else f"pcm_s{bits_per_sample}le"
+
+    process = subprocess.Popen(
+        [
+            AudioSegment.converter,
+            "-y",
+            "-i",
+            filepath,
+            "-acodec",
+            acodec,
+            "-vn",
+            "-f",
+            "wav",
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+    def header(length):
+        data = process.stdout.read(length)
+        if len(data) < length:
+            raise EOFError("Truncated WAV header from ffmpeg")
+        return data
+
+    try:
+        header(12)
+        fmt = None
+        while True:
+            chunk_id, size = struct.unpack("<4sI", header(8))
+            if chunk_id == b"data":
+                break
+            data = header(size)
+            if chunk_id == b"fmt ":
+                fmt = data
+        _, channels, frame_rate = struct.unpack("<HHI", fmt[:8])
+        sample_width = struct.unpack("<H", fmt[14:16])[0] // 8
+    except Exception:
+        process.kill()
+        process.wait()
+        raise
+
+    def blocks():
+        try:
+            # The data chunk size isn't known when streaming, read to the end
+            yield from _read_blocks(
+                process.stdout, None, channels * sample_width, sample_width
+            )
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+
+    return PCMStream(channels, frame_rate, sample_width, frame_count, blocks())
+
+
+def stream(filepath: str, mimetype: str) -> Optional[PCMStream]:
+    """Stream the samples of a WAV or FLAC file, `None` if it can't be streamed"""
+    try:
+        if filepath.lower().endswith(".wav"):
+            # pydub reads files named .wav itself, anything else goes through ffmpeg
+            return wav_stream(filepath)
+        if mimetype in FLAC_MIMETYPES:
+            frame_count = flac_frame_count(filepath)
+            if frame_count is not None:
+                return ffmpeg_stream(filepath, frame_count)
+    except Exception:
+        logger.exception(f"Unable to stream {filepath}, decoding the whole file")
+
+    return None
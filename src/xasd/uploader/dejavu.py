@@ -1,14 +1,24 @@
-import tempfile
+import logging
+import math
 
+import numpy as np
 from PIL import Image
 from pydub import AudioSegment
 import imagehash
-from typing import Union, Type
+from typing import Optional, Union, Type
 
 from xasd.database.crud import XasdDB
 from xasd.database.models import Hash
+from xasd.uploader import decode
 from xasd.utils.constants import SUPPORTED_MIMETYPES
 
+logger = logging.getLogger(__name__)
+
+# Waveform dimensions, changing any of these changes every hash
+BAR_COUNT = 107
+DB_CEILING = 60
+WAVEFORM_SIZE = (840, 128)
+
 
 def file_hash(database: XasdDB, filepath: str, mimetype: str) -> Union[bool, Hash]:
     """
@@ -23,45 +33,165 @@ def file_hash(database: XasdDB, filepath: str, mimetype: str) -> Union[bool, Has
     Returns:
     - bool or Hash: A boolean indicating if the hash already exists in the database, or the new hash if it's unique.
     """
-    with tempfile.NamedTemporaryFile() as waveformimage:
-        # Create a waveform
-        create_waveform(filepath, mimetype, waveformimage.name)
+    # Search for the hash in the DB, will return false if the hash already exists
+    return database.add_unique_hash(fingerprint(filepath, mimetype))
 
-        # Create a perceptual hash of the image
-        hash = image_hash(waveformimage.name)
 
-    # Search for the hash in the DB, will return false if the hash already exists
-    return database.add_unique_hash(hash)
+def fingerprint(filepath: str, mimetype: str) -> str:
+    """
+    Generates a waveform of an audio file and returns the perceptual hash of the waveform image.
+    This is the CPU heavy part of `file_hash`, it doesn't touch the database so it can run in another process.
+
+    The waveform is rendered in memory, and is pixel for pixel the image `create_waveform` saves,
+    so the hash is the same as hashing that file with `image_hash`.
+
+    Parameters:
+    - filepath (str): The path to the audio file.
+    - mimetype (str): The mimetype of the audio file.
 
+    Returns:
+    - str: The perceptual hash as a hex string.
+
+    Raises:
+    - Exception: If the mimetype of the audio file is not recognised.
+    """
+    return str(_phash(waveform_image(audio_peaks(filepath, mimetype))))
 
-def _calculate_peaks(audio_file: bytes):
-    """Returns a list of audio level peaks"""
 
-    bar_count = 107
-    db_ceiling = 60
+def _sample_array(audio_file: AudioSegment) -> np.ndarray:
+    """Returns the interleaved samples of an audio segment, as signed integers
+
+    pydub has already widened 24 bit samples to 32 bit, and biased 8 bit samples to signed.
+    """
+    width = audio_file.sample_width
+    data = audio_file.raw_data
+
+    dtype = {1: np.int8, 2: "<i2", 4: "<i4"}[width]
+    return np.frombuffer(data[: len(data) - len(data) % width], dtype=dtype)
 
-    chunk_length = len(audio_file) / bar_count
 
-    loudness_of_chunks = [
-        audio_file[i * chunk_length : (i + 1) * chunk_length].rms
-        for i in range(bar_count)
-    ]
+class _ChunkRMS:
+    """RMS of each of `BAR_COUNT` chunks of audio, from samples added a block at a time
+
+    Chunks are on the same millisecond boundaries as slicing an `AudioSegment`,
+    and chunks past the end of the samples are padded with silence.
+    Squares are summed sequentially as doubles, as `audioop.rms` does, so the result
+    is the same however the samples are split into blocks.
+    """
 
+    def __init__(self, frame_count: float, frame_rate: int, channels: int):
+        # Same rounding as `len(AudioSegment)`
+        length_ms = round(1000 * (frame_count / frame_rate))
+        chunk_length = length_ms / BAR_COUNT
+
+        boundaries = np.array(
+            [
+                int(min(i * chunk_length, length_ms) * (frame_rate / 1000.0))
+                for i in range(BAR_COUNT + 1)
+            ]
+        )
+        self._boundaries = boundaries * channels
+        self._sums = [0.0] * BAR_COUNT
+        self.position = 0
+
+    def add(self, samples: np.ndarray) -> None:
+        start, end = self.position, self.position + len(samples)
+        self.position = end
+
+        # Chunks overlapping this block
+        first = max(np.searchsorted(self._boundaries, start, side="right") - 1, 0)
+        for i in range(first, BAR_COUNT):
+            chunk_start, chunk_end = self._boundaries[i], self._boundaries[i + 1]
+            if chunk_start >= end:
+                break
+            if chunk_end <= start:
+                continue
+
+            squares = samples[max(chunk_start, start) - start : chunk_end - start]
+            if not len(squares):
+                continue
+            squares = squares.astype(np.float64)
+            squares *= squares
+            squares[0] += self._sums[i]
+            self._sums[i] = float(np.cumsum(squares)[-1])
+
+    def rms(self) -> list[int]:
+        counts = np.diff(self._boundaries).tolist()
+        return [
+            int(math.sqrt(total / count)) if count else 0
+            for total, count in zip(self._sums, counts)
+        ]
+
+
+def _calculate_peaks(audio_file: AudioSegment):
+    """Returns a list of audio level peaks, see `_ChunkRMS`"""
+    chunks = _ChunkRMS(
+        audio_file.frame_count(), audio_file.frame_rate, audio_file.channels
+    )
+    chunks.add(_sample_array(audio_file))
+    return _peaks(chunks.rms())
+
+
+def _stream_peaks(pcm: decode.PCMStream) -> Optional[list[int]]:
+    """Returns a list of audio level peaks, reading a block of samples at a time.
+    `None` if the stream doesn't have the number of frames it claimed to"""
+    chunks = _ChunkRMS(pcm.frame_count, pcm.frame_rate, pcm.channels)
+    for block in pcm.blocks:
+        chunks.add(block)
+
+    if abs(chunks.position - pcm.frame_count * pcm.channels) >= pcm.channels:
+        return None
+    return _peaks(chunks.rms())
+
+
+def _peaks(loudness_of_chunks: list[int]) -> list[int]:
     max_rms = max(loudness_of_chunks) * 1.00
 
-    return [int((loudness / max_rms) * db_ceiling) for loudness in loudness_of_chunks]
+    return [int((loudness / max_rms) * DB_CEILING) for loudness in loudness_of_chunks]
 
 
-def _get_bar_image(size, fill):
-    """Returns an image of a bar."""
-    width, height = size
-    bar = Image.new("RGBA", size, fill)
+def audio_peaks(filepath: str, mimetype: str) -> list[int]:
+    """
+    Returns the audio level peaks of an audio file, which the waveform is drawn from.
+
+    WAV and FLAC files are streamed (see `xasd.uploader.decode`) so long files aren't held in memory,
+    other files, or files that can't be streamed, are decoded whole. The peaks are the same either way.
+
+    Raises:
+    - Exception: If the mimetype of the audio file is not recognised.
+    """
+    if mimetype not in SUPPORTED_MIMETYPES:
+        raise Exception("Not a recognised audio file")
+
+    pcm = decode.stream(filepath, mimetype)
+    if pcm is not None:
+        peaks = _stream_peaks(pcm)
+        if peaks is not None:
+            return peaks
+        logger.warning(
+            f"Unexpected length streaming {filepath}, decoding the whole file"
+        )
+
+    return _calculate_peaks(audio_samples(filepath, mimetype))
+
 
-    end = Image.new("RGBA", (width, 2), fill)
+def waveform_image(peaks: list[int]) -> Image.Image:
+    """Returns a waveform image of peaks, a black bar per peak centred on a white background"""
+    width, height = WAVEFORM_SIZE
+    peaks = np.asarray(peaks)
 
-    bar.paste(end, (0, 0))
-    bar.paste(end.rotate(180), (0, height - 2))
-    return bar
+    # Bars are 4px wide every 8px, starting at x=2
+    x = np.arange(width) - 2
+    bar = x // 8
+    in_bar = (x >= 0) & (x % 8 < 4) & (bar < len(peaks))
+    bar_height = np.where(in_bar, peaks[np.clip(bar, 0, len(peaks) - 1)], 0)
+
+    # A bar of peak `value` covers rows [64 - value, 64 + value)
+    y = np.arange(height)[:, np.newaxis]
+    middle = height // 2
+    black = (y >= middle - bar_height) & (y < middle + bar_height)
+
+    return Image.fromarray(np.where(black, 0, 255).astype(np.uint8), "L")
 
 
 def create_waveform(audio_file: str, audio_mimetype: str, image_file: str) -> None:
@@ -77,22 +207,7 @@ def create_waveform(audio_file: str, audio_mimetype: str, image_file: str) -> No
     Raises:
     - Exception: If the mimetype of the audio file is not recognised.
     """
-    samples = audio_samples(audio_file, audio_mimetype)
-
-    if samples is False:
-        raise Exception("Not a recognised audio file")
-
-    peaks = _calculate_peaks(samples)
-
-    # Create a new image (840w x 128h), with a white bg
-    im = Image.new("RGB", (840, 128), "#ffffff")
-
-    for index, value in enumerate(peaks, start=0):
-        column = index * 8 + 2
-        upper_endpoint = 64 - value
-
-        # Get the bar, fill it black
-        im.paste(_get_bar_image((4, value * 2), "#000000"), (column, upper_endpoint))
+    im = waveform_image(audio_peaks(audio_file, audio_mimetype)).convert("RGB")
 
     with open(image_file, "wb") as imfile:
         im.save(imfile, "PNG")
@@ -129,4 +244,8 @@ def image_hash(filepath: str) -> str:
     """
     image = Image.open(filepath)
 
+    return _phash(image)
+
+
+def _phash(image: Image.Image) -> imagehash.ImageHash:
     return imagehash.phash(image, hash_size=9, highfreq_factor=4)
@@ -1,7 +1,11 @@
+import hashlib
 import mimetypes
 
 from uuid import uuid4
 
+# Bytes read at a time by `content_digest`
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
 
 def mimetype(filepath: str) -> str:
     """
@@ -32,3 +36,24 @@ def generate_uuid_filename() -> str:
     filename = "".join(split_uuid[1:])
 
     return f"{directory}/{filename}"
+
+
+def content_digest(filepath: str) -> tuple[int, str]:
+    """
+    Returns the size of a file and a BLAKE2b digest of its bytes,
+    which identify a file that's been uploaded before without decoding it.
+
+    Args:
+        filepath (str): The path to the file.
+
+    Returns:
+        tuple[int, str]: The size in bytes, and the hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    size = 0
+    with open(filepath, "rb") as f:
+        while chunk := f.read(DIGEST_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return size, digest.hexdigest()
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional
+
+from xasd.utils.asyncinotifyrecurse import is_temporary
+
+logger = logging.getLogger(__name__)
+
+# Stages of a file, in order. Once a file is deleted its job is removed
+HASHED = "hashed"
+INSERTED = "inserted"
+UPLOADED = "uploaded"
+
+
+class Job(NamedTuple):
+    path: str
+    stage: str
+    # Tags, audio properties and hash string, as returned by `Uploader._pre_upload_tasks`
+    info: dict
+    cloud_filepath: Optional[str]
+
+
+class UploadJournal:
+    """
+    Records how far each file has got through the uploader, in a local SQLite database,
+    so after a restart a file carries on from its last stage rather than being hashed again.
+
+    The database is in WAL mode with `synchronous=NORMAL`, each stage is one small transaction,
+    which is durable across a crash of the uploader (if not of the machine) and cheap enough to do per file.
+
+    A job is only resumed if the file's size and modification time haven't changed since it was hashed,
+    otherwise it's treated as a new file.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path (str, optional): SQLite database file. Defaults to ":memory:", nothing survives a restart.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS job (
+                path TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                info TEXT NOT NULL,
+                cloud_filepath TEXT,
+                updated REAL NOT NULL
+            )
+            """)
+
+    def get(self, path: str) -> Optional[Job]:
+        """The job of a file, or None if it has none or the file has changed since it was hashed"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT stage, size, mtime_ns, info, cloud_filepath FROM job WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        stage, size, mtime_ns, info, cloud_filepath = row
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            logger.info(f"{path} has changed since it was hashed, starting again")
+            self.remove(path)
+            return None
+
+        return Job(path, stage, json.loads(info), cloud_filepath)
+
+    def hashed(self, path: str, info: dict) -> None:
+        """Record that a file has been hashed, `info` is what will be inserted into the database"""
+        stat = os.stat(path)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO job VALUES (?, ?, ?, ?, ?, NULL, ?)",
+                (
+                    path,
+                    HASHED,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    json.dumps(info),
+                    time.time(),
+                ),
+            )
+
+    def inserting(self, cloud_filepaths: dict[str, str]) -> None:
+        """
+        Record the cloud filepath each file is about to be inserted under, as `{path: cloud_filepath}`.
+        If the uploader stops before `inserted`, the insert is retried with the same filepath,
+        which finds the rows already inserted rather than adding them again.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "UPDATE job SET cloud_filepath = ?, updated = ? WHERE path = ?",
+                [
+                    (cloud_filepath, time.time(), path)
+                    for path, cloud_filepath in cloud_filepaths.items()
+                ],
+            )
+
+    def inserted(self, cloud_filepaths: dict[str, str]) -> None:
+        """Record that files have been inserted into the database, as `{path: cloud_filepath}`"""
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "UPDATE job SET stage = ?, cloud_filepath = ?, updated = ? WHERE path = ?",
+                [
+                    (INSERTED, cloud_filepath, time.time(), path)
+                    for path, cloud_filepath in cloud_filepaths.items()
+                ],
+            )
+
+    def uploaded(self, path: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE job SET stage = ?, updated = ? WHERE path = ?",
+                (UPLOADED, time.time(), path),
+            )
+
+    def remove(self, path: str) -> None:
+        """Forget a file, once it's been deleted"""
+        with self._lock:
+            self._connection.execute("DELETE FROM job WHERE path = ?", (path,))
+
+    def paths(self) -> list[str]:
+        """Paths of every unfinished job, oldest first"""
+        with self._lock:
+            return [
+                path
+                for (path,) in self._connection.execute(
+                    "SELECT path FROM job ORDER BY updated"
+                )
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def pending_paths(journal: UploadJournal, directories: Iterable[str] = ()) -> list[str]:
+    """
+    Paths to upload after a restart: unfinished jobs whose files still exist,
+    then everything in each of `directories`, e.g. files that arrived while the uploader was stopped.
+
+    Directories are listed, not walked, `Uploader.upload` walks each entry.
+    """
+    entries = []
+    for directory in directories:
+        try:
+            listing = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            continue
+        entries += [entry.path for entry in listing if not is_temporary(entry.name)]
+
+    # A job inside one of the entries is resumed when its directory is uploaded,
+    # queueing it as well could have two consumers uploading it at once
+    directories = tuple(os.path.join(entry, "") for entry in entries)
+    jobs = [
+        path
+        for path in journal.paths()
+        if os.path.exists(path)
+        and path not in entries
+        and not path.startswith(directories)
+    ]
+    return jobs + entries
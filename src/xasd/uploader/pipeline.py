@@ -0,0 +1,137 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+from xasd.storage import StorageBackend
+from xasd.uploader.b2_upload import MetricsProgressListener, UploadMetrics
+from xasd.uploader.dejavu import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimings:
+    """Wall clock time spent in each stage of the upload pipeline, e.g. "fingerprint", "upload" """
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float) -> None:
+        timing = self.stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{stage}: {timing['count']} in {timing['total']:.2f}s "
+            f"(mean {timing['total'] / timing['count']:.3f}s, max {timing['max']:.3f}s)"
+            for stage, timing in self.stages.items()
+        )
+
+
+class Fingerprinter:
+    """
+    Fingerprint audio files (see `xasd.uploader.dejavu.fingerprint`) in a pool of processes,
+    so decoding and hashing run on every core and don't block the event loop.
+
+    At most `max_pending` files are submitted to the pool at once, further callers wait,
+    which in turn stops consumers taking more work from the upload queue.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timings: Optional[StageTimings] = None,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.timings = timings or StageTimings()
+
+        # Workers are spawned, rather than forked from a process running threads and an event loop
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._pending = asyncio.Semaphore(self.max_pending)
+
+    async def fingerprint(self, filepath: str, mimetype: str) -> str:
+        """Perceptual hash of an audio file, computed in a worker process"""
+        async with self._pending:
+            with self.timings.time("fingerprint"):
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, fingerprint, filepath, mimetype
+                )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+
+class UploadService:
+    """
+    Upload files to a storage backend (e.g. `B2Bucket`) from a pool of threads, so transfers don't block the event loop
+    and several files upload at once while other files are fingerprinted.
+
+    Large files are split into parts by b2sdk, which are uploaded in parallel on the
+    bucket's own upload threads. At most `max_pending` files are submitted at once, further callers wait.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        max_workers: int = 4,
+        max_pending: Optional[int] = None,
+        timings: Optional[StageTimings] = None,
+    ):
+        self.storage = storage
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 2
+        self.timings = timings or StageTimings()
+        self.metrics = UploadMetrics()
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="upload"
+        )
+        self._pending = asyncio.Semaphore(self.max_pending)
+
+    async def upload(self, local_file: str, remote_file: str, **file_info) -> None:
+        """Upload `local_file` as `remote_file`, in a worker thread"""
+        listener = MetricsProgressListener(self.metrics, remote_file)
+        async with self._pending:
+            self.metrics.start(id(listener))
+            success = False
+            try:
+                with self.timings.time("upload"):
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._executor,
+                        functools.partial(
+                            self.storage.upload_file,
+                            local_file,
+                            remote_file,
+                            progress_listener=listener,
+                            **file_info,
+                        ),
+                    )
+                success = True
+            finally:
+                self.metrics.finish(id(listener), success)
+
+    def stats(self) -> dict:
+        return {"workers": self.max_workers, **self.metrics.stats()}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
@@ -0,0 +1,176 @@
+import logging
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+import mutagen
+
+from xasd.uploader import fileinfo
+from xasd.uploader.track_info import tags
+
+logger = logging.getLogger(__name__)
+
+
+# Bytes read after any ID3v2 tag to recognise the container, enough for Ogg's first pages
+HEADER_SIZE = 512
+
+# ftyp major brands only used for audio, any other brand (e.g. isom, mp42) is checked for a video track
+MP4_AUDIO_BRANDS = {b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B "}
+
+# Start of the first packet of each Ogg stream, for the audio codecs
+OGG_AUDIO_CODECS = (b"OpusHead", b"\x01vorbis", b"\x7fFLAC", b"Speex   ")
+
+
+def _ogg_codecs(header: bytes) -> list[bytes]:
+    """First bytes of the first packet of each stream in an Ogg file"""
+    codecs = []
+    offset = 0
+    # Every stream starts with a page flagged beginning of stream, before any other page
+    while header[offset : offset + 4] == b"OggS" and len(header) > offset + 27:
+        if not header[offset + 5] & 0x02:
+            break
+        segments = header[offset + 26]
+        lengths = header[offset + 27 : offset + 27 + segments]
+        packet = offset + 27 + segments
+        codecs.append(header[packet : packet + 8])
+        offset = packet + sum(lengths)
+    return codecs
+
+
+def container_mimetype(header: bytes) -> Optional[str]:
+    """
+    Returns the mimetype of a container from the first bytes of the file,
+    or None if it isn't recognised.
+
+    Ogg and MP4 files can also hold video. An Ogg file with a stream that isn't audio is `application/ogg`.
+    An MP4 file whose brand isn't audio only is `video/mp4`, `probe` checks whether it has a video track.
+
+    Args:
+        header (bytes): The first `HEADER_SIZE` bytes of the file, after any ID3v2 tag.
+    """
+    if header[:4] == b"fLaC":
+        return "audio/flac"
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header[:4] == b"OggS":
+        codecs = _ogg_codecs(header)
+        if codecs and all(codec.startswith(OGG_AUDIO_CODECS) for codec in codecs):
+            return "audio/ogg"
+        return "application/ogg"
+    if header[4:8] == b"ftyp":
+        if header[8:12] in MP4_AUDIO_BRANDS:
+            return "audio/mp4"
+        return "video/mp4"
+    # MPEG audio frame sync, 11 set bits
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"
+    return None
+
+
+def _mp4_boxes(f: BinaryIO, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """(type, data start, end) of each box between `start` and `end` of an MP4 file"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header[:8])
+        data = offset + 8
+        if size == 1:
+            size = struct.unpack(">Q", header[8:16])[0]
+            data += 8
+        elif size == 0:
+            size = end - offset
+        if size < data - offset:
+            return
+        yield box_type, data, offset + size
+        offset += size
+
+
+def _mp4_find(
+    f: BinaryIO, start: int, end: int, path: tuple[bytes, ...]
+) -> Iterator[tuple[int, int]]:
+    """(data start, end) of every box at `path`, e.g. every track's handler"""
+    for box_type, data, box_end in _mp4_boxes(f, start, end):
+        if box_type != path[0]:
+            continue
+        if len(path) == 1:
+            yield data, box_end
+        else:
+            yield from _mp4_find(f, data, box_end, path[1:])
+
+
+def _mp4_has_video(f: BinaryIO, size: int) -> bool:
+    """Whether an MP4 file has a video track, from the handler type of each track"""
+    for start, _ in _mp4_find(f, 0, size, (b"moov", b"trak", b"mdia", b"hdlr")):
+        # version and flags, pre_defined, then the handler type
+        f.seek(start + 8)
+        if f.read(4) == b"vide":
+            return True
+    return False
+
+
+def _id3_size(header: bytes) -> int:
+    """Size of an ID3v2 tag at the start of a file, including its header, 0 if there isn't one"""
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    # Syncsafe integer, 7 bits per byte, plus a 10 byte footer if flagged
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def probe(filepath: str) -> Dict[str, Any]:
+    """
+    Reads the tags and audio properties of a file, opening it once.
+    The container type is read from the file's magic bytes, rather than guessed from its extension.
+
+    Args:
+        filepath: A string representing the path to an audio file.
+
+    Returns:
+        A dictionary of the tags returned by `track_info`, and:
+            - "mimetype": The mimetype of the container, from its magic bytes,
+              or guessed from the extension if they aren't recognised.
+            - "size": The size of the file in bytes.
+            - "duration": The length of the audio in seconds.
+            - "bitrate": The bitrate in bits per second.
+            - "sample_rate": The sample rate in Hz.
+            - "channels": The number of channels.
+
+            Tags and properties that can't be read are None.
+    """
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        header = f.read(10)
+        # Skip an ID3v2 tag, e.g. on mp3 (and occasionally flac) files
+        f.seek(_id3_size(header))
+        mimetype = container_mimetype(f.read(HEADER_SIZE)) or fileinfo.mimetype(
+            filepath
+        )
+        if mimetype == "video/mp4" and not _mp4_has_video(f, size):
+            mimetype = "audio/mp4"
+
+        f.seek(0)
+        try:
+            audio = mutagen.File(f, easy=True)
+        except mutagen.MutagenError:
+            logger.warning(f"Unable to read tags of {filepath}")
+            audio = None
+
+    info = getattr(audio, "info", None)
+    properties = {
+        "duration": getattr(info, "length", None),
+        "bitrate": getattr(info, "bitrate", None) or None,
+        "sample_rate": getattr(info, "sample_rate", None),
+        "channels": getattr(info, "channels", None),
+    }
+
+    return {
+        **tags(audio),
+        "mimetype": mimetype,
+        "size": size,
+        **properties,
+    }
@@ -1,5 +1,5 @@
 import re
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 import mutagen
 
@@ -60,18 +60,31 @@ def track_info(filepath: str) -> Dict[str, Optional[str]]:
     except mutagen.MutagenError:
         raise ValueError(f"File {filepath} is not a valid audio file")
 
+    return tags(track_info)
+
+
+def tags(audio: Optional[Any]) -> Dict[str, Optional[str]]:
+    """
+    Returns the track information `track_info` returns, from a file opened with `mutagen.File(..., easy=True)`.
+
+    Args:
+        audio: The opened file, or None if mutagen didn't recognise it, in which case every tag is None.
+    """
+    if audio is None:
+        audio = {}
+
     # The artist tag sometimes contains multiple artist, or features.
     # For now, just get the first artist
-    i3d_artist = track_info.get("artist", [None]).pop()
+    i3d_artist = audio.get("artist", [None]).pop()
     artist = artist_names(i3d_artist)[0] if i3d_artist else None
 
     return {
-        "album": track_info.get("album", [None]).pop(),
-        "title": track_info.get("title", [None]).pop(),
+        "album": audio.get("album", [None]).pop(),
+        "title": audio.get("title", [None]).pop(),
         "artist": artist,
-        "tracknumber": track_info.get("tracknumber", [None]).pop(),
-        "genre": track_info.get("genre", [None]).pop(),
-        "date": track_info.get("date", [None]).pop(),
+        "tracknumber": audio.get("tracknumber", [None]).pop(),
+        "genre": audio.get("genre", [None]).pop(),
+        "date": audio.get("date", [None]).pop(),
         "hash": None,
     }
 
@@ -1,4 +1,6 @@
 import os
+import time
+from typing import Callable, Dict, List, Optional
 
 from asyncinotify import InitFlags, Inotify, Mask
 
@@ -48,3 +50,96 @@ class InotifyRecurse(Inotify):
 
         for path in paths:
             self.add_watch(path, self._mask)
+
+
+# Files still being written by a download client, or renamed to their final name when complete
+TEMP_SUFFIXES = (
+    ".!qb",
+    ".!ut",
+    ".crdownload",
+    ".download",
+    ".part",
+    ".partial",
+    ".parts",
+    ".temp",
+    ".tmp",
+)
+
+
+def is_temporary(name: str) -> bool:
+    """Whether a file or directory name is hidden, or one still being written (see `TEMP_SUFFIXES`)"""
+    return name.startswith(".") or name.lower().endswith(TEMP_SUFFIXES)
+
+
+class Debouncer:
+    """
+    Coalesces inotify events into one path per top level entry of a watched directory,
+    once nothing in the entry has changed for `quiet` seconds.
+
+    A torrent client opens and closes a file many times while writing its pieces, and writes
+    an album's files over minutes, so every event under e.g. `root/album/` pushes back the
+    deadline of `root/album`, which is returned once by `ready` when the download has settled.
+
+    Temporary and hidden entries, e.g. `track.flac.part`, still push back their deadline but are never returned,
+    their final name is, once they're renamed.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        quiet: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Args:
+            root (str): The watched directory.
+            quiet (float, optional): Seconds an entry must go without events. Defaults to 10.
+            clock (Callable[[], float], optional): Time source. Defaults to `time.monotonic`.
+        """
+        self.root = os.path.abspath(root)
+        self.quiet = quiet
+        self._clock = clock
+        # Insertion ordered, which is deadline order as every deadline is `quiet` after its touch
+        self._deadlines: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def entry(self, path: str) -> Optional[str]:
+        """The top level entry of the watched directory `path` is in, None for the directory itself"""
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        if relative == "." or relative.startswith(".."):
+            return None
+        return os.path.join(self.root, relative.split(os.sep)[0])
+
+    def touch(self, path: str) -> None:
+        """Record an event on `path`, restarting its entry's quiet period"""
+        entry = self.entry(path)
+        if entry is None:
+            return
+        self._deadlines.pop(entry, None)
+        self._deadlines[entry] = self._clock() + self.quiet
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the next entry could be ready, None if there are none"""
+        for deadline in self._deadlines.values():
+            return max(0.0, deadline - self._clock())
+        return None
+
+    def ready(self) -> List[str]:
+        """Entries which have been quiet for `quiet` seconds, each returned once"""
+        now = self._clock()
+        ready = []
+        while self._deadlines:
+            entry, deadline = next(iter(self._deadlines.items()))
+            if deadline > now:
+                break
+            del self._deadlines[entry]
+
+            if is_temporary(os.path.basename(entry)):
+                continue
+            # e.g. a temporary directory which has been renamed or deleted
+            if not os.path.exists(entry):
+                continue
+            ready.append(entry)
+        return ready
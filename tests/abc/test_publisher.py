@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+from aio_pika.exceptions import DeliveryError
+
+from xasd.abc.amqp import Publisher
+
+
+class Exchange:
+    def __init__(self, channel):
+        self.channel = channel
+        self.in_flight = 0
+
+    async def publish(self, message, routing_key):
+        # A batch is published together, so a new one starts when nothing is in flight
+        if not self.in_flight:
+            self.channel.batches.append([])
+        self.channel.batches[-1].append(message.body)
+
+        self.in_flight += 1
+        try:
+            # Confirmed by the broker later, once per round trip
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        if routing_key == "rejected":
+            raise DeliveryError(None, None)
+
+
+class Channel:
+    def __init__(self):
+        self.is_closed = False
+        self.default_exchange = Exchange(self)
+        self.batches = []
+        self.queues = {}
+
+    async def declare_queue(self, name, durable):
+        self.queues[name] = durable
+
+    async def close(self):
+        self.is_closed = True
+
+
+class Connection:
+    def __init__(self):
+        self.channels = []
+
+    async def channel(self, publisher_confirms):
+        assert publisher_confirms
+        self.channels.append(Channel())
+        return self.channels[-1]
+
+
+@pytest.fixture(scope="function")
+def connection():
+    return Connection()
+
+
+def publisher(connection, **kwargs):
+    async def connect():
+        return connection
+
+    return Publisher(connect, **kwargs)
+
+
+def test_one_channel(connection):
+    async def publish():
+        p = publisher(connection)
+        await asyncio.gather(*(p.publish("queue", f"{n}") for n in range(10)))
+        await p.publish("queue", b"bytes")
+        await p.close()
+
+    asyncio.run(publish())
+
+    assert len(connection.channels) == 1
+    channel = connection.channels[0]
+    assert channel.is_closed
+    assert channel.queues == {"queue": True}
+    assert [body for batch in channel.batches for body in batch] == [
+        *(f"{n}".encode() for n in range(10)),
+        b"bytes",
+    ]
+
+
+def test_batches(connection):
+    async def publish():
+        p = publisher(connection, batch_size=4)
+        first = asyncio.create_task(p.publish("queue", "first"))
+        await asyncio.sleep(0)
+        # Published while the first message is waiting for its confirm, sent together
+        rest = [p.publish("queue", f"{n}") for n in range(6)]
+        await asyncio.gather(first, *rest)
+
+    asyncio.run(publish())
+
+    assert connection.channels[0].batches == [
+        [b"first"],
+        [b"0", b"1", b"2", b"3"],
+        [b"4", b"5"],
+    ]
+
+
+def test_rejected_message(connection):
+    async def publish():
+        p = publisher(connection)
+        results = await asyncio.gather(
+            p.publish("queue", "accepted"),
+            p.publish("rejected", "rejected"),
+            return_exceptions=True,
+        )
+        return results
+
+    accepted, rejected = asyncio.run(publish())
+    assert accepted is None
+    assert isinstance(rejected, DeliveryError)
+
+
+def test_reopens_closed_channel(connection):
+    async def publish():
+        p = publisher(connection)
+        await p.publish("queue", "first")
+        connection.channels[0].is_closed = True
+        await p.publish("queue", "second")
+
+    asyncio.run(publish())
+    assert len(connection.channels) == 2
+    assert connection.channels[1].queues == {"queue": True}
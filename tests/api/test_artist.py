@@ -14,7 +14,16 @@ def test_read_albums(create_track, client):
                     "tracknumber": "1",
                     "date": "2023",
                     "track_id": 1,
-                    "file": {"filepath": "filepath", "file_id": 1},
+                    "file": {
+                        "filepath": "filepath",
+                        "file_id": 1,
+                        "mimetype": None,
+                        "size": None,
+                        "duration": None,
+                        "bitrate": None,
+                        "sample_rate": None,
+                        "channels": None,
+                    },
                     "artist": {"name": "artist_name", "artist_id": 1},
                     "album": {"name": "album_name", "cover_art": None},
                     "genre": {"name": "genre_name", "genre_id": 1},
@@ -41,7 +50,16 @@ def test_read_tracks(create_track, client):
             "tracknumber": "1",
             "date": "2023",
             "track_id": 1,
-            "file": {"filepath": "filepath", "file_id": 1},
+            "file": {
+                "filepath": "filepath",
+                "file_id": 1,
+                "mimetype": None,
+                "size": None,
+                "duration": None,
+                "bitrate": None,
+                "sample_rate": None,
+                "channels": None,
+            },
             "artist": {"name": "artist_name", "artist_id": 1},
             "album": {"name": "album_name", "cover_art": None},
             "genre": {"name": "genre_name", "genre_id": 1},
@@ -57,3 +75,21 @@ def test_read_tracks_nonexistent(env, client):
 
 
 # TODO test for track and album not found
+
+
+def test_read_artists_cursor(db, client):
+    for name in ["b", "a", "c"]:
+        db.artist.create(name=name)
+
+    with client as c:
+        first = c.get("/artist", params={"limit": 2})
+        second = c.get(
+            "/artist", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}
+        )
+
+    assert first.json() == [
+        {"name": "a", "artist_id": 2},
+        {"name": "b", "artist_id": 1},
+    ]
+    assert second.json() == [{"name": "c", "artist_id": 3}]
+    assert "X-Next-Cursor" not in second.headers
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+
+from xasd.api.services.password import PasswordHasher, PasswordHasherBusy
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(max_workers=2)
+
+    async def run():
+        password_hash = await hasher.hash("password")
+        assert await hasher.verify("password", password_hash)
+        assert not await hasher.verify("invalid_password", password_hash)
+
+    asyncio.run(run())
+    hasher.shutdown()
+
+    assert hasher.stats() == {
+        "workers": 2,
+        "queued": 0,
+        "running": 0,
+        "completed": 3,
+        "rejected": 0,
+    }
+
+
+def test_queue_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.ensure_future(hasher._run(release.wait))
+        queued = asyncio.ensure_future(hasher._run(release.wait))
+        await asyncio.sleep(0.05)
+        assert (hasher.running, hasher.queued) == (1, 1)
+
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.hash("password")
+
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(run())
+    hasher.shutdown()
+
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["completed"] == 2
+
+
+def test_health_password_hashing(client):
+    with client as c:
+        response = c.get("/health")
+    assert response.json()["password_hashing"]["queued"] == 0
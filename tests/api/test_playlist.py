@@ -15,7 +15,16 @@ def test_read_playlists_me(create_playlist, client):
                         "tracknumber": "1",
                         "date": "2023",
                         "track_id": 1,
-                        "file": {"filepath": "filepath", "file_id": 1},
+                        "file": {
+                            "filepath": "filepath",
+                            "file_id": 1,
+                            "mimetype": None,
+                            "size": None,
+                            "duration": None,
+                            "bitrate": None,
+                            "sample_rate": None,
+                            "channels": None,
+                        },
                         "artist": {"name": "artist_name", "artist_id": 1},
                         "album": {"name": "album_name", "cover_art": None},
                         "genre": {"name": "genre_name", "genre_id": 1},
@@ -130,7 +139,16 @@ def test_add_track_to_playlist(create_playlist, client):
                 "tracknumber": "1",
                 "date": "2023",
                 "track_id": 1,
-                "file": {"filepath": "filepath", "file_id": 1},
+                "file": {
+                    "filepath": "filepath",
+                    "file_id": 1,
+                    "mimetype": None,
+                    "size": None,
+                    "duration": None,
+                    "bitrate": None,
+                    "sample_rate": None,
+                    "channels": None,
+                },
                 "artist": {"name": "artist_name", "artist_id": 1},
                 "album": {"name": "album_name", "cover_art": None},
                 "genre": {"name": "genre_name", "genre_id": 1},
@@ -139,6 +157,20 @@ def test_add_track_to_playlist(create_playlist, client):
     }
 
 
+def test_add_track_to_playlist_twice(create_playlist, client):
+    # The playlist already has the track, adding it again leaves it there once
+    token = create_playlist["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    with client as c:
+        added = c.patch("/playlist/1/track/1", headers=headers)
+        playlists = c.get("/playlist/me", headers=headers)
+
+    assert [track["track_id"] for track in added.json()["tracks"]] == [1]
+    assert [
+        track["track_id"] for track in playlists.json()["playlists"][0]["tracks"]
+    ] == [1]
+
+
 def test_add_track_to_playlist_no_token(env, client):
     with client as c:
         response = c.patch("/playlist/1/track/1")
@@ -280,7 +312,16 @@ def test_update_playlist(create_playlist, client):
                 "tracknumber": "1",
                 "date": "2023",
                 "track_id": 1,
-                "file": {"filepath": "filepath", "file_id": 1},
+                "file": {
+                    "filepath": "filepath",
+                    "file_id": 1,
+                    "mimetype": None,
+                    "size": None,
+                    "duration": None,
+                    "bitrate": None,
+                    "sample_rate": None,
+                    "channels": None,
+                },
                 "artist": {"name": "artist_name", "artist_id": 1},
                 "album": {"name": "album_name", "cover_art": None},
                 "genre": {"name": "genre_name", "genre_id": 1},
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from xasd.cache import ResponseCache, entity_tags
+from xasd.cache.memory import MemoryBackend
+from xasd.database import models
+
+
+@pytest.fixture(scope="function")
+def cached_client(client, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_URL", "memory://?max_entries=100&ttl=60")
+    yield client
+
+
+def test_read_track_cached(create_track, cached_client):
+    with cached_client as c:
+        first = c.get("/track/1")
+        second = c.get("/track/1")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.headers["Access-Control-Allow-Origin"] == "*"
+    assert second.json() == first.json()
+
+
+def test_read_track_not_modified(create_track, cached_client):
+    with cached_client as c:
+        etag = c.get("/track/1").headers["ETag"]
+        response = c.get("/track/1", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
+def test_read_track_nonexistent_not_cached(env, cached_client):
+    with cached_client as c:
+        c.get("/track/1")
+        response = c.get("/track/1")
+
+    assert response.status_code == 404
+    assert "X-Cache" not in response.headers
+
+
+def test_artist_tracks_cached_with_cursor(create_track, cached_client, db):
+    db.track.create(
+        filter=[models.Track.title == "second_track"],
+        title="second_track",
+        artist=db.artist.get("artist_name"),
+    )
+
+    with cached_client as c:
+        c.get("/artist/artist_name/tracks?limit=1")
+        response = c.get("/artist/artist_name/tracks?limit=1")
+
+    assert response.headers["X-Cache"] == "HIT"
+    assert "X-Next-Cursor" in response.headers
+
+
+def test_cache_invalidated_on_commit(create_track, cached_client, db):
+    with cached_client as c:
+        c.app.state.response_cache.watch(db._session)
+        c.get("/track/1")
+        c.get("/artist/artist_name/albums")
+
+        album = db.album.get(filter=[models.Album.album_id == 1])
+        db.cover_art.create(
+            filter=[models.CoverArt.album == album],
+            album=album,
+            filepath="cover.jpg",
+        )
+
+        track = c.get("/track/1")
+        albums = c.get("/artist/artist_name/albums")
+
+    assert track.headers["X-Cache"] == "MISS"
+    assert track.json()["album"]["cover_art"] == {
+        "filepath": "cover.jpg",
+        "cover_art_id": 1,
+    }
+    assert albums.headers["X-Cache"] == "MISS"
+
+
+def test_entity_tags(create_track, db):
+    track = db.track.get(filter=[models.Track.track_id == 1])
+
+    assert entity_tags(track) == {"track:1", "file:1", "album:1", "artist:1", "genre:1"}
+    assert entity_tags(track.file) == {"file:1", "hash:1"}
+
+
+def test_memory_backend_lru():
+    cache = ResponseCache(MemoryBackend(max_entries=2))
+
+    async def run():
+        await cache.set("a", b"a", "application/json", ["track:1"])
+        await cache.set("b", b"b", "application/json", ["track:2"])
+        await cache.get("a")
+        await cache.set("c", b"c", "application/json", ["track:3"])
+
+        assert await cache.get("b") is None
+        assert (await cache.get("a")).body == b"a"
+
+        cache.invalidate(["track:1"])
+        assert await cache.get("a") is None
+
+    asyncio.run(run())
+
+
+def test_written_while_building_not_cached():
+    cache = ResponseCache(MemoryBackend())
+
+    async def run():
+        clock = await cache.clock()
+        # Committed after the handler read the track, but before the response is stored
+        cache.invalidate(["track:1"])
+        await cache.set("a", b"a", "application/json", ["track:1"], clock=clock)
+        assert await cache.get("a") is None
+
+        clock = await cache.clock()
+        cache.invalidate(["track:2"])
+        await cache.set("a", b"a", "application/json", ["track:1"], clock=clock)
+        assert (await cache.get("a")).body == b"a"
+
+    asyncio.run(run())
@@ -16,7 +16,16 @@ def test_search_any(create_track, client):
                 "tracknumber": "1",
                 "date": "2023",
                 "track_id": 1,
-                "file": {"filepath": "filepath", "file_id": 1},
+                "file": {
+                    "filepath": "filepath",
+                    "file_id": 1,
+                    "mimetype": None,
+                    "size": None,
+                    "duration": None,
+                    "bitrate": None,
+                    "sample_rate": None,
+                    "channels": None,
+                },
                 "artist": {"name": "artist_name", "artist_id": 1},
                 "album": {"name": "album_name", "cover_art": None},
                 "genre": {"name": "genre_name", "genre_id": 1},
@@ -45,9 +54,43 @@ def test_search_track(create_track, client):
             "tracknumber": "1",
             "date": "2023",
             "track_id": 1,
-            "file": {"filepath": "filepath", "file_id": 1},
+            "file": {
+                "filepath": "filepath",
+                "file_id": 1,
+                "mimetype": None,
+                "size": None,
+                "duration": None,
+                "bitrate": None,
+                "sample_rate": None,
+                "channels": None,
+            },
             "artist": {"name": "artist_name", "artist_id": 1},
             "album": {"name": "album_name", "cover_art": None},
             "genre": {"name": "genre_name", "genre_id": 1},
         }
     ]
+
+
+def test_search_track_page(create_track, client):
+    with client as c:
+        response = c.get("/search/track/track_title?page=2")
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_search_suggest(create_track, client):
+    with client as c:
+        response = c.get("/search/suggest/track")
+
+    assert response.status_code == 200
+    assert response.json() == [{"type": "track", "id": 1, "name": "track_title"}]
+
+
+def test_search_suggest_memory_index(create_track, client, monkeypatch):
+    monkeypatch.setenv("MEMORY_SEARCH_INDEX", "1")
+    with client as c:
+        response = c.get("/search/suggest/artst_name")
+
+    assert response.status_code == 200
+    assert response.json() == [{"type": "artist", "id": 1, "name": "artist_name"}]
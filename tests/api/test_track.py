@@ -7,7 +7,16 @@ def test_read_track(create_track, client):
         "tracknumber": "1",
         "date": "2023",
         "track_id": 1,
-        "file": {"filepath": "filepath", "file_id": 1},
+        "file": {
+            "filepath": "filepath",
+            "file_id": 1,
+            "mimetype": None,
+            "size": None,
+            "duration": None,
+            "bitrate": None,
+            "sample_rate": None,
+            "channels": None,
+        },
         "artist": {"name": "artist_name", "artist_id": 1},
         "album": {"name": "album_name", "cover_art": None},
         "genre": {"name": "genre_name", "genre_id": 1},
@@ -31,7 +40,16 @@ def test_read_tracks(create_track, client):
             "tracknumber": "1",
             "date": "2023",
             "track_id": 1,
-            "file": {"filepath": "filepath", "file_id": 1},
+            "file": {
+                "filepath": "filepath",
+                "file_id": 1,
+                "mimetype": None,
+                "size": None,
+                "duration": None,
+                "bitrate": None,
+                "sample_rate": None,
+                "channels": None,
+            },
             "artist": {"name": "artist_name", "artist_id": 1},
             "album": {"name": "album_name", "cover_art": None},
             "genre": {"name": "genre_name", "genre_id": 1},
@@ -43,7 +61,16 @@ def test_read_file(create_track, client):
     with client as c:
         response = c.get("/track/1/file")
     assert response.status_code == 200
-    assert response.json() == {"filepath": "filepath", "file_id": 1}
+    assert response.json() == {
+        "filepath": "filepath",
+        "file_id": 1,
+        "mimetype": None,
+        "size": None,
+        "duration": None,
+        "bitrate": None,
+        "sample_rate": None,
+        "channels": None,
+    }
 
 
 def test_read_file_nonexistent(env, client):
@@ -51,3 +78,11 @@ def test_read_file_nonexistent(env, client):
         response = c.get("/track/1/file")
     assert response.status_code == 404
     assert response.json() == {"detail": "Track not found"}
+
+
+def test_read_tracks_invalid_cursor(env, client):
+    with client as c:
+        response = c.get("/track", params={"cursor": "not a cursor"})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
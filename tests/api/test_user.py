@@ -1,3 +1,8 @@
+from types import SimpleNamespace
+
+from xasd.api import dependencies
+
+
 def test_create_user(client):
     with client as c:
         response = c.post(
@@ -97,6 +102,60 @@ def test_read_users_me(create_token, client):
     }
 
 
+def _login(c):
+    response = c.post(
+        "/token",
+        data={"grant_type": "password", "username": "username", "password": "password"},
+    )
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_read_users_me_cached(create_user, client, db):
+    with client as c:
+        headers = _login(c)
+        assert c.get("/user/me", headers=headers).status_code == 200
+
+        # Deleted without revoking, the verified token is still cached
+        db.user.delete(db.user.get("username"))
+        assert c.get("/user/me", headers=headers).status_code == 200
+
+        c.app.state.principal_cache.revoke(1)
+        response = c.get("/user/me", headers=headers)
+
+    assert response.status_code == 401
+
+
+def test_read_users_me_password_changed(create_user, client, db):
+    with client as c:
+        c.app.state.principal_cache.watch(db._session)
+        headers = _login(c)
+        assert c.get("/user/me", headers=headers).status_code == 200
+
+        db.user.update(db.user.get("username"), password_hash="changed")
+        response = c.get("/user/me", headers=headers)
+
+    assert response.status_code == 401
+
+
+async def _delete_user(app, name):
+    # Through the API's own database dependency, i.e. the async driver with ASYNC_DATABASE set
+    database = dependencies._db(SimpleNamespace(app=app))
+    db = await anext(database)
+    await db.user.delete(await db.user.get(name))
+    await database.aclose()
+
+
+def test_read_users_me_deleted(create_user, client):
+    with client as c:
+        headers = _login(c)
+        assert c.get("/user/me", headers=headers).status_code == 200
+
+        c.portal.call(_delete_user, c.app, "username")
+        response = c.get("/user/me", headers=headers)
+
+    assert response.status_code == 401
+
+
 def test_read_users_me_no_token(client):
     with client as c:
         response = c.get("/user/me")
@@ -11,8 +11,11 @@ from xasd.database.crud import XasdDB
 from xasd.database.session import Session
 
 
-@pytest.fixture(scope="function")
-def client(env):
+# Run every API test against both the threaded sync database path and the async driver
+@pytest.fixture(scope="function", params=["sync", "async"])
+def client(env, request, monkeypatch):
+    if request.param == "async":
+        monkeypatch.setenv("ASYNC_DATABASE", "1")
     yield TestClient(app)
 
 
@@ -0,0 +1,107 @@
+import pytest
+import sqlalchemy
+from sqlalchemy import event
+
+from xasd.database import models
+
+
+def _info(title, tracknumber, album="album_name", artist="artist_name", hash=None):
+    return {
+        "album": album,
+        "title": title,
+        "artist": artist,
+        "tracknumber": tracknumber,
+        "genre": "genre_name",
+        "date": "2023",
+        "hash": hash or f"hash_{title}",
+    }
+
+
+@pytest.fixture(scope="function")
+def statements(db):
+    executed = []
+    engine = db._session.get_bind()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def test_insert_file(db):
+    file, track = db.insert_file("filepath", _info("track_title", "1"))
+
+    assert file.track == track
+    assert file.hash.hash == "hash_track_title"
+    assert track.album.name == "album_name"
+    assert track.album.artist == track.artist
+    assert track.genre.name == "genre_name"
+
+
+def test_insert_files_album(db, statements):
+    files = [(f"filepath_{i}", _info(f"track_{i}", str(i))) for i in range(20)]
+
+    inserted = db.insert_files(files)
+    statement_count = len(statements)
+
+    assert len(inserted) == 20
+    assert db._session.query(models.Artist).count() == 1
+    assert db._session.query(models.Album).count() == 1
+    assert db._session.query(models.Track).count() == 20
+    assert [track.tracknumber for _, track in inserted] == [str(i) for i in range(20)]
+    # Independent of the number of files, rather than ~10 per file
+    assert statement_count < 15
+
+
+def test_insert_files_existing_rows(db, create_track):
+    file, track = db.insert_files(
+        [("filepath_2", _info("track_title", "1")), ("filepath", _info("new", "2"))]
+    )[0]
+
+    assert track.track_id == 1
+    assert track.artist.artist_id == 1
+    assert db._session.query(models.Artist).count() == 1
+    assert db._session.query(models.Genre).count() == 1
+    assert track.file.filepath == "filepath_2"
+    # An existing file is not inserted again
+    assert db._session.query(models.File).count() == 2
+
+
+def test_insert_files_dedupes_within_batch(db):
+    inserted = db.insert_files(
+        [
+            ("filepath_1", _info("track", "1", album="a", artist="x")),
+            ("filepath_2", _info("track", "1", album="a", artist="y")),
+            ("filepath_3", _info("track", "1", album="a", artist="x", hash="other")),
+        ]
+    )
+
+    assert db._session.query(models.Artist).count() == 2
+    assert db._session.query(models.Album).count() == 2
+    assert inserted[0][1] is inserted[2][1]
+    assert inserted[0][1] is not inserted[1][1]
+
+
+def test_insert_files_untagged(db):
+    untagged = {"hash": None}
+
+    inserted = db.insert_files([("filepath_1", untagged), ("filepath_2", untagged)])
+
+    assert inserted[0][1] is not inserted[1][1]
+    assert inserted[0][1].artist is None
+    assert db._session.query(models.Genre).count() == 0
+
+
+def test_insert_files_rolls_back(db):
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        db.insert_files(
+            [
+                ("filepath_1", _info("track_1", "1")),
+                (None, _info("track_2", "2")),
+            ]
+        )
+
+    assert db._session.query(models.Artist).count() == 0
+    assert db._session.query(models.File).count() == 0
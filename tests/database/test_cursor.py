@@ -0,0 +1,38 @@
+import pytest
+
+from xasd.database import models
+from xasd.database.crud.cursor import InvalidCursor, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(["name", 1])
+
+    assert decode_cursor(cursor, 2) == ["name", 1]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor([1]), "e30"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 2)
+
+
+def test_api_get_page(db):
+    # Duplicate names make sure the primary key breaks ties
+    for name in ["c", "a", "b", "a", "c", "b", "a"]:
+        db.artist.create(filter=[models.Artist.name == None], name=name)
+
+    pages = []
+    cursor = None
+    while True:
+        artists, cursor = db.api_get_page(
+            models.Artist, order_by=[models.Artist.name], cursor=cursor, limit=3
+        )
+        pages.append([(artist.name, artist.artist_id) for artist in artists])
+        if cursor is None:
+            break
+
+    assert pages == [
+        [("a", 2), ("a", 4), ("a", 7)],
+        [("b", 3), ("b", 6), ("c", 1)],
+        [("c", 5)],
+    ]
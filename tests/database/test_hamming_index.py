@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from xasd.database.crud import XasdDB
+from xasd.database.search.hamming import HammingIndex
+from xasd.database.session import Session
+
+
+def flip(hash, *bits):
+    value = int(hash, 16)
+    for bit in bits:
+        value ^= 1 << bit
+    return f"{value:021x}"
+
+
+def brute_force(hashes, query, threshold):
+    value = int(query, 16)
+    matches = [
+        (hash_id, bin(value ^ int(hash, 16)).count("1"))
+        for hash_id, hash in hashes.items()
+    ]
+    return sorted(
+        [match for match in matches if match[1] <= threshold],
+        key=lambda match: (match[1], match[0]),
+    )
+
+
+@pytest.fixture(scope="function")
+def hashes():
+    rng = random.Random(0)
+    return {hash_id: f"{rng.getrandbits(81):021x}" for hash_id in range(1, 2001)}
+
+
+def test_find(hashes):
+    index = HammingIndex(threshold=4)
+    for hash_id, hash in hashes.items():
+        index.add(hash_id, hash)
+
+    query = flip(hashes[7], 0, 40, 80)
+    assert index.find(query) == [(7, 3)]
+    assert index.find(query, threshold=2) == []
+    assert index.find(hashes[7]) == [(7, 0)]
+    assert index.find(flip(hashes[7], 1, 2, 3, 4, 5)) == []
+
+
+def test_find_matches_brute_force(hashes, monkeypatch):
+    # Some hashes merged into the sorted parts, the rest still pending
+    monkeypatch.setattr(HammingIndex, "MERGE_SIZE", 512)
+    index = HammingIndex(threshold=6)
+    for hash_id, hash in hashes.items():
+        index.add(hash_id, hash)
+    # Near-duplicates of one hash, at every distance
+    for distance in range(8):
+        hashes[5000 + distance] = flip(hashes[1], *range(0, distance * 10, 10))
+        index.add(5000 + distance, hashes[5000 + distance])
+
+    rng = random.Random(1)
+    for hash_id in rng.sample(list(hashes), 50):
+        query = flip(hashes[hash_id], *rng.sample(range(81), rng.randint(0, 6)))
+        assert index.find(query) == brute_force(hashes, query, 6)
+
+
+def test_threshold_limit():
+    index = HammingIndex(threshold=2)
+    with pytest.raises(ValueError):
+        index.find("0" * 21, threshold=3)
+    with pytest.raises(ValueError):
+        HammingIndex(threshold=81)
+
+
+def test_save_and_load(hashes, tmp_path):
+    path = str(tmp_path / "hashes.npz")
+    index = HammingIndex(threshold=2)
+    for hash_id, hash in hashes.items():
+        index.add(hash_id, hash)
+    index.save(path)
+
+    # Parts are rebuilt for a different threshold
+    loaded = HammingIndex.load(path, threshold=5)
+    assert len(loaded) == len(hashes)
+    query = flip(hashes[42], 3, 13, 23, 33, 43)
+    assert loaded.find(query) == [(42, 5)]
+
+    assert len(HammingIndex.load(str(tmp_path / "missing.npz"))) == 0
+    assert len(HammingIndex.load(path, bits=64)) == 0
+
+
+def test_refresh_and_watch(env, tmp_path):
+    pool = Session()
+    db = XasdDB(session=pool.get_session())
+    first = db.add_unique_hash("1bb00400007f00700001f")
+
+    index = HammingIndex()
+    index.watch(pool.Session)
+    assert index.refresh(db._session) == 1
+
+    # Hashes inserted through the ORM are added on commit
+    db.insert_files([("a.flac", {"hash": "1bb00400007f00700001e"})])
+    second = db.hash.get("1bb00400007f00700001e")
+    assert index.find("1bb00400007f00700001f") == [
+        (first.hash_id, 0),
+        (second.hash_id, 1),
+    ]
+    assert index.refresh(db._session) == 0
+
+    # Only rows newer than the saved index are read after loading
+    path = str(tmp_path / "hashes.npz")
+    index.save(path)
+    third = db.add_unique_hash("0000000000000000000ff")
+    loaded = HammingIndex.load(path)
+    assert loaded.refresh(db._session) == 1
+    assert loaded.find("0000000000000000000fe") == [(third.hash_id, 1)]
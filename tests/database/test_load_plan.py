@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import event
+
+from xasd.database import models, schemas
+from xasd.database.crud.load_plan import load_plan
+
+
+@pytest.fixture(scope="function")
+def create_tracks(db):
+    genre = db.genre.create(name="genre_name")
+    for n in range(20):
+        artist = db.artist.create(name=f"artist_{n}")
+        album = db.album.create(name=f"album_{n}", artist=artist)
+        track = db.track.create(
+            title=f"track_{n}", album=album, artist=artist, genre=genre
+        )
+        db.file.create(
+            filter=[models.File.filepath == f"filepath_{n}"],
+            filepath=f"filepath_{n}",
+            track=track,
+        )
+
+
+@pytest.fixture(scope="function")
+def count_queries(db):
+    engine = db._session.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_load_plan_no_schema():
+    assert load_plan(models.Track) == ()
+
+
+def test_load_plan_is_cached():
+    assert load_plan(models.Track, schemas.Track) is load_plan(
+        models.Track, schemas.Track
+    )
+
+
+def test_api_get_track_query_count(create_tracks, db, count_queries):
+    db._session.expire_all()
+
+    tracks = db.api_get(models.Track, schema=schemas.Track)
+    serialised = [schemas.Track.from_orm(track) for track in tracks]
+
+    assert len(serialised) == 20
+    assert len(count_queries) == 1
+
+
+def test_api_get_album_query_count(create_tracks, db, count_queries):
+    db._session.expire_all()
+
+    albums = db.api_get(models.Album, schema=schemas.Album)
+    serialised = [schemas.Album.from_orm(album) for album in albums]
+
+    assert len(serialised) == 20
+    # albums (joined with artist and cover art), then tracks of those albums
+    assert len(count_queries) == 2
+
+
+def test_search_all_query_count(create_tracks, db, count_queries):
+    db._session.expire_all()
+
+    results = db.search_all("_1", schema=schemas.SearchListResponse)
+    schemas.SearchListResponse(**results)
+
+    assert len(results["tracks"]) == 11
+    assert len(count_queries) == 4
@@ -0,0 +1,105 @@
+import pytest
+
+from xasd.database.crud import XasdDB
+from xasd.database.search.memory import MemoryIndex
+from xasd.database.session import Session
+
+
+@pytest.fixture(scope="function")
+def index():
+    index = MemoryIndex()
+    index.add("artist", 1, "Killing the Dream")
+    index.add("artist", 2, "Dream Theater")
+    index.add("album", 1, "Fractures")
+    index.add("track", 1, "Fractures")
+    index.add("track", 2, "Blame Kit")
+    return index
+
+
+def names(suggestions):
+    return [(s.type, s.name) for s in suggestions]
+
+
+def test_prefix(index):
+    assert names(index.search("kill")) == [("artist", "Killing the Dream")]
+
+
+def test_prefix_case_and_whitespace(index):
+    assert ("artist", "Dream Theater") in names(index.search("  DREAM   th"))
+
+
+def test_prefix_first(index):
+    results = index.search("dream")
+
+    assert results[0].name == "Dream Theater"
+    assert results[0].score == 1.0
+
+
+def test_fuzzy(index):
+    assert set(names(index.search("fractrues"))) == {
+        ("album", "Fractures"),
+        ("track", "Fractures"),
+    }
+
+
+def test_limit(index):
+    assert len(index.search("fractures", limit=1)) == 1
+
+
+def test_no_match(index):
+    assert index.search("zzzzzz") == []
+    assert index.search("") == []
+
+
+def test_remove(index):
+    index.remove("artist", 2)
+
+    assert ("artist", "Dream Theater") not in names(index.search("dream"))
+
+
+def test_add_replaces(index):
+    index.add("artist", 2, "Dream Theatre")
+    index.remove("artist", 2)
+
+    assert index.search("dream th") == []
+
+
+def test_fuzzy_skips_common_trigrams():
+    index = MemoryIndex(max_postings=1)
+    index.add("album", 1, "Fractures")
+    index.add("album", 2, "Fractured")
+
+    # Their shared trigrams are too common, only the rarer "es " finds a match
+    assert names(index.search("fractrues")) == [("album", "Fractures")]
+    index.max_postings = 10
+    assert len(index.search("fractrues")) == 2
+
+
+def test_refresh_is_incremental(env):
+    pool = Session()
+    db = XasdDB(session=pool.get_session())
+    index = MemoryIndex()
+
+    db.artist.create(name="first artist")
+    assert index.refresh(db._session) == 1
+
+    db.artist.create(name="second artist")
+    assert index.refresh(db._session) == 1
+    assert len(index) == 2
+
+
+def test_watch(env):
+    pool = Session()
+    index = MemoryIndex()
+    index.watch(pool.Session)
+    db = XasdDB(session=pool.get_session())
+
+    artist = db.artist.create(name="watched artist")
+    assert names(index.search("watched")) == [("artist", "watched artist")]
+
+    db.artist.update(artist, name="renamed artist")
+    assert names(index.search("watched")) == []
+    assert names(index.search("renamed")) == [("artist", "renamed artist")]
+
+    # Rows already added by `watch` are not added again by `refresh`
+    assert index.refresh(db._session) == 0
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+
+from xasd.database import migrations, models
+from xasd.database.crud import XasdDB
+from xasd.database.migrations import MIGRATIONS, schema_version_table
+from xasd.database.session import Session
+
+
+def indexes(engine, table):
+    return {
+        ix["name"]: ix["unique"] for ix in sqlalchemy.inspect(engine).get_indexes(table)
+    }
+
+
+def test_new_database_is_up_to_date(env):
+    Session()
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+
+    with engine.connect() as connection:
+        version = connection.execute(
+            sqlalchemy.select(sqlalchemy.func.max(schema_version_table.c.version))
+        ).scalar()
+
+    assert version == MIGRATIONS[-1][0]
+    assert indexes(engine, "hash") == {"ix_hash_hash": 1}
+
+
+def test_migrate_existing_database(env):
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+    Session()
+
+    # Turn the database back into one created before migration 1, with duplicate rows
+    with engine.begin() as connection:
+        for table in ["hash", "magnet", "track", "file"]:
+            for name in indexes(engine, table):
+                connection.execute(sqlalchemy.text(f"DROP INDEX {name}"))
+        connection.execute(sqlalchemy.delete(schema_version_table))
+        connection.execute(
+            sqlalchemy.insert(models.Hash.__table__),
+            [{"hash_id": 1, "hash": "abc"}, {"hash_id": 2, "hash": "abc"}],
+        )
+        connection.execute(
+            sqlalchemy.insert(models.File.__table__),
+            [
+                {"file_id": 1, "filepath": "a", "hash_id": 2},
+                {"file_id": 2, "filepath": "a", "hash_id": 2},
+            ],
+        )
+        connection.execute(
+            sqlalchemy.insert(models.Track.__table__),
+            [
+                {"track_id": 1, "title": "one", "file_id": 1},
+                {"track_id": 2, "title": "two", "file_id": 2},
+                {"track_id": 3, "title": "no file", "file_id": None},
+                {"track_id": 4, "title": "no file", "file_id": None},
+            ],
+        )
+        connection.execute(
+            sqlalchemy.insert(models.playlist_association_table),
+            [
+                {"left_id": 1, "right_id": 1},
+                {"left_id": 1, "right_id": 2},
+                {"left_id": 2, "right_id": 2},
+            ],
+        )
+        connection.execute(
+            sqlalchemy.insert(models.Magnet.__table__),
+            [{"infohash": "abc"}, {"infohash": "abc"}, {"infohash": "def"}],
+        )
+
+    Session()
+
+    assert indexes(engine, "hash") == {"ix_hash_hash": 1}
+    assert indexes(engine, "track") == {
+        "ix_track_title": 0,
+        "ix_track_artist_id": 0,
+        "ix_track_album_id": 0,
+    }
+    with engine.connect() as connection:
+        assert connection.execute(
+            sqlalchemy.select(models.File.hash_id)
+        ).scalars().all() == [1]
+        assert connection.execute(
+            sqlalchemy.select(models.Magnet.infohash)
+        ).scalars().all() == ["abc", "def"]
+        assert connection.execute(
+            sqlalchemy.select(models.Track.track_id, models.Track.file_id)
+        ).all() == [(1, 1), (3, None), (4, None)]
+        assert connection.execute(
+            sqlalchemy.select(models.playlist_association_table).order_by("left_id")
+        ).all() == [(1, 1), (2, 1)]
+
+
+def test_migrate_duplicate_users(env):
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+    Session()
+
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("DROP INDEX ix_user_name"))
+        connection.execute(sqlalchemy.delete(schema_version_table))
+        connection.execute(
+            sqlalchemy.insert(models.User.__table__),
+            [
+                {"user_id": 1, "name": "ann"},
+                {"user_id": 2, "name": "ann"},
+                {"user_id": 3, "name": "a" * 32},
+                {"user_id": 4, "name": "a" * 32},
+            ],
+        )
+        connection.execute(
+            sqlalchemy.insert(models.Playlist.__table__),
+            [{"owner_id": 2, "name": "private"}],
+        )
+
+    Session()
+
+    assert indexes(engine, "user") == {"ix_user_name": 1}
+    with engine.connect() as connection:
+        # Renamed rather than merged, each account keeps its own playlists
+        assert connection.execute(
+            sqlalchemy.select(models.User.user_id, models.User.name).order_by(
+                models.User.user_id
+            )
+        ).all() == [(1, "ann"), (2, "ann#2"), (3, "a" * 32), (4, "a" * 30 + "#4")]
+        assert connection.execute(
+            sqlalchemy.select(models.Playlist.owner_id)
+        ).scalars().all() == [2]
+
+
+def test_add_unique_hash(db):
+    hash = db.add_unique_hash("abc")
+
+    assert hash.hash_id == 1
+    assert db.add_unique_hash("abc") is False
+    assert db.add_unique_hash("def").hash_id == 2
+
+
+def test_add_magnet(db):
+    assert db.add_magnet("abc").infohash == "abc"
+    assert db.add_magnet("abc") is False
+
+
+def test_add_file_properties(env):
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+    Session()
+
+    # Turn the file table back into one created before migration 2
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("DROP TABLE file"))
+        connection.execute(
+            sqlalchemy.text(
+                "CREATE TABLE file (file_id INTEGER PRIMARY KEY, "
+                "filepath VARCHAR(64) NOT NULL, hash_id INTEGER)"
+            )
+        )
+        connection.execute(sqlalchemy.text("INSERT INTO file (filepath) VALUES ('a')"))
+        connection.execute(
+            sqlalchemy.delete(schema_version_table).where(
+                schema_version_table.c.version >= 2
+            )
+        )
+
+    Session()
+
+    columns = {c["name"] for c in sqlalchemy.inspect(engine).get_columns("file")}
+    assert {"mimetype", "size", "duration", "bitrate", "sample_rate"} < columns
+    with engine.connect() as connection:
+        assert connection.execute(
+            sqlalchemy.select(models.File.filepath, models.File.duration)
+        ).all() == [("a", None)]
+
+
+def test_concurrent_migrations(env, monkeypatch):
+    engine = sqlalchemy.create_engine(os.environ["DATABASE_URL"])
+    Session()
+    # Back to a database created before any migration
+    with engine.begin() as connection:
+        for name in indexes(engine, "hash"):
+            connection.execute(sqlalchemy.text(f"DROP INDEX {name}"))
+        connection.execute(sqlalchemy.delete(schema_version_table))
+
+    # Slow, so both processes would read the version before either has applied it
+    def slowly(migration):
+        def run(connection):
+            time.sleep(0.2)
+            migration(connection)
+
+        return run
+
+    monkeypatch.setattr(
+        migrations,
+        "MIGRATIONS",
+        [(version, name, slowly(migration)) for version, name, migration in MIGRATIONS],
+    )
+    # Started together, like the workers and API started by docker-compose
+    barrier = threading.Barrier(2)
+
+    def run():
+        barrier.wait()
+        return migrations.migrate(engine)
+
+    with ThreadPoolExecutor(2) as executor:
+        versions = list(executor.map(lambda _: run(), range(2)))
+
+    assert versions == [MIGRATIONS[-1][0]] * 2
+    with engine.connect() as connection:
+        assert connection.execute(
+            sqlalchemy.select(schema_version_table.c.version)
+        ).scalars().all() == [version for version, _, _ in MIGRATIONS]
@@ -0,0 +1,95 @@
+from xasd.database import models
+from xasd.database.search.like import LikeSearch
+from xasd.database.search.mysql import MySQLSearch
+from xasd.database.search.sqlite import SQLiteSearch
+
+
+def create_artists(db, names):
+    for name in names:
+        db.artist.create(name=name)
+
+
+def test_sqlite_uses_fts5(db):
+    assert db._session.info["search_engine"] is SQLiteSearch
+
+
+def test_search_prefix(db):
+    create_artists(db, ["Killing the Dream", "Dream Theater", "Killswitch Engage"])
+
+    results = db.artist.search("kill")
+
+    assert {artist.name for artist in results} == {
+        "Killing the Dream",
+        "Killswitch Engage",
+    }
+
+
+def test_search_all_terms_must_match(db):
+    create_artists(db, ["Killing the Dream", "Dream Theater", "Killswitch Engage"])
+
+    results = db.artist.search("dream kill")
+
+    assert [artist.name for artist in results] == ["Killing the Dream"]
+
+
+def test_search_pagination(db):
+    create_artists(db, [f"artist {n}" for n in range(10)])
+
+    first_page = db.artist.search("artist", skip=0, limit=4)
+    last_page = db.artist.search("artist", skip=8, limit=4)
+
+    assert len(first_page) == 4
+    assert len(last_page) == 2
+    assert not {a.artist_id for a in first_page} & {a.artist_id for a in last_page}
+
+
+def test_search_index_follows_updates(db):
+    create_artists(db, ["old name"])
+    artist = db.artist.get("old name")
+
+    db.artist.update(artist, name="new name")
+    assert db.artist.search("old") == []
+    assert db.artist.search("new") == [artist]
+
+    db.artist.delete(artist)
+    assert db.artist.search("new") == []
+
+
+def test_search_no_terms(db):
+    create_artists(db, ["artist"])
+
+    assert db.artist.search("!!") == []
+
+
+def test_like_search_fallback(db):
+    create_artists(db, ["Killing the Dream", "Dream Theater"])
+
+    results = LikeSearch(db._session).search(
+        models.Artist, models.Artist.name, "ing the"
+    )
+
+    assert [artist.name for artist in results] == ["Killing the Dream"]
+
+
+def test_search_unindexed_column(db):
+    db.genre.create(name="Post-Rock")
+    db.genre.create(name="Rock")
+
+    results = db.genre.search("st-ro")
+
+    assert [genre.name for genre in results] == ["Post-Rock"]
+
+
+def test_mysql_unindexed_terms():
+    assert MySQLSearch.split_terms("The Blink 2 of us") == (
+        ["Blink"],
+        ["The", "2", "of", "us"],
+    )
+
+
+def test_mysql_only_unindexed_terms_use_like(db):
+    create_artists(db, ["Sound of Silence", "Blink 2"])
+
+    results = MySQLSearch(db._session).search(models.Artist, models.Artist.name, "of")
+
+    assert [artist.name for artist in results] == ["Sound of Silence"]
@@ -0,0 +1,48 @@
+import libtorrent as lt
+import pytest
+
+from xasd.downloader.alerts import AlertDispatcher
+
+# No network, beyond listening on localhost
+SETTINGS = {
+    "listen_interfaces": "127.0.0.1:0",
+    "enable_dht": False,
+    "enable_lsd": False,
+    "enable_upnp": False,
+    "enable_natpmp": False,
+}
+
+
+@pytest.fixture(scope="function")
+def lt_settings():
+    return dict(SETTINGS)
+
+
+@pytest.fixture(scope="function")
+def alerts(lt_settings):
+    alerts = AlertDispatcher(lt.session(lt_settings), update_interval=0.05)
+    alerts.start()
+    try:
+        yield alerts
+    finally:
+        alerts.stop()
+
+
+@pytest.fixture(scope="function")
+def torrent_params(tmp_path):
+    """Params of a torrent of a file in `tmp_path / "content"`, saved in `save_path`"""
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "track.flac").write_bytes(b"audio" * 10000)
+
+    torrent = lt.create_torrent(lt.list_files(str(content)))
+    lt.set_piece_hashes(torrent, str(tmp_path))
+    torrent_info = lt.torrent_info(torrent.generate())
+
+    def params(save_path=tmp_path):
+        params = lt.add_torrent_params()
+        params.ti = torrent_info
+        params.save_path = str(save_path)
+        return params
+
+    return params
@@ -0,0 +1,57 @@
+import asyncio
+
+import libtorrent as lt
+
+from xasd.downloader.scheduler import DownloadScheduler
+
+
+def test_finished(alerts, torrent_params):
+    async def add():
+        torrent = alerts.add_torrent(torrent_params())
+        await asyncio.wait_for(torrent.metadata, 10)
+        await asyncio.wait_for(torrent.finished, 10)
+        return torrent
+
+    torrent = asyncio.run(add())
+    assert torrent.finished.result() is None
+    assert alerts.torrents() == [torrent]
+
+
+def test_scheduler_finished(alerts, torrent_params, tmp_path, monkeypatch):
+    # Saved where its files already are, so it finishes once they're checked
+    params = torrent_params()
+    monkeypatch.setattr(lt, "parse_magnet_uri", lambda magnet: params)
+    scheduler = DownloadScheduler(alerts, interval=0.05)
+
+    path = asyncio.run(
+        asyncio.wait_for(scheduler.download("magnet:", str(tmp_path)), 10)
+    )
+
+    assert path == str(tmp_path / "content")
+    assert alerts.torrents() == []
+    assert (tmp_path / "content" / "track.flac").exists()
+
+
+def test_scheduler_stalled(alerts, torrent_params, tmp_path, monkeypatch):
+    params = torrent_params()
+    monkeypatch.setattr(lt, "parse_magnet_uri", lambda magnet: params)
+    scheduler = DownloadScheduler(alerts, stall_timeout=0.3, interval=0.05)
+
+    # Has metadata, but no peers, so nothing is downloaded
+    path = asyncio.run(
+        asyncio.wait_for(scheduler.download("magnet:", str(tmp_path / "empty")), 10)
+    )
+
+    assert path is None
+    assert alerts.torrents() == []
+
+
+def test_scheduler_metadata_timeout(alerts, tmp_path):
+    magnet = "magnet:?xt=urn:btih:2d5f2b5b9c1b1e1e1e1e1e1e1e1e1e1e1e1e1e1e&dn=album"
+    scheduler = DownloadScheduler(alerts, metadata_timeout=0.2)
+
+    path = asyncio.run(scheduler.download(magnet, str(tmp_path)))
+
+    assert path is None
+    assert alerts.torrents() == []
+    assert alerts.session.get_torrents() == []
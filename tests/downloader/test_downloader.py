@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import signal
+from types import SimpleNamespace
+
+from aio_pika.message import ProcessContext
+
+from xasd.downloader import Downloader, _watch
+
+MAGNET = "magnet:?xt=urn:btih:" + "ab" * 20 + "&dn=album"
+
+
+class Message:
+    delivery_tag = 1
+    redelivered = False
+
+    def __init__(self):
+        self.body = json.dumps({"magnet_uri": MAGNET}).encode()
+        self.settled = None
+
+    @property
+    def processed(self):
+        return self.settled is not None
+
+    def process(
+        self, requeue=False, reject_on_redelivered=False, ignore_processed=False
+    ):
+        return ProcessContext(
+            self,
+            requeue=requeue,
+            reject_on_redelivered=reject_on_redelivered,
+            ignore_processed=ignore_processed,
+        )
+
+    async def ack(self):
+        self.settled = "ack"
+
+    async def nack(self, requeue=True):
+        self.settled = f"nack(requeue={requeue})"
+
+    async def reject(self, requeue=False):
+        self.settled = f"reject(requeue={requeue})"
+
+
+class Scheduler:
+    def __init__(self, finishes=False):
+        self.finishes = finishes
+        self.started = asyncio.Event()
+
+    def resumable(self, magnet_link):
+        return False
+
+    async def download(self, magnet_link, download_path):
+        self.started.set()
+        if not self.finishes:
+            await asyncio.Event().wait()
+        return os.path.join(download_path, "album")
+
+
+def make_downloader(scheduler):
+    downloader = Downloader.__new__(Downloader)
+    downloader.scheduler = scheduler
+    downloader.db = SimpleNamespace(add_magnet=lambda infohash: True)
+    downloader.download_path = "downloads"
+    downloader.published = []
+
+    async def publish_message(queue_name, message_body):
+        downloader.published.append((queue_name, json.loads(message_body)))
+
+    downloader.publish_message = publish_message
+    return downloader
+
+
+def test_complete_publishes_torrent_path():
+    downloader = make_downloader(Scheduler(finishes=True))
+    downloader.amqp_complete_queue = "download_complete"
+
+    async def run():
+        queue = asyncio.Queue()
+        message = Message()
+        await queue.put(message)
+        consumer = asyncio.create_task(downloader.consume(0, queue))
+        await queue.join()
+        consumer.cancel()
+        return message
+
+    assert asyncio.run(run()).settled == "ack"
+    # Only this torrent's files, not other torrents still being downloaded
+    assert downloader.published == [
+        (
+            "download_complete",
+            {"magnet_uri": MAGNET, "download_path": os.path.join("downloads", "album")},
+        )
+    ]
+
+
+def test_cancelled_message_requeued():
+    downloader = make_downloader(Scheduler())
+
+    async def run():
+        queue = asyncio.Queue()
+        message = Message()
+        await queue.put(message)
+        consumer = asyncio.create_task(downloader.consume(0, queue))
+        await downloader.scheduler.started.wait()
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+        return message
+
+    # Not rejected, so it's redelivered after a restart
+    assert asyncio.run(run()).settled == "nack(requeue=True)"
+
+
+def test_sigterm_stops_watching():
+    cancelled = []
+
+    async def watch(opts):
+        try:
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(opts)
+            raise
+
+    # Returns, rather than the process being killed, so main() saves the state
+    asyncio.run(asyncio.wait_for(_watch(SimpleNamespace(watch=watch), {}), 10))
+    assert cancelled == [{}]
@@ -0,0 +1,159 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from xasd.downloader import scheduler as scheduler_module
+from xasd.downloader.scheduler import DownloadScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Handle:
+    def __init__(self, name):
+        self._name = name
+        self.paused = False
+
+    def status(self):
+        return SimpleNamespace(name=self._name)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+class Alerts:
+    def __init__(self, clock):
+        self.clock = clock
+        self.torrents = {}
+        self.removed = []
+
+    def add_torrent(self, params):
+        loop = asyncio.get_running_loop()
+        torrent = SimpleNamespace(
+            handle=Handle(params.name),
+            loop=loop,
+            metadata=loop.create_future(),
+            finished=loop.create_future(),
+            status=None,
+            last_progress=self.clock.now,
+        )
+        self.torrents[params.name] = torrent
+        return torrent
+
+    def remove_torrent(self, torrent, delete_files=False):
+        self.removed.append((torrent.handle.status().name, delete_files))
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module, "time", clock)
+    # Every fake torrent has audio to download
+    monkeypatch.setattr(scheduler_module, "select_files", lambda handle, cover: 1)
+    return clock
+
+
+def magnet(name):
+    return f"magnet:?xt=urn:btih:{'0' * 39}{len(name)}&dn={name}"
+
+
+async def settle():
+    """Let the downloads run until they're waiting on the scheduler"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def start(scheduler, seeds):
+    """Start a download of a torrent per name in `seeds`, each with that many seeds"""
+    tasks = {}
+    for name, count in seeds.items():
+        tasks[name] = asyncio.create_task(scheduler.download(magnet(name), "/tmp"))
+        await asyncio.sleep(0)
+        torrent = scheduler.alerts.torrents[name]
+        torrent.status = SimpleNamespace(num_seeds=count, list_seeds=0, num_complete=-1)
+        torrent.metadata.set_result(None)
+        await settle()
+    return tasks
+
+
+def active(scheduler):
+    return [job.name for job in scheduler._active]
+
+
+def test_promotes_healthiest(clock):
+    async def run():
+        alerts = Alerts(clock)
+        scheduler = DownloadScheduler(alerts, download_slots=1, interval=3600)
+        # The first is promoted as soon as it has metadata, the rest wait
+        await start(scheduler, {"first": 0, "dead": 0, "healthy": 5, "ok": 2})
+        first = alerts.torrents["first"]
+        first.finished.set_result(None)
+        await settle()
+
+        assert active(scheduler) == ["healthy"]
+        assert [name for name, t in alerts.torrents.items() if t.handle.paused] == [
+            "dead",
+            "ok",
+        ]
+        scheduler._ticker.cancel()
+
+    asyncio.run(run())
+
+
+def test_demotes_then_evicts(clock):
+    async def run():
+        alerts = Alerts(clock)
+        scheduler = DownloadScheduler(
+            alerts, download_slots=1, demote_after=10, stall_timeout=25, interval=3600
+        )
+        tasks = await start(scheduler, {"a": 1, "b": 1})
+        assert active(scheduler) == ["a"]
+
+        clock.now += 11
+        scheduler._schedule()
+        assert active(scheduler) == ["b"]
+        assert alerts.torrents["a"].handle.paused
+
+        # b makes progress, so keeps its slot
+        alerts.torrents["b"].last_progress = clock.now
+        clock.now += 5
+        scheduler._schedule()
+        assert active(scheduler) == ["b"]
+
+        clock.now += 10
+        scheduler._schedule()
+        assert active(scheduler) == ["a"]
+
+        # 11 + 14 seconds active without progress
+        clock.now += 14
+        scheduler._schedule()
+        assert await tasks["a"] is None
+        assert alerts.removed == [("a", True)]
+        assert active(scheduler) == ["b"]
+
+        alerts.torrents["b"].finished.set_result(None)
+        assert await tasks["b"] == "/tmp/b"
+        assert scheduler.stats() == {"active": 0, "queued": 0}
+        scheduler._ticker.cancel()
+
+    asyncio.run(run())
+
+
+def test_metadata_timeout(clock):
+    async def run():
+        alerts = Alerts(clock)
+        scheduler = DownloadScheduler(alerts, metadata_timeout=0.01, interval=3600)
+        path = await scheduler.download(magnet("missing"), "/tmp")
+        scheduler._ticker.cancel()
+        return path, alerts.removed
+
+    assert asyncio.run(run()) == (None, [("missing", True)])
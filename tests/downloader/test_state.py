@@ -0,0 +1,102 @@
+import asyncio
+
+import libtorrent as lt
+
+from xasd.downloader.alerts import AlertDispatcher, infohash
+from xasd.downloader.scheduler import DownloadScheduler
+from xasd.downloader.state import SessionState
+
+
+def test_session_state(tmp_path, lt_settings):
+    state = SessionState(str(tmp_path / "state"))
+    session = state.create_session({**lt_settings, "download_rate_limit": 5000})
+    state.save_session(session)
+
+    restored = SessionState(str(tmp_path / "state")).create_session(
+        {"upload_rate_limit": 1000}
+    )
+    settings = restored.get_settings()
+    assert (settings["download_rate_limit"], settings["upload_rate_limit"]) == (
+        5000,
+        1000,
+    )
+
+
+def test_unreadable_session_state(tmp_path, lt_settings):
+    (tmp_path / "session").write_bytes(b"not bencoded")
+    session = SessionState(str(tmp_path)).create_session(lt_settings)
+    assert session.get_settings()["enable_dht"] is False
+
+
+def test_resume_after_restart(tmp_path, torrent_params, lt_settings):
+    state = SessionState(str(tmp_path / "state"))
+
+    async def save():
+        alerts = AlertDispatcher(
+            lt.session(lt_settings),
+            update_interval=0.05,
+            on_resume_data=state.save_resume_data,
+        )
+        alerts.start()
+        try:
+            torrent = alerts.add_torrent(torrent_params())
+            await asyncio.wait_for(torrent.finished, 10)
+            assert alerts.save_resume_data(modified_only=False, timeout=10) == 1
+        finally:
+            alerts.stop()
+        return infohash(torrent.handle)
+
+    key = asyncio.run(save())
+    assert state.infohashes() == [key]
+    assert state.resume_data(key).ti.name() == "content"
+
+    async def resume():
+        alerts = AlertDispatcher(lt.session(lt_settings), update_interval=0.05)
+        alerts.start()
+        scheduler = DownloadScheduler(alerts, interval=3600, state=state)
+        magnet = f"magnet:?xt=urn:btih:{key}"
+        try:
+            assert scheduler.resumable(magnet)
+            # No peers, the metadata and pieces come from the resume data
+            return await asyncio.wait_for(scheduler.download(magnet, str(tmp_path)), 10)
+        finally:
+            scheduler._ticker.cancel()
+            alerts.stop()
+
+    assert asyncio.run(resume()) == str(tmp_path / "content")
+    assert state.infohashes() == []
+
+
+def test_resume_data_saved_once_queued(
+    tmp_path, torrent_params, lt_settings, monkeypatch
+):
+    state = SessionState(str(tmp_path / "state"))
+    params = torrent_params()
+    monkeypatch.setattr(lt, "parse_magnet_uri", lambda magnet: params)
+
+    async def download():
+        alerts = AlertDispatcher(
+            lt.session(lt_settings),
+            update_interval=0.05,
+            on_resume_data=state.save_resume_data,
+        )
+        alerts.start()
+        # Saved long before the periodic save
+        scheduler = DownloadScheduler(
+            alerts, stall_timeout=1, interval=0.05, state=state, save_interval=3600
+        )
+        try:
+            # Has metadata, but no peers, so it stalls
+            task = asyncio.create_task(
+                scheduler.download("magnet:", str(tmp_path / "empty"))
+            )
+            while not state.infohashes():
+                await asyncio.sleep(0.05)
+            return await asyncio.wait_for(task, 10)
+        finally:
+            scheduler._ticker.cancel()
+            alerts.stop()
+
+    assert asyncio.run(asyncio.wait_for(download(), 10)) is None
+    # Deleted once the torrent is removed
+    assert state.infohashes() == []
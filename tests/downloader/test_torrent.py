@@ -1,6 +1,7 @@
+import libtorrent as lt
 import pytest
 
-from xasd.downloader.torrent import get_infohash, get_displayname
+from xasd.downloader.torrent import file_priorities, get_infohash, get_displayname
 
 
 @pytest.mark.parametrize(
@@ -35,3 +36,35 @@ def test_get_infohash(magnet_link, expected):
 )
 def test_get_displayname(magnet_link, expected):
     assert get_displayname(magnet_link) == expected
+
+
+def storage(*files):
+    storage = lt.file_storage()
+    for path, size in files:
+        storage.add_file(path, size)
+    return storage
+
+
+def test_file_priorities():
+    files = storage(
+        ("album/01.flac", 100),
+        ("album/02.WAV", 100),
+        ("album/scans/back.jpg", 500),
+        ("album/cover.jpg", 200),
+        ("album/rip.log", 10),
+        ("album/video.mkv", 1000),
+        ("album/extras.zip", 1000),
+    )
+
+    assert file_priorities(files) == [4, 4, 0, 0, 0, 0, 0]
+    assert file_priorities(files, cover=True) == [4, 4, 0, 4, 0, 0, 0]
+
+
+def test_file_priorities_largest_image():
+    files = storage(
+        ("album/01.mp3", 100),
+        ("album/small.png", 100),
+        ("album/large.jpg", 200),
+    )
+
+    assert file_priorities(files, cover=True) == [4, 0, 4]
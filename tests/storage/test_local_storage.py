@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from xasd.storage import storage_from_env
+from xasd.storage.local import LocalStorage
+
+
+class Progress:
+    def __init__(self):
+        self.total = None
+        self.completed = []
+
+    def set_total_bytes(self, total):
+        self.total = total
+
+    def bytes_completed(self, completed):
+        self.completed.append(completed)
+
+
+@pytest.fixture(scope="function")
+def local_file(tmp_path):
+    path = tmp_path / "upload" / "track.flac"
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(3000))
+    return str(path)
+
+
+def test_link(local_file, tmp_path):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    progress = Progress()
+    storage.upload_file(local_file, "t/ab/abcd.flac", progress_listener=progress)
+
+    stored = tmp_path / "storage" / "t" / "ab" / "abcd.flac"
+    assert os.path.samefile(stored, local_file)
+    assert (progress.total, progress.completed) == (3000, [3000])
+
+    # The uploader removes the local file after uploading it
+    os.unlink(local_file)
+    assert stored.stat().st_size == 3000
+
+
+def test_copy(local_file, tmp_path, monkeypatch):
+    monkeypatch.setattr("xasd.storage.local.COPY_CHUNK_SIZE", 1024)
+    storage = LocalStorage(str(tmp_path / "storage"), link=False)
+    progress = Progress()
+    storage.upload_file(local_file, "track.flac", progress_listener=progress)
+
+    stored = tmp_path / "storage" / "track.flac"
+    assert not os.path.samefile(stored, local_file)
+    assert stored.read_bytes() == open(local_file, "rb").read()
+    assert progress.completed == [1024, 2048, 3000, 3000]
+    # No temporary files are left behind
+    assert os.listdir(tmp_path / "storage") == ["track.flac"]
+
+
+def test_replace(local_file, tmp_path):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    storage.upload_file(local_file, "track.flac")
+    replacement = tmp_path / "replacement.flac"
+    replacement.write_bytes(b"new")
+    storage.upload_file(str(replacement), "track.flac")
+
+    assert (tmp_path / "storage" / "track.flac").read_bytes() == b"new"
+
+
+def test_outside_root(local_file, tmp_path):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    with pytest.raises(ValueError):
+        storage.upload_file(local_file, "../escape.flac")
+
+
+def test_storage_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_URL", f"file://{tmp_path}/storage?link=0")
+    storage = storage_from_env()
+    assert isinstance(storage, LocalStorage)
+    assert storage.root == tmp_path / "storage"
+    assert storage.link is False
+
+    monkeypatch.setenv("STORAGE_URL", "ftp://example.com")
+    with pytest.raises(ValueError):
+        storage_from_env()
@@ -0,0 +1,38 @@
+import math
+import struct
+import wave
+
+import pytest
+
+from xasd.uploader import Uploader
+
+
+@pytest.fixture(scope="function")
+def wav_file(tmp_path):
+    path = tmp_path / "track.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(
+            b"".join(
+                struct.pack(
+                    "<h",
+                    int(10000 * (i / 16000) * math.sin(2 * math.pi * 440 * i / 8000)),
+                )
+                for i in range(16000)
+            )
+        )
+    return str(path)
+
+
+@pytest.fixture(scope="function")
+def uploader(env, tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_URL", f"file://{tmp_path}/storage")
+    uploader = Uploader(fingerprint_workers=1, journal_path=str(tmp_path / "journal"))
+    try:
+        yield uploader
+    finally:
+        uploader.fingerprinter.shutdown()
+        uploader.uploads.shutdown()
+        uploader.journal.close()
@@ -0,0 +1,102 @@
+import random
+import wave
+
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from xasd.uploader import decode
+from xasd.uploader.dejavu import (
+    _calculate_peaks,
+    _sample_array,
+    _stream_peaks,
+    audio_peaks,
+)
+
+
+def _write_wav(path, sample_width, channels, frame_rate, frame_count):
+    rng = random.Random(sample_width * channels)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_width)
+        f.setframerate(frame_rate)
+        f.writeframes(rng.randbytes(frame_count * channels * sample_width))
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "sample_width, channels, frame_rate, frame_count",
+    [
+        (1, 1, 8000, 5000),
+        (2, 2, 44100, 123457),
+        (3, 1, 22050, 30011),
+        (4, 2, 11025, 777),
+    ],
+)
+def test_wav_stream(
+    tmp_path, monkeypatch, sample_width, channels, frame_rate, frame_count
+):
+    # Small blocks, so chunks span several of them
+    monkeypatch.setattr(decode, "BLOCK_FRAMES", 1000)
+    path = _write_wav(
+        tmp_path / "a.wav", sample_width, channels, frame_rate, frame_count
+    )
+    audio = AudioSegment.from_file(path)
+
+    pcm = decode.stream(path, "audio/wav")
+    assert (pcm.channels, pcm.frame_rate, pcm.frame_count) == (
+        channels,
+        frame_rate,
+        frame_count,
+    )
+    blocks = list(pcm.blocks)
+    assert max(len(block) for block in blocks) <= 1000 * channels
+    assert np.array_equal(np.concatenate(blocks), _sample_array(audio))
+
+    pcm = decode.stream(path, "audio/wav")
+    assert _stream_peaks(pcm) == _calculate_peaks(audio)
+
+
+def test_truncated_wav_stream(tmp_path):
+    path = _write_wav(tmp_path / "a.wav", 2, 2, 8000, 4000)
+    with open(path, "r+b") as f:
+        f.truncate(44 + 4000 * 4 - 1001)
+
+    pcm = decode.stream(path, "audio/wav")
+    audio = AudioSegment.from_file(path)
+    assert pcm.frame_count == audio.frame_count()
+    assert _stream_peaks(pcm) == _calculate_peaks(audio)
+
+
+def test_audio_peaks_streams_wav(wav_file, monkeypatch):
+    expected = _calculate_peaks(AudioSegment.from_file(wav_file))
+
+    def decode_whole_file(*args):
+        raise AssertionError("WAV files should be streamed")
+
+    monkeypatch.setattr("xasd.uploader.dejavu.audio_samples", decode_whole_file)
+    assert audio_peaks(wav_file, "audio/wav") == expected
+
+
+def test_not_streamed(tmp_path, wav_file):
+    # Not a RIFF file, pydub would hand it to ffmpeg
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"ID3" + bytes(100))
+    assert decode.stream(str(path), "audio/wav") is None
+
+    assert decode.stream(wav_file.replace(".wav", ".mp3"), "audio/mpeg") is None
+
+
+def test_flac_frame_count(tmp_path):
+    # STREAMINFO of 44.1kHz stereo 16 bit, 12345678 samples
+    fields = (44100 << 44) | (1 << 41) | (15 << 36) | 12345678
+    streaminfo = bytes(10) + fields.to_bytes(8, "big") + bytes(16)
+    path = tmp_path / "a.flac"
+    path.write_bytes(
+        b"fLaC" + b"\x80" + len(streaminfo).to_bytes(3, "big") + streaminfo
+    )
+
+    assert decode.flac_frame_count(str(path)) == 12345678
+
+    path.write_bytes(b"ID3" + bytes(100))
+    assert decode.flac_frame_count(str(path)) is None
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+from pydub import AudioSegment
+
+from xasd.uploader.dejavu import (
+    _calculate_peaks,
+    create_waveform,
+    fingerprint,
+    image_hash,
+)
+
+
+def _reference_peaks(audio_file):
+    """Peaks calculated by slicing the `AudioSegment`, as hashes were originally made"""
+    chunk_length = len(audio_file) / 107
+    loudness = [
+        audio_file[i * chunk_length : (i + 1) * chunk_length].rms for i in range(107)
+    ]
+    return [int((value / max(loudness)) * 60) for value in loudness]
+
+
+@pytest.mark.parametrize(
+    "sample_width, channels, frame_rate, frame_count",
+    [
+        (1, 1, 8000, 5000),
+        (2, 2, 44100, 123457),
+        (3, 1, 22050, 30011),
+        (4, 2, 11025, 777),
+    ],
+)
+def test_calculate_peaks(sample_width, channels, frame_rate, frame_count):
+    rng = random.Random(0)
+    audio = AudioSegment(
+        data=rng.randbytes(frame_count * channels * sample_width),
+        sample_width=sample_width,
+        frame_rate=frame_rate,
+        channels=channels,
+    )
+
+    assert _calculate_peaks(audio) == _reference_peaks(audio)
+
+
+def test_fingerprint(wav_file, tmp_path):
+    waveform = str(tmp_path / "waveform.png")
+    create_waveform(wav_file, "audio/wav", waveform)
+
+    # Hash of this file before the waveform was rendered in memory
+    assert fingerprint(wav_file, "audio/wav") == "1bb00400007f00700001f"
+    assert str(image_hash(waveform)) == "1bb00400007f00700001f"
+
+
+def test_fingerprint_unsupported_mimetype(wav_file):
+    with pytest.raises(Exception, match="Not a recognised audio file"):
+        fingerprint(wav_file, "text/plain")
@@ -0,0 +1,139 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from xasd.database import models
+from xasd.uploader import journal as stages
+from xasd.uploader.journal import UploadJournal, pending_paths
+
+
+@pytest.fixture(scope="function")
+def journal(tmp_path):
+    journal = UploadJournal(str(tmp_path / "journal"))
+    try:
+        yield journal
+    finally:
+        journal.close()
+
+
+def test_stages(journal, tmp_path):
+    path = tmp_path / "track.flac"
+    path.write_bytes(b"audio")
+
+    journal.hashed(str(path), {"title": "Track", "hash": "abc"})
+    job = journal.get(str(path))
+    assert (job.stage, job.info, job.cloud_filepath) == (
+        stages.HASHED,
+        {"title": "Track", "hash": "abc"},
+        None,
+    )
+
+    journal.inserted({str(path): "uuid.flac"})
+    job = journal.get(str(path))
+    assert (job.stage, job.cloud_filepath) == (stages.INSERTED, "uuid.flac")
+
+    journal.uploaded(str(path))
+    assert journal.get(str(path)).stage == stages.UPLOADED
+
+    journal.remove(str(path))
+    assert journal.get(str(path)) is None
+
+
+def test_survives_reopening(journal, tmp_path):
+    path = tmp_path / "track.flac"
+    path.write_bytes(b"audio")
+    journal.hashed(str(path), {"hash": "abc"})
+    journal.close()
+
+    reopened = UploadJournal(journal.path)
+    try:
+        assert reopened.get(str(path)).stage == stages.HASHED
+    finally:
+        reopened.close()
+
+
+def test_changed_file_starts_again(journal, tmp_path):
+    path = tmp_path / "track.flac"
+    path.write_bytes(b"audio")
+    journal.hashed(str(path), {"hash": "abc"})
+
+    path.write_bytes(b"different audio")
+    assert journal.get(str(path)) is None
+    assert journal.paths() == []
+
+
+def test_pending_paths(journal, tmp_path):
+    watched = tmp_path / "watched"
+    (watched / "album").mkdir(parents=True)
+    (watched / "album" / "track.flac").write_bytes(b"audio")
+    (watched / ".partial").write_bytes(b"audio")
+    elsewhere = tmp_path / "elsewhere.flac"
+    elsewhere.write_bytes(b"audio")
+
+    journal.hashed(str(elsewhere), {"hash": "abc"})
+    journal.hashed(str(watched / "album" / "track.flac"), {"hash": "def"})
+    gone = tmp_path / "gone.flac"
+    gone.write_bytes(b"audio")
+    journal.hashed(str(gone), {"hash": "ghi"})
+    gone.unlink()
+
+    # The job inside the album is resumed when the album is uploaded
+    assert pending_paths(journal, [str(watched), str(tmp_path / "missing")]) == [
+        str(elsewhere),
+        str(watched / "album"),
+    ]
+
+
+def test_resume_after_failed_upload(uploader, wav_file, tmp_path, monkeypatch):
+    (tmp_path / "first").mkdir()
+    path = str(tmp_path / "first" / "track.wav")
+    shutil.copy(wav_file, path)
+
+    upload = uploader.uploads.upload
+
+    async def fail(*args, **kwargs):
+        raise ConnectionError("Storage unavailable")
+
+    monkeypatch.setattr(uploader.uploads, "upload", fail)
+    with pytest.raises(ConnectionError):
+        asyncio.run(uploader.upload(path))
+    assert uploader.journal.get(path).stage == stages.INSERTED
+
+    async def fingerprint(*args):
+        raise AssertionError("Resumed files shouldn't be fingerprinted again")
+
+    monkeypatch.setattr(uploader.uploads, "upload", upload)
+    monkeypatch.setattr(uploader.fingerprinter, "fingerprint", fingerprint)
+    asyncio.run(uploader.upload(path))
+
+    file = uploader.db._session.query(models.File).one()
+    assert (tmp_path / "storage" / file.filepath).exists()
+    assert not os.path.exists(path)
+    assert uploader.journal.paths() == []
+
+
+def test_resume_after_insert_not_journaled(uploader, wav_file, tmp_path, monkeypatch):
+    (tmp_path / "first").mkdir()
+    path = str(tmp_path / "first" / "track.wav")
+    shutil.copy(wav_file, path)
+
+    inserted = uploader.journal.inserted
+
+    def crash(*args):
+        raise SystemExit("Stopped after the insert committed")
+
+    monkeypatch.setattr(uploader.journal, "inserted", crash)
+    with pytest.raises(SystemExit):
+        asyncio.run(uploader.upload(path))
+    assert uploader.journal.get(path).stage == stages.HASHED
+
+    monkeypatch.setattr(uploader.journal, "inserted", inserted)
+    asyncio.run(uploader.upload(path))
+
+    session = uploader.db._session
+    file = session.query(models.File).one()
+    assert session.query(models.Track).one().file_id == file.file_id
+    assert (tmp_path / "storage" / file.filepath).exists()
+    assert uploader.journal.paths() == []
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from xasd.uploader.dejavu import fingerprint
+from xasd.uploader.pipeline import Fingerprinter, StageTimings, UploadService
+
+
+class FakeBucket:
+    """Stands in for `B2Bucket`, reporting progress as b2sdk would"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.uploaded = []
+
+    def upload_file(self, local_file, b2_file_name, progress_listener=None, **info):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            progress_listener.set_total_bytes(100)
+            progress_listener.bytes_completed(50)
+            time.sleep(0.05)
+            if local_file == "missing":
+                raise FileNotFoundError(local_file)
+            progress_listener.bytes_completed(100)
+            self.uploaded.append(b2_file_name)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_stage_timings():
+    timings = StageTimings()
+    timings.record("upload", 1.0)
+    timings.record("upload", 3.0)
+    with timings.time("fingerprint"):
+        pass
+
+    assert timings.stages["upload"] == {"count": 2, "total": 4.0, "max": 3.0}
+    assert timings.stages["fingerprint"]["count"] == 1
+    assert timings.summary().startswith("upload: 2 in 4.00s (mean 2.000s, max 3.000s)")
+
+
+def test_fingerprinter(wav_file):
+    fingerprinter = Fingerprinter(max_workers=2)
+
+    async def run():
+        return await asyncio.gather(
+            *(fingerprinter.fingerprint(wav_file, "audio/wav") for _ in range(3))
+        )
+
+    try:
+        hashes = asyncio.run(run())
+    finally:
+        fingerprinter.shutdown()
+
+    assert hashes == [fingerprint(wav_file, "audio/wav")] * 3
+    assert fingerprinter.timings.stages["fingerprint"]["count"] == 3
+
+
+def test_upload_service():
+    bucket = FakeBucket()
+    uploads = UploadService(bucket, max_workers=3)
+
+    async def run():
+        await asyncio.gather(
+            *(uploads.upload(f"local{i}", f"remote{i}") for i in range(6))
+        )
+        with pytest.raises(FileNotFoundError):
+            await uploads.upload("missing", "remote")
+
+    try:
+        asyncio.run(run())
+    finally:
+        uploads.shutdown()
+
+    assert sorted(bucket.uploaded) == [f"remote{i}" for i in range(6)]
+    assert bucket.max_running == 3
+    assert uploads.stats() == {
+        "workers": 3,
+        "uploading": 0,
+        "completed": 6,
+        "failed": 1,
+        "bytes_uploaded": 600,
+        "bytes_pending": 0,
+    }
+    assert uploads.timings.stages["upload"]["count"] == 7
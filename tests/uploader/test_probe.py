@@ -0,0 +1,98 @@
+import struct
+
+import pytest
+
+from xasd.uploader.probe import container_mimetype, probe
+
+
+def ogg_page(packet):
+    # Beginning of stream page with one segment
+    return b"OggS\x00\x02" + bytes(20) + b"\x01" + bytes([len(packet)]) + packet
+
+
+def box(box_type, data=b""):
+    return struct.pack(">I", 8 + len(data)) + box_type + data
+
+
+def mp4(brand, *handlers):
+    tracks = b"".join(
+        box(b"trak", box(b"mdia", box(b"hdlr", bytes(8) + handler + bytes(12))))
+        for handler in handlers
+    )
+    return box(b"ftyp", brand + bytes(4)) + box(b"moov", tracks)
+
+
+@pytest.mark.parametrize(
+    "header, mimetype",
+    [
+        (b"fLaC\x00\x00\x00\x22", "audio/flac"),
+        (b"RIFF\x24\x00\x00\x00WAVEfmt ", "audio/wav"),
+        (ogg_page(b"\x01vorbis" + bytes(22)), "audio/ogg"),
+        (ogg_page(b"OpusHead" + bytes(11)), "audio/ogg"),
+        (
+            ogg_page(b"\x80theora" + bytes(35)) + ogg_page(b"\x01vorbis"),
+            "application/ogg",
+        ),
+        (b"\x00\x00\x00\x20ftypM4A ", "audio/mp4"),
+        (b"\x00\x00\x00\x20ftypisom", "video/mp4"),
+        (b"\xff\xfb\x90\x64\x00\x00", "audio/mpeg"),
+        (b"<html>", None),
+    ],
+)
+def test_container_mimetype(header, mimetype):
+    assert container_mimetype(header) == mimetype
+
+
+def test_probe(wav_file):
+    assert probe(wav_file) == {
+        "album": None,
+        "title": None,
+        "artist": None,
+        "tracknumber": None,
+        "genre": None,
+        "date": None,
+        "hash": None,
+        "mimetype": "audio/wav",
+        "size": 44 + 16000 * 2,
+        "duration": 2.0,
+        "bitrate": 128000,
+        "sample_rate": 8000,
+        "channels": 1,
+    }
+
+
+def test_probe_magic_bytes(wav_file, tmp_path):
+    # The extension is wrong, the container is still found
+    path = tmp_path / "track.mp3"
+    path.write_bytes(open(wav_file, "rb").read())
+    assert probe(str(path))["mimetype"] == "audio/wav"
+
+
+def test_probe_id3(tmp_path):
+    # An ID3v2 tag of 20 bytes before an mpeg frame
+    path = tmp_path / "track.bin"
+    path.write_bytes(
+        b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10) + b"\xff\xfb" + bytes(100)
+    )
+    assert probe(str(path))["mimetype"] == "audio/mpeg"
+
+
+def test_probe_unrecognised(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not audio")
+    info = probe(str(path))
+
+    assert info["mimetype"] == "text/plain"
+    assert info["duration"] is None
+    assert info["title"] is None
+
+
+@pytest.mark.parametrize(
+    "handlers, mimetype",
+    [((b"soun",), "audio/mp4"), ((b"vide", b"soun"), "video/mp4")],
+)
+def test_probe_mp4_tracks(tmp_path, handlers, mimetype):
+    path = tmp_path / "track.m4a"
+    path.write_bytes(mp4(b"isom", *handlers))
+
+    assert probe(str(path))["mimetype"] == mimetype
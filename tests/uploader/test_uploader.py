@@ -0,0 +1,71 @@
+import asyncio
+import shutil
+
+from xasd.database import models
+from xasd.database.crud import XasdDB
+from xasd.database.session import Session
+
+
+def deliver(wav_file, directory):
+    directory.mkdir()
+    path = directory / "track.wav"
+    shutil.copy(wav_file, path)
+    return str(path)
+
+
+def test_upload(uploader, wav_file, tmp_path):
+    path = deliver(wav_file, tmp_path / "first")
+    asyncio.run(uploader.upload(path))
+
+    session = uploader.db._session
+    file = session.query(models.File).one()
+    assert (tmp_path / "storage" / file.filepath).stat().st_size > 0
+    assert file.hash.hash == "1bb00400007f00700001f"
+    assert (file.mimetype, file.duration, file.sample_rate, file.channels) == (
+        "audio/wav",
+        2.0,
+        8000,
+        1,
+    )
+
+    content = session.query(models.ContentHash).one()
+    assert content.hash_id == file.hash_id
+    assert uploader.timings.stages["upload"]["count"] == 1
+
+
+def test_identical_file_skipped(uploader, wav_file, tmp_path, monkeypatch):
+    asyncio.run(uploader.upload(deliver(wav_file, tmp_path / "first")))
+
+    async def fingerprint(*args):
+        raise AssertionError("Identical files shouldn't be fingerprinted")
+
+    monkeypatch.setattr(uploader.fingerprinter, "fingerprint", fingerprint)
+    path = deliver(wav_file, tmp_path / "again")
+    asyncio.run(uploader.upload(path))
+
+    assert uploader.db._session.query(models.File).count() == 1
+    assert not (tmp_path / "again" / "track.wav").exists()
+
+
+def test_near_duplicate_from_another_uploader(uploader, wav_file, tmp_path):
+    # Stored by another process after this uploader built its hash index, one bit from the wav's hash
+    other = XasdDB(session=Session().get_session())
+    other.add_unique_hash("1bb00400007f00700001e")
+
+    asyncio.run(uploader.upload(deliver(wav_file, tmp_path / "first")))
+
+    assert uploader.db._session.query(models.File).count() == 0
+
+
+def test_temporary_files_skipped(uploader, wav_file, tmp_path):
+    album = tmp_path / "album"
+    deliver(wav_file, album)
+    (album / "disc 2").mkdir()
+    shutil.copy(wav_file, album / "disc 2" / "track.wav.part")
+    shutil.copy(wav_file, album / ".track.wav")
+
+    asyncio.run(uploader.upload(str(album)))
+
+    assert uploader.db._session.query(models.File).count() == 1
+    assert (album / "disc 2" / "track.wav.part").exists()
+    assert (album / ".track.wav").exists()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pytest
+
+from xasd.abc import AbstractWorker
+from xasd.utils.asyncinotifyrecurse import Debouncer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="function")
+def clock():
+    return Clock()
+
+
+def test_coalesces_directory(tmp_path, clock):
+    album = tmp_path / "album"
+    album.mkdir()
+    debouncer = Debouncer(str(tmp_path), quiet=10, clock=clock)
+
+    for second in range(5):
+        clock.now = second * 5
+        debouncer.touch(str(album / "01.flac"))
+        debouncer.touch(str(album / "02.flac"))
+        assert debouncer.ready() == []
+
+    assert debouncer.timeout() == 10
+    clock.now = 30
+    assert debouncer.ready() == [str(album)]
+    assert debouncer.ready() == []
+    assert debouncer.timeout() is None
+
+
+def test_ready_in_order(tmp_path, clock):
+    for name in ["first.flac", "second.flac"]:
+        (tmp_path / name).write_bytes(b"audio")
+    debouncer = Debouncer(str(tmp_path), quiet=10, clock=clock)
+
+    debouncer.touch(str(tmp_path / "second.flac"))
+    clock.now = 1
+    debouncer.touch(str(tmp_path / "first.flac"))
+    clock.now = 5
+    debouncer.touch(str(tmp_path / "second.flac"))
+
+    clock.now = 11
+    assert debouncer.ready() == [str(tmp_path / "first.flac")]
+    clock.now = 15
+    assert debouncer.ready() == [str(tmp_path / "second.flac")]
+
+
+def test_skips_temporary_and_missing(tmp_path, clock):
+    (tmp_path / "track.flac.part").write_bytes(b"audio")
+    (tmp_path / ".hidden").write_bytes(b"audio")
+    debouncer = Debouncer(str(tmp_path), quiet=10, clock=clock)
+
+    for name in ["track.flac.part", ".hidden", "deleted.flac"]:
+        debouncer.touch(str(tmp_path / name))
+    debouncer.touch(str(tmp_path))
+    debouncer.touch(str(tmp_path.parent / "outside.flac"))
+
+    clock.now = 10
+    assert debouncer.ready() == []
+    assert len(debouncer) == 0
+
+
+def test_inotify_producer(tmp_path):
+    class Worker(AbstractWorker):
+        async def consume(self, name, asyncio_queue):
+            pass
+
+    async def produce():
+        worker = Worker()
+        queue = asyncio.Queue()
+        producer = asyncio.create_task(
+            worker.inotify_producer(queue, str(tmp_path), quiet=0.2)
+        )
+        await asyncio.sleep(0.1)
+
+        album = tmp_path / "album"
+        album.mkdir()
+        await asyncio.sleep(0.05)
+        for _ in range(3):
+            with open(album / "track.flac.part", "ab") as f:
+                f.write(b"piece")
+            await asyncio.sleep(0.05)
+        os.rename(album / "track.flac.part", album / "track.flac")
+
+        item = await asyncio.wait_for(queue.get(), timeout=5)
+        await asyncio.sleep(0.3)
+        worker.running = False
+        producer.cancel()
+        return item, queue.qsize()
+
+    assert asyncio.run(produce()) == (str(tmp_path / "album"), 0)